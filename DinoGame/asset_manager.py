@@ -0,0 +1,151 @@
+import os
+import time
+import pygame
+
+# Everything the Dino game draws or plays, loaded once at startup.
+#
+# Sprites are loaded, scaled and convert_alpha()'d a single time and handed out as
+# shared surfaces, so spawning an obstacle is a dictionary lookup instead of a PNG
+# decode and a rescale inside the frame loop. Text surfaces are cached per string
+# (the timer only changes once a second). Obstacles come from a fixed pool and go
+# back to it when they leave the screen. FrameTimeLog records how long every frame
+# took so the effect can be checked against the frame budget.
+
+ASSET_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+
+# name: list of (file, size) frames
+SPRITES = {
+    'dino_running': [('Dino1.png', (80, 100)), ('Dino2.png', (80, 100))],
+    'dino_ducking': [('DinoDucking1.png', (110, 60)), ('DinoDucking2.png', (110, 60))],
+    'dino_jumping': [('DinoJumping.png', (80, 100))],
+    'ptero': [('Ptero1.png', (84, 62)), ('Ptero2.png', (84, 62))],
+    'cactus': [('cacti/cactus6.png', (100, 100))],
+    'ground': [('ground.png', (1280, 20))],
+    'cloud': [('cloud.png', (200, 80))],
+}
+SOUNDS = {
+    'death': 'sfx/lose.mp3',
+    'points': 'sfx/100points.mp3',
+    'jump': 'sfx/jump.mp3',
+}
+FONT = 'PressStart2P-Regular.ttf'
+
+
+class SilentSound:
+    # Stand in when there is no audio device (or sound is turned off)
+    def play(self, *args, **kwargs):
+        pass
+
+
+class AssetManager:
+    def __init__(self, directory=ASSET_DIRECTORY, sound=True, text_cache_size=64):
+        self.directory = directory
+        self.sound_enabled = sound
+        self.text_cache_size = text_cache_size
+        self.sprites = dict()
+        self.sounds = dict()
+        self.fonts = dict()
+        self.texts = dict()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load(self):
+        # convert_alpha() needs a display mode, call this after pygame.display.set_mode
+        for name, frames in SPRITES.items():
+            self.sprites[name] = [pygame.transform.scale(pygame.image.load(self.path(file)), size).convert_alpha()
+                                  for file, size in frames]
+        for name, file in SOUNDS.items():
+            if self.sound_enabled and pygame.mixer.get_init():
+                self.sounds[name] = pygame.mixer.Sound(self.path(file))
+            else:
+                self.sounds[name] = SilentSound()
+        return self
+
+    def images(self, name):
+        return self.sprites[name]
+
+    def image(self, name, index=0):
+        return self.sprites[name][index]
+
+    def sound(self, name):
+        return self.sounds[name]
+
+    def font(self, size=24):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.Font(self.path(FONT), size)
+        return font
+
+    def text(self, string, color='black', size=24):
+        # Rendered text surfaces, the oldest is dropped when the cache is full
+        key = (string, str(color), size)
+        surface = self.texts.get(key)
+        if surface is None:
+            if len(self.texts) >= self.text_cache_size:
+                del self.texts[next(iter(self.texts))]
+            surface = self.texts[key] = self.font(size).render(string, True, color)
+        return surface
+
+
+class ObstaclePool:
+    # Fixed set of sprites created up front; acquire() reuses a free one
+    def __init__(self, factory, size=16):
+        self.factory = factory
+        self.free = [factory() for _ in range(size)]
+        self.created = size
+
+    def acquire(self, *args):
+        if self.free:
+            obstacle = self.free.pop()
+        else:
+            # More obstacles on screen than expected, grow once instead of failing
+            obstacle = self.factory()
+            self.created += 1
+        obstacle.reset(*args)
+        return obstacle
+
+    def release(self, obstacle):
+        obstacle.kill()
+        self.free.append(obstacle)
+
+    def release_all(self, group):
+        for obstacle in group.sprites():
+            self.release(obstacle)
+
+
+class FrameTimeLog:
+    # Per frame: wall time, frame time and the part of it spent in game logic + drawing
+    def __init__(self, path, fps):
+        self.path = path
+        self.budget = 1.0 / fps
+        self.file = open(path, 'w') if path else None
+        if self.file is not None:
+            self.file.write('time\tframe_ms\twork_ms\n')
+        self.frame_times = list()
+        self.last = None
+
+    def frame(self, work_time):
+        # Call once per frame, right after the frame limiter returns
+        now = time.perf_counter()
+        if self.last is not None:
+            frame_time = now - self.last
+            self.frame_times.append(frame_time)
+            if self.file is not None:
+                self.file.write('%.6f\t%.3f\t%.3f\n' % (now, frame_time * 1000, work_time * 1000))
+        self.last = now
+
+    def summary(self):
+        if not self.frame_times:
+            return 'no frames'
+        times = sorted(self.frame_times)
+        over = sum(1 for t in times if t > 1.5 * self.budget)
+        return ('%d frames, mean %.2f ms, p50 %.2f ms, p99 %.2f ms, max %.2f ms, %d over 1.5x budget (%.2f ms)' %
+                (len(times), sum(times) / len(times) * 1000, times[len(times) // 2] * 1000,
+                 times[min(len(times) - 1, int(len(times) * 0.99))] * 1000, times[-1] * 1000, over,
+                 self.budget * 1000))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -1,3 +1,5 @@
+import os
+import sys
 import argparse
 import time
 import numpy as np
@@ -10,6 +12,10 @@ import brainflow
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
 from brainflow.data_filter import DataFilter, FilterTypes, AggOperations
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from shared_board import SharedBoard
+from flex_detector import FlexDetector, wait_for_samples
+
 
 def main ():
     parser = argparse.ArgumentParser ()
@@ -26,6 +32,7 @@ def main ():
     parser.add_argument ('--serial-number', type = str, help  = 'serial number', required = False, default = '')
     parser.add_argument ('--board-id', type = int, help  = 'board id, check docs to get a list of supported boards', required = False, default = BoardIds.GANGLION_BOARD.value)
     parser.add_argument ('--log', action = 'store_true')
+    parser.add_argument ('--shared-board', type = str, help = 'read from the acquisition daemon with this shared memory name', required = False, default = '')
     args = parser.parse_args ()
 
     params = BrainFlowInputParams ()
@@ -39,21 +46,25 @@ def main ():
     params.timeout = args.timeout
 
     # initialize calibration and time variables
-    time_thres =  100
-    max_val = -100000000000
-    vals_mean = 0
+    time_thres =  0.1 # seconds between two jumps
     num_samples = 5000
-    samples = 0
+    chunk_samples = 2 # one Ganglion packet
+    detector = FlexDetector(threshold_ratio = 0.25, refractory_time = time_thres)
 
     if (args.log):
         BoardShim.enable_dev_board_logger ()
     else:
         BoardShim.disable_board_logger ()
 
-    board = BoardShim (args.board_id, params)
+    if args.shared_board:
+        board = SharedBoard (args.shared_board)
+    else:
+        board = BoardShim (args.board_id, params)
     board.prepare_session ()
 
     board.start_stream (45000, args.streamer_params)
+    sampling_rate = BoardShim.get_sampling_rate (board.get_board_id ())
+    timestamp_channel = BoardShim.get_timestamp_channel (board.get_board_id ())
 
     # start calibration
 
@@ -63,22 +74,18 @@ def main ():
 
     print("Relax and flex your arm a few times")
 
-    while(samples < num_samples):
+    while(detector.count < num_samples):
 
+        wait_for_samples(board, chunk_samples, sampling_rate) # sleep instead of spinning
         data = board.get_board_data() # get data
-        if(len(data[1]) > 0):
-            DataFilter.perform_rolling_filter (data[1], 2, AggOperations.MEAN.value) # denoise data
-            vals_mean += sum([data[1,i]/num_samples for i in range(len(data[1]))]) # update mean
-            samples += len(data[1])
-            if(np.amax(data[1]) > max_val):
-                max_val = np.amax(data[1]) # update max
+        detector.calibrate(data[1]) # denoise data and update mean, variance and max
 
-    flex_thres = 0.25 *((max_val - vals_mean)**2) # calculate flex threshold - percentage needs to be set per person
+    flex_thres = detector.finish_calibration() # calculate flex threshold
 
     print("Mean Value")
-    print(vals_mean)
+    print(detector.mean)
     print("Max Value")
-    print(max_val)
+    print(detector.max_val)
     print("Threshold")
     print(flex_thres)
 
@@ -87,20 +94,15 @@ def main ():
     # start game
 
     print("Calibration complete. Start!")
-    prev_time = int(round(time.time() * 1000))
 
     while True:
 
+        wait_for_samples(board, chunk_samples, sampling_rate)
         data = board.get_board_data() # get data 
 
-        if(len(data[1]) > 0):
-            DataFilter.perform_rolling_filter (data[1], 2, AggOperations.MEAN.value) # denoise data
-            if((int(round(time.time() * 1000)) - time_thres) > prev_time): # if enough time has gone by since the last flex
-                prev_time = int(round(time.time() * 1000)) # update time
-                for element in data[1]:
-                    if(((element - vals_mean)**2) >= flex_thres): # if above threshold
-                        pyautogui.press('space') # jump
-                        break
+        # flexes above threshold, at most one every time_thres seconds
+        if(detector.detect(data[1], data[timestamp_channel])):
+            pyautogui.press('space') # jump
 
     board.stop_stream ()
     board.release_session ()
@@ -0,0 +1,293 @@
+import os
+import random
+import pygame
+
+from asset_manager import AssetManager, ObstaclePool
+
+# Dino game logic, independent of the display and of wall time.
+#
+# DinoGame.step(dt, inputs) advances the game by dt seconds in fixed ticks of 1 / fps
+# (one tick is one frame of the original loop, so speeds and gravity are unchanged).
+# Obstacle and cloud spawns and the game timer count simulated milliseconds instead
+# of pygame timers, and every random choice comes from the game's own seeded
+# generator, so the same inputs at the same simulated times always play out the same
+# way. draw(screen) renders the current state; headless runs never call it and leave
+# the clouds out.
+
+# In-game variables
+game_speed = 6
+game_duration = 10000  # in miliseconds
+dino_gravity = 4.2
+scale_size = 0.01
+obstacle_spawn_time = 550 # in miliseconds
+cloud_spawn_time = 3000 # in miliseconds
+jump_height = 280
+
+JUMP = 'jump'
+
+
+class Cloud(pygame.sprite.Sprite):
+    def __init__(self, image):
+        super().__init__()
+        self.image = image
+        self.rect = self.image.get_rect()
+
+    def reset(self, x_pos, y_pos):
+        self.x_pos = x_pos
+        self.y_pos = y_pos
+        self.rect.center = (self.x_pos, self.y_pos)
+
+    def update(self):
+        self.rect.x -= 1
+
+
+class Dino(pygame.sprite.Sprite):
+    def __init__(self, running_sprites, jump_sfx, x_pos, y_pos):
+        super().__init__()
+        # Shared surfaces from the asset manager
+        self.running_sprites = running_sprites
+        self.jump_sfx = jump_sfx
+
+        self.x_pos = x_pos
+        self.y_pos = y_pos
+        self.current_image = 0
+        self.image = self.running_sprites[self.current_image]
+        self.rect = self.image.get_rect(center=(self.x_pos, self.y_pos))
+        self.rect.width = self.rect.width * scale_size
+        self.gravity = dino_gravity
+        self.ducking = False
+
+    def jump(self):
+        self.jump_sfx.play()
+        if self.rect.centery >= 300:
+            while self.rect.centery > 360-jump_height:
+                self.rect.centery -= 1
+
+    def apply_gravity(self):
+        if self.rect.centery <= 360:
+            self.rect.centery += self.gravity
+
+    def update(self):
+        self.animate()
+        self.apply_gravity()
+
+    def animate(self):
+        self.current_image += 0.05
+        if self.current_image >= 2:
+            self.current_image = 0
+        self.image = self.running_sprites[int(self.current_image)]
+
+
+class Cactus(pygame.sprite.Sprite):
+    # Created once by the obstacle pool, reset() places it again at every spawn
+    def __init__(self, sprites, rng=random):
+        super().__init__()
+        self.sprites = sprites
+        self.rng = rng
+        self.image = self.sprites[0]
+        self.rect = self.image.get_rect()
+
+    def reset(self, x_pos, y_pos):
+        self.x_pos = x_pos
+        self.y_pos = y_pos
+        self.cleared = False
+        self.hit = False
+        self.image = self.rng.choice(self.sprites)
+        self.size = self.image.get_size()
+        self.rect = self.image.get_rect(center=(self.x_pos, self.y_pos))
+        self.rect = self.rect.scale_by(scale_size)
+
+    def update(self):
+        self.x_pos -= game_speed
+        self.rect.size = self.size
+        self.rect.center = (self.x_pos, self.y_pos)
+
+
+def init_headless():
+    # No window and no audio device: SDL dummy drivers, sounds replaced by silent ones.
+    # A display mode is still set because convert_alpha() needs one.
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    return AssetManager(sound=False).load()
+
+
+def release_offscreen(group, pool):
+    # Sprites that scrolled past the left edge go back to their pool
+    for sprite in group.sprites():
+        if sprite.rect.right < 0:
+            pool.release(sprite)
+
+
+class DinoGame:
+    def __init__(self, assets, fps=120, seed=0, duration=game_duration, scenery=True):
+        self.assets = assets
+        self.fps = fps
+        self.tick_ms = 1000.0 / fps
+        self.duration = duration
+        self.rng = random.Random(seed)
+        # Clouds are scenery only: their own generator, and headless runs skip them
+        self.scenery = scenery
+        self.scenery_rng = random.Random(seed)
+
+        self.ground = assets.image('ground')
+        self.cloud = assets.image('cloud')
+        self.death_sfx = assets.sound('death')
+        self.points_sfx = assets.sound('points')
+
+        self.cloud_group = pygame.sprite.Group()
+        self.obstacle_group = pygame.sprite.Group()
+        self.dino_group = pygame.sprite.GroupSingle()
+        # Pools, enough for everything that fits on screen at once
+        self.obstacle_pool = ObstaclePool(lambda: Cactus(assets.images('cactus'), self.rng), 16)
+        self.cloud_pool = ObstaclePool(lambda: Cloud(self.cloud), 8)
+        self.dinosaur = Dino(assets.images('dino_running'), assets.sound('jump'), 50, 360)
+        self.dino_group.add(self.dinosaur)
+
+        self.ground_x = 0
+        self.clock = 0.0 # simulated ms since the game object was created
+        self.accumulator = 0.0
+        self.next_cloud = cloud_spawn_time
+        self.next_obstacle = None
+        self.start_time = 0.0
+        self.timer = 0.0
+        self.jump_counter = 0
+        self.game_over = True
+        self.times_up = False
+        self.final_time = 0
+        self.first_screen = True
+        self.cleared = 0
+        self.hits = 0
+
+    def start(self):
+        # Game start / restart
+        self.first_screen = False
+        self.game_over = False
+        self.times_up = False
+        self.jump_counter = 0
+        self.cleared = 0
+        self.hits = 0
+        self.start_time = self.clock
+        self.timer = 0.0
+        self.next_obstacle = self.clock + obstacle_spawn_time
+
+    def jump(self):
+        self.dinosaur.jump()
+        if self.game_over:
+            self.start()
+        else:
+            self.jump_counter += 1
+
+    def step(self, dt, inputs=()):
+        # Inputs act at the start of the step, then as many fixed ticks as fit in dt
+        for action in inputs:
+            if action == JUMP:
+                self.jump()
+        self.accumulator += dt * 1000.0
+        num_ticks = int(self.accumulator // self.tick_ms)
+        self.accumulator -= num_ticks * self.tick_ms
+        for done in range(num_ticks):
+            if self.game_over:
+                # Nothing moves until the next start, only the clock goes on
+                self.clock += (num_ticks - done) * self.tick_ms
+                break
+            self.tick()
+        return num_ticks
+
+    def tick(self):
+        self.clock += self.tick_ms
+
+        # Spawns
+        if self.clock >= self.next_cloud:
+            self.next_cloud = self.clock + cloud_spawn_time
+            if self.scenery and not self.game_over:
+                self.cloud_group.add(self.cloud_pool.acquire(1380, self.scenery_rng.randint(50, 300)))
+        if self.next_obstacle is not None and self.clock >= self.next_obstacle:
+            self.next_obstacle += obstacle_spawn_time
+            self.obstacle_group.add(self.obstacle_pool.acquire(1280, 340))
+
+        # Update timer
+        self.timer = self.clock - self.start_time
+
+        # Time over
+        if self.timer >= self.duration and not self.game_over:
+            self.final_time = self.timer
+            self.game_over = True
+            self.times_up = True
+
+        # Collisions
+        if pygame.sprite.spritecollide(self.dino_group.sprite, self.obstacle_group, False) and not self.game_over:
+            self.final_time = self.timer
+            self.game_over = True
+            self.death_sfx.play()
+
+        if self.game_over:
+            self.clear()
+            return
+
+        if self.scenery:
+            self.cloud_group.update()
+            release_offscreen(self.cloud_group, self.cloud_pool)
+        self.dino_group.update()
+        self.update_obstacles()
+
+        self.ground_x -= game_speed
+        if self.ground_x <= -1280:
+            self.ground_x = 0
+
+    def update_obstacles(self):
+        # One pass: move, score and recycle. The score is for offline runs and uses the
+        # collision rule of the game (the rects spritecollide compares): an obstacle
+        # that touched the dino is a hit, one that got past it without that is cleared.
+        dino_rect = self.dinosaur.rect
+        for obstacle in self.obstacle_group.sprites():
+            obstacle.update()
+            if obstacle.cleared or obstacle.hit:
+                if obstacle.rect.right < 0:
+                    self.obstacle_pool.release(obstacle)
+            elif dino_rect.colliderect(obstacle.rect):
+                obstacle.hit = True
+                self.hits += 1
+            elif obstacle.rect.right < dino_rect.left:
+                obstacle.cleared = True
+                self.cleared += 1
+
+    def clear(self):
+        self.cloud_pool.release_all(self.cloud_group)
+        self.obstacle_pool.release_all(self.obstacle_group)
+        self.next_obstacle = None
+
+    def draw(self, screen):
+        screen.fill("white")
+        if self.first_screen:
+            init_text = self.assets.text("Press 'space' to start")
+            init_rect = init_text.get_rect(center=(screen.get_width() // 2, screen.get_height() // 2 - 30))  # Centro vertical, 30 píxeles arriba del centro horizontal
+            screen.blit(init_text, init_rect)
+        elif self.game_over:
+            self.draw_end(screen)
+        else:
+            timer_text = self.assets.text(f"Time: {int(self.timer) // 1000}s", (0, 0, 0))
+            screen.blit(timer_text, timer_text.get_rect(topright=(780, 10)))
+            self.cloud_group.draw(screen)
+            self.dino_group.draw(screen)
+            self.obstacle_group.draw(screen)
+            screen.blit(self.ground, (self.ground_x, 360))
+            screen.blit(self.ground, (self.ground_x + 1280, 360))
+
+    def draw_end(self, screen):
+        if self.times_up:
+            game_over_text = self.assets.text("Time is up!")
+        else:
+            game_over_text = self.assets.text("Game Over!")
+        game_over_rect = game_over_text.get_rect(center=(screen.get_width() // 2, screen.get_height() // 2 - 30))  # Centro vertical, 30 píxeles arriba del centro horizontal
+        screen.blit(game_over_text, game_over_rect)
+
+        jump_text = self.assets.text(f"Jumps: {int(self.jump_counter)}")
+        jump_rect = jump_text.get_rect(center=(640, 340))
+        screen.blit(jump_text, jump_rect)
+
+        elapsed_seconds = int(self.final_time) / 1000
+        timer_text = self.assets.text(f"Final Time: {elapsed_seconds}s", (0, 0, 0))
+        timer_rect = timer_text.get_rect(topright=(780, 10))
+        screen.blit(timer_text, timer_rect)
@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import threading
+import pygame
+
+from game import JUMP
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from flex_detector import FlexDetector, wait_for_samples
+
+# Where the Dino game gets its jumps from.
+#
+# A provider turns the pygame events of a frame into game inputs. The keyboard one
+# reads KEYDOWN. The EMG one runs FlexDetector on its own thread and posts a FLEX_EVENT
+# per flex to the pygame event queue (SDL's queue is thread safe), so a flex reaches
+# the game in the next frame without going through the OS input stack like
+# pyautogui.press in chrome_dino_v1.py. Every FLEX_EVENT carries the board timestamp
+# of the sample that crossed the threshold; the provider keeps flex -> jump latencies.
+
+FLEX_EVENT = pygame.USEREVENT + 1
+
+
+class InputProvider:
+    def start(self):
+        pass
+
+    def poll(self, events):
+        # Game inputs for this frame
+        return list()
+
+    def stop(self):
+        pass
+
+    def summary(self):
+        return ''
+
+
+class KeyboardInput(InputProvider):
+    def __init__(self, keys=(pygame.K_SPACE, pygame.K_UP)):
+        self.keys = keys
+
+    def poll(self, events):
+        return [JUMP for event in events if event.type == pygame.KEYDOWN and event.key in self.keys]
+
+
+class EmgInput(InputProvider):
+    def __init__(self, board, channel=1, settle_time=15.0, calibration_samples=5000, chunk_samples=2,
+                 threshold_ratio=0.25, refractory_time=0.1):
+        from brainflow.board_shim import BoardShim
+
+        self.board = board
+        self.channel = channel
+        self.settle_time = settle_time
+        self.calibration_samples = calibration_samples
+        self.chunk_samples = chunk_samples # one Ganglion packet
+        self.sampling_rate = BoardShim.get_sampling_rate(board.get_board_id())
+        self.timestamp_channel = BoardShim.get_timestamp_channel(board.get_board_id())
+        self.detector = FlexDetector(threshold_ratio=threshold_ratio, refractory_time=refractory_time)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.calibrated = False
+        # (sample timestamp, detection time, time the game consumed the jump)
+        self.latencies = list()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        print("Starting calibration")
+        if self.stop_event.wait(self.settle_time): # wait for data to stabilize
+            return
+        self.board.get_board_data() # clear buffer
+
+        print("Relax and flex your arm a few times")
+        while self.detector.count < self.calibration_samples and not self.stop_event.is_set():
+            wait_for_samples(self.board, self.chunk_samples, self.sampling_rate, timeout=1.0)
+            self.detector.calibrate(self.board.get_board_data()[self.channel])
+        self.detector.finish_calibration()
+        self.calibrated = True
+        print("Calibration complete. Threshold %.3f. Start!" % self.detector.threshold)
+
+        while not self.stop_event.is_set():
+            if not wait_for_samples(self.board, self.chunk_samples, self.sampling_rate, timeout=0.5):
+                continue
+            data = self.board.get_board_data()
+            for index, timestamp in self.detector.detect(data[self.channel], data[self.timestamp_channel]):
+                pygame.event.post(pygame.event.Event(FLEX_EVENT, sample_time=timestamp, detect_time=time.time()))
+
+    def poll(self, events):
+        inputs = list()
+        now = time.time()
+        for event in events:
+            if event.type == FLEX_EVENT:
+                inputs.append(JUMP)
+                self.latencies.append((event.sample_time, event.detect_time, now))
+        return inputs
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(2.0)
+
+    def summary(self):
+        if not self.latencies:
+            return 'no flexes'
+        detection = sorted((detect - sample) * 1000 for sample, detect, _ in self.latencies)
+        total = sorted((jump - sample) * 1000 for sample, _, jump in self.latencies)
+        return ('%d flexes, sample -> detection %.1f ms median (max %.1f), sample -> jump %.1f ms median (max %.1f)' %
+                (len(total), detection[len(detection) // 2], detection[-1], total[len(total) // 2], total[-1]))
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from brainflow.board_shim import BoardShim
+
+from game import DinoGame, JUMP, init_headless, game_duration
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from dataset_catalog import DatasetCatalog
+from flex_detector import FlexDetector
+
+# Offline controller evaluation: every recording of the archive is fed through the
+# same FlexDetector as chrome_dino_v1.py, packet by packet, and each flex becomes a
+# jump at its time in the recording. The game runs headless on its fixed tick, as
+# fast as the CPU allows, stepping from one jump to the next, and reports how many
+# obstacles the controller cleared.
+
+
+def flex_times(data, channel, timestamp_channel, sampling_rate, calibration_time, chunk_samples, threshold_ratio,
+               refractory_time):
+    # Seconds from the start of the recording of every detected flex
+    values = np.ascontiguousarray(data[channel])
+    timestamps = data[timestamp_channel]
+    detector = FlexDetector(threshold_ratio=threshold_ratio, refractory_time=refractory_time)
+    # Offline the detector is calibrated on the first seconds, or on all of it
+    calibration = values[:int(calibration_time * sampling_rate)] if calibration_time > 0 else values
+    detector.calibrate(calibration)
+    detector.finish_calibration()
+
+    times = list()
+    for start in range(0, len(values), chunk_samples):
+        for index, timestamp in detector.detect(values[start:start + chunk_samples],
+                                                timestamps[start:start + chunk_samples]):
+            times.append(timestamp - timestamps[0])
+    return times
+
+
+def play(assets, jump_times, fps, seed, duration):
+    # Starts the game with the first input at t = 0 like the space bar, then steps
+    # straight from one jump to the next; the game splits every step in fixed ticks
+    game = DinoGame(assets, fps, seed, duration, scenery=False)
+    game.step(0.0, [JUMP])
+    t = 0.0
+    end = duration / 1000 + 1.0 / fps
+    for jump_time in sorted(jump_times):
+        if game.game_over or jump_time > end:
+            break
+        if jump_time > t:
+            game.step(jump_time - t)
+            t = jump_time
+        if not game.game_over:
+            game.step(0.0, [JUMP])
+    if not game.game_over:
+        game.step(end - t)
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--channel', type=int, help='board row of the EMG signal', required=False, default=1)
+    parser.add_argument('--calibration-time', type=float, help='seconds used to calibrate, 0 for the whole recording',
+                        required=False, default=0.0)
+    parser.add_argument('--chunk-samples', type=int, help='samples per detector call, 2 is one Ganglion packet',
+                        required=False, default=2)
+    parser.add_argument('--threshold-ratio', type=float, help='flex threshold ratio', required=False, default=0.25)
+    parser.add_argument('--refractory-time', type=float, help='seconds between two jumps', required=False, default=0.1)
+    parser.add_argument('--duration', type=float, help='game duration in seconds', required=False,
+                        default=game_duration / 1000)
+    parser.add_argument('--fps', type=int, help='game tick rate', required=False, default=120)
+    parser.add_argument('--seed', type=int, help='random seed of the game', required=False, default=0)
+    args = parser.parse_args()
+
+    assets = init_headless()
+    catalog = DatasetCatalog()
+    timestamp_channel = BoardShim.get_timestamp_channel(catalog.board_id)
+
+    print('%-22s %6s %8s %8s %5s %8s %11s' % ('name', 'flexes', 'cleared', 'hit', 'jumps', 'success', 'end'))
+    simulated = 0.0
+    game_time = 0.0
+    total_cleared = 0
+    total_hits = 0
+    for entry in catalog:
+        data = catalog.load(entry, copy=False)
+        jumps = flex_times(data, args.channel, timestamp_channel, catalog.sampling_rate, args.calibration_time,
+                           args.chunk_samples, args.threshold_ratio, args.refractory_time)
+        start = time.perf_counter()
+        game = play(assets, jumps, args.fps, args.seed, args.duration * 1000)
+        game_time += time.perf_counter() - start
+        simulated += game.final_time / 1000
+        total_cleared += game.cleared
+        total_hits += game.hits
+        scored = game.cleared + game.hits
+        print('%-22s %6d %8d %8d %5d %7.1f%% %11s' %
+              (entry.name, len(jumps), game.cleared, game.hits, game.jump_counter,
+               100.0 * game.cleared / scored if scored else 0.0, 'time up' if game.times_up else 'collision'))
+
+    scored = total_cleared + total_hits
+    print('\noverall success %.1f%% (%d of %d obstacles)' %
+          (100.0 * total_cleared / scored if scored else 0.0, total_cleared, scored))
+    print('%.1f simulated seconds in %.3f s of game time, %.0fx real time' %
+          (simulated, game_time, simulated / game_time if game_time > 0 else 0.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,7 @@ import os
 from scipy.fftpack import fft
 
 import math
+import functools
 
 from scipy.signal import firwin, remez, kaiser_atten, kaiser_beta
 from scipy.signal import butter, filtfilt, buttord
@@ -33,7 +34,9 @@ from scipy.signal import butter, lfilter
 
 import matplotlib.pyplot as plt
 
+@functools.lru_cache(maxsize=16)
 def butter_bandpass(lowcut, highcut, fs, order=5):
+    # Designed once per (band, fs, order) instead of on every filter call
     nyq = 0.5 * fs
     low = lowcut / nyq
     high = highcut / nyq
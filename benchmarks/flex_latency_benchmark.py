@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
+from brainflow.data_filter import DataFilter, AggOperations
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from flex_detector import FlexDetector, wait_for_samples
+
+# Compares the original chrome_dino_v1.py busy loop with FlexDetector on the
+# synthetic board or a recording replayed by the playback board. Key presses go
+# to a stub that records how long after the crossing sample was acquired the
+# press happened, plus the CPU time the loop burned.
+
+
+class StubKeySink:
+    def __init__(self):
+        self.latencies = list()
+
+    def press(self, sample_timestamp):
+        self.latencies.append(time.time() - sample_timestamp)
+
+
+def legacy_loop(board, duration, vals_mean, flex_thres, timestamp_channel, sink):
+    # Same logic as the game loop before FlexDetector
+    time_thres = 100
+    prev_time = int(round(time.time() * 1000))
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        data = board.get_board_data()
+        if(len(data[1]) > 0):
+            DataFilter.perform_rolling_filter (data[1], 2, AggOperations.MEAN.value)
+            if((int(round(time.time() * 1000)) - time_thres) > prev_time):
+                prev_time = int(round(time.time() * 1000))
+                for i, element in enumerate(data[1]):
+                    if(((element - vals_mean)**2) >= flex_thres):
+                        sink.press(data[timestamp_channel][i])
+                        break
+
+
+def detector_loop(board, duration, detector, timestamp_channel, sampling_rate, chunk_samples, sink):
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        if not wait_for_samples(board, chunk_samples, sampling_rate, timeout=end - time.monotonic()):
+            break
+        data = board.get_board_data()
+        for index, timestamp in detector.detect(data[1], data[timestamp_channel]):
+            sink.press(timestamp)
+
+
+def measure(name, loop, *loop_args):
+    sink = StubKeySink()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    loop(*loop_args, sink)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    latencies = np.array(sink.latencies) * 1000
+    print('%s: %d presses' % (name, len(latencies)))
+    if len(latencies) > 0:
+        print('    latency p50 %.2f ms, p95 %.2f ms, max %.2f ms' %
+              (np.percentile(latencies, 50), np.percentile(latencies, 95), latencies.max()))
+    print('    CPU %.1f%% of one core' % (100 * cpu / wall))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--file', type=str, help='recording to replay with the playback board, synthetic board if empty',
+                        required=False, default='')
+    parser.add_argument('--master-board', type=int, help='board the recording comes from', required=False,
+                        default=BoardIds.GANGLION_BOARD.value)
+    parser.add_argument('--calibration', type=float, help='calibration time in seconds', default=5.0)
+    parser.add_argument('--duration', type=float, help='time each loop runs in seconds', default=10.0)
+    parser.add_argument('--chunk-samples', type=int, help='samples to wait for before reading', default=2)
+    args = parser.parse_args()
+
+    BoardShim.disable_board_logger()
+    params = BrainFlowInputParams()
+    if args.file:
+        params.file = args.file
+        params.master_board = args.master_board
+        board_id = BoardIds.PLAYBACK_FILE_BOARD.value
+        data_board_id = args.master_board
+    else:
+        board_id = BoardIds.SYNTHETIC_BOARD.value
+        data_board_id = board_id
+    sampling_rate = BoardShim.get_sampling_rate(data_board_id)
+    timestamp_channel = BoardShim.get_timestamp_channel(data_board_id)
+
+    board = BoardShim(board_id, params)
+    board.prepare_session()
+    try:
+        board.start_stream(45000)
+        if args.file:
+            board.config_board('loopback_true') # keep replaying the recording
+        time.sleep(args.calibration)
+        detector = FlexDetector()
+        detector.calibrate(board.get_board_data()[1])
+        detector.finish_calibration()
+
+        board.get_board_data()
+        measure('Busy loop', legacy_loop, board, args.duration, detector.mean, detector.threshold, timestamp_channel)
+        board.get_board_data()
+        measure('FlexDetector', detector_loop, board, args.duration, detector, timestamp_channel,
+                sampling_rate, args.chunk_samples)
+    finally:
+        board.release_session()
+
+
+if __name__ == "__main__":
+    main()
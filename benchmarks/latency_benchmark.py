@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import numpy as np
+
+from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
+from brainflow.exit_codes import BrainFlowError
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from flex_detector import FlexDetector, wait_for_samples
+from streaming_filter import StreamingFilter
+from incremental_psd import IncrementalWelch, BandPowers
+from dataset_catalog import DatasetCatalog
+from flex_latency_benchmark import StubKeySink
+
+# End-to-end latency of the two control loops (Dino jump and beta band cursor),
+# replaying official-tests recordings through the playback board, or the synthetic
+# board if the recording cannot be played. Every loop is split in acquire, filter,
+# feature and decide stages; outputs go to a stub key sink that records how long
+# after the triggering sample was acquired they happened. Results are written as
+# JSON so they can be compared between runs.
+
+STAGES = ('acquire', 'filter', 'feature', 'decide')
+
+BETABAND_FILTER_STAGES = [
+    {'type': 'bandpass', 'low': 0.5, 'high': 40.0, 'order': 4, 'filter': 'butterworth'},
+    {'type': 'bandstop', 'low': 48.0, 'high': 52.0, 'order': 4, 'filter': 'butterworth'},
+]
+BETABAND_BANDS = [(1.0, 4.0), (4.0, 8.0), (8.0, 13.0), (13.0, 30.0), (30.0, 55.0)]
+BETA = 3
+
+
+class StageTimer:
+    def __init__(self):
+        self.wall = {stage: list() for stage in STAGES}
+        self.cpu = {stage: 0.0 for stage in STAGES}
+        self.stage = None
+
+    def __call__(self, stage):
+        self.stage = stage
+        return self
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+
+    def __exit__(self, *exc):
+        self.wall[self.stage].append(time.perf_counter() - self.wall_start)
+        self.cpu[self.stage] += time.thread_time() - self.cpu_start
+
+    def summary(self):
+        result = dict()
+        for stage in STAGES:
+            wall = np.array(self.wall[stage]) * 1000
+            result[stage] = {
+                'calls': len(wall),
+                'cpu_ms_total': self.cpu[stage] * 1000,
+                'wall_ms_mean': float(wall.mean()) if len(wall) else 0.0,
+                'wall_ms_p99': float(np.percentile(wall, 99)) if len(wall) else 0.0,
+            }
+        return result
+
+
+class DinoPipeline:
+    name = 'dino'
+
+    def __init__(self, sampling_rate, channel, calibration_data):
+        self.channel = channel
+        self.filter = StreamingFilter([{'type': 'rolling_mean', 'period': 2}], sampling_rate)
+        # Smoothing is done by the filter stage
+        self.detector = FlexDetector(smoothing_period=1)
+        self.detector.calibrate(self.filter.process(calibration_data[[channel]])[0])
+        self.detector.finish_calibration()
+        self.filter.reset()
+
+    def run(self, data, timestamps, timer, sink):
+        with timer('filter'):
+            filtered = self.filter.process(data[[self.channel]])[0]
+        with timer('feature'):
+            events = self.detector.detect(filtered, timestamps)
+        with timer('decide'):
+            for index, timestamp in events:
+                sink.press(timestamp)
+
+
+class BetabandPipeline:
+    name = 'betaband'
+
+    def __init__(self, sampling_rate, channel, calibration_data, hop=2.0):
+        self.channel = channel
+        self.hop = hop
+        self.filter = StreamingFilter(BETABAND_FILTER_STAGES, sampling_rate)
+        nperseg = 256 if sampling_rate < 256 else 512
+        self.welch = IncrementalWelch(1, sampling_rate, nperseg, nperseg // 2, num_segments=8)
+        self.bands = BandPowers(self.welch.freqs, BETABAND_BANDS)
+        self.welch.update(self.filter.process(calibration_data[[channel]]))
+        powers = self.bands.compute(self.welch.psd)[0]
+        self.baseline_low = powers[:BETA].sum()
+        self.baseline_beta = powers[BETA]
+        self.next_step = None
+        self.last_step = (0, 0)
+
+    def run(self, data, timestamps, timer, sink):
+        with timer('filter'):
+            filtered = self.filter.process(data[[self.channel]])
+        with timer('feature'):
+            self.welch.update(filtered)
+            powers = self.bands.compute(self.welch.psd)[0]
+        with timer('decide'):
+            if self.next_step is None:
+                self.next_step = timestamps[0] + self.hop
+            if timestamps[-1] >= self.next_step:
+                # One cursor step, decided on the newest sample
+                x_step = 1 if powers[:BETA].sum() >= self.baseline_low else -1
+                y_step = 1 if powers[BETA] >= self.baseline_beta else -1
+                self.last_step = (x_step, y_step)
+                sink.press(timestamps[-1])
+                self.next_step += self.hop
+
+
+def open_board(recording, master_board):
+    # Playback board for a recording, synthetic board as a fallback
+    BoardShim.disable_board_logger()
+    if recording:
+        params = BrainFlowInputParams()
+        params.file = recording
+        params.master_board = master_board
+        board = BoardShim(BoardIds.PLAYBACK_FILE_BOARD.value, params)
+        try:
+            board.prepare_session()
+            return board, master_board, os.path.basename(recording)
+        except BrainFlowError as e:
+            print('Cannot play back %s (%s), using the synthetic board' % (recording, e))
+    board = BoardShim(BoardIds.SYNTHETIC_BOARD.value, BrainFlowInputParams())
+    board.prepare_session()
+    return board, BoardIds.SYNTHETIC_BOARD.value, 'synthetic'
+
+
+def run_pipeline(pipeline_class, recording, master_board, args):
+    board, data_board_id, source = open_board(recording, master_board)
+    sampling_rate = BoardShim.get_sampling_rate(data_board_id)
+    timestamp_channel = BoardShim.get_timestamp_channel(data_board_id)
+    channel = BoardShim.get_exg_channels(data_board_id)[0]
+    try:
+        board.start_stream(45000)
+        if recording and data_board_id != BoardIds.SYNTHETIC_BOARD.value:
+            board.config_board('loopback_true')
+        time.sleep(args.calibration)
+        pipeline = pipeline_class(sampling_rate, channel, board.get_board_data())
+
+        timer = StageTimer()
+        sink = StubKeySink()
+        num_samples = 0
+        busy = 0.0
+        end = time.monotonic() + args.duration
+        while time.monotonic() < end:
+            if not wait_for_samples(board, args.chunk_samples, sampling_rate, timeout=end - time.monotonic()):
+                break
+            start = time.perf_counter()
+            with timer('acquire'):
+                data = board.get_board_data()
+            pipeline.run(data, data[timestamp_channel], timer, sink)
+            busy += time.perf_counter() - start
+            num_samples += data.shape[1]
+    finally:
+        board.release_session()
+
+    latencies = np.array(sink.latencies) * 1000
+    return {
+        'pipeline': pipeline.name,
+        'source': source,
+        'sampling_rate': sampling_rate,
+        'duration_s': args.duration,
+        'events': len(latencies),
+        'latency_ms': {
+            'p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p95': float(np.percentile(latencies, 95)) if len(latencies) else None,
+            'p99': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        },
+        'samples': num_samples,
+        'throughput_samples_per_s': num_samples / busy if busy > 0 else None,
+        'stages': timer.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('recordings', nargs='*', help='recording names from the catalog or CSV paths')
+    parser.add_argument('--all', action='store_true', help='replay every recording of the official-tests archive')
+    parser.add_argument('--synthetic', action='store_true', help='use the synthetic board instead of recordings')
+    parser.add_argument('--pipelines', type=str, help='comma separated: dino, betaband', default='dino,betaband')
+    parser.add_argument('--master-board', type=int, help='board the recordings come from', default=BoardIds.GANGLION_BOARD.value)
+    parser.add_argument('--calibration', type=float, help='calibration time in seconds', default=3.0)
+    parser.add_argument('--duration', type=float, help='measured time per run in seconds', default=10.0)
+    parser.add_argument('--chunk-samples', type=int, help='samples to wait for before reading', default=2)
+    parser.add_argument('--output', type=str, help='JSON results file', default='latency_results.json')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        recordings = ['']
+    else:
+        catalog = DatasetCatalog()
+        names = [entry.name for entry in catalog] if args.all else (args.recordings or ['Justi-TA-3.1'])
+        recordings = [name if os.path.exists(name) else catalog.get(name).path for name in names]
+
+    pipelines = {'dino': DinoPipeline, 'betaband': BetabandPipeline}
+    results = list()
+    for recording in recordings:
+        for name in args.pipelines.split(','):
+            result = run_pipeline(pipelines[name], recording, args.master_board, args)
+            results.append(result)
+            latency = result['latency_ms']
+            print('%-9s %-28s %4d events  p50 %s  p95 %s  p99 %s ms  %.0f samples/s' %
+                  (result['pipeline'], result['source'], result['events'],
+                   *['%.2f' % latency[p] if latency[p] is not None else '-' for p in ('p50', 'p95', 'p99')],
+                   result['throughput_samples_per_s'] or 0))
+            for stage, stats in result['stages'].items():
+                print('    %-8s %5d calls  cpu %8.2f ms  wall mean %.4f ms  p99 %.4f ms' %
+                      (stage, stats['calls'], stats['cpu_ms_total'], stats['wall_ms_mean'], stats['wall_ms_p99']))
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }, f, indent=2)
+    print('Results written to %s' % args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from ring_buffer import RingBuffer
+from minmax_pyramid import MinMaxPyramid
+
+# Data path cost of one live plot tick (50 ms of new samples) without drawing:
+# the old RingBuffer + tolist() of the full window against MinMaxPyramid at the
+# plot's pixel width, for growing windows. Also reports how many points each
+# path hands to curve.setData, which is what pyqtgraph has to draw.
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--channels', type=int, help='plotted channels', default=4)
+    parser.add_argument('--sampling-rate', type=int, help='samples per second', default=200)
+    parser.add_argument('--width', type=int, help='plot width in pixels', default=1000)
+    parser.add_argument('--ticks', type=int, help='measured ticks per window size', default=200)
+    args = parser.parse_args()
+
+    chunk = max(1, args.sampling_rate // 20)
+    for window_size in (4, 60, 300, 1800):
+        num_points = window_size * args.sampling_rate
+        ring = RingBuffer(args.channels, num_points)
+        pyramid = MinMaxPyramid(args.channels, num_points, sampling_rate=args.sampling_rate)
+        history = np.random.randn(args.channels, num_points).cumsum(axis=1)
+        ring.append(history)
+        pyramid.append(history)
+
+        start = time.perf_counter()
+        for _ in range(args.ticks):
+            ring.append(np.random.randn(args.channels, chunk))
+            data = ring.get()
+            lists = [data[count].tolist() for count in range(args.channels)]
+        legacy = (time.perf_counter() - start) / args.ticks
+
+        start = time.perf_counter()
+        for _ in range(args.ticks):
+            pyramid.append(np.random.randn(args.channels, chunk))
+            x, data = pyramid.get(args.width)
+        decimated = (time.perf_counter() - start) / args.ticks
+
+        print('%5d s window: tolist %8.3f ms/tick (%6d points/curve)   pyramid %6.3f ms/tick (%5d points/curve)' %
+              (window_size, legacy * 1000, len(lists[0]), decimated * 1000, data.shape[1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+from brainflow.data_filter import DataFilter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from recording import convert_csv, open_recording, EXTENSION
+
+# Load time and disk size of the CSV archive against the binary recordings.
+
+
+def timed(function, *args, repeat=3, **kwargs):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='*', help='CSV recordings, defaults to the official-tests archive')
+    args = parser.parse_args()
+    files = args.files or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'official-tests', '*.csv')))
+
+    totals = dict()
+    csv_bytes = 0
+    bin_bytes = 0
+    with tempfile.TemporaryDirectory() as out_dir:
+        for csv_path in files:
+            out_path = os.path.join(out_dir, os.path.splitext(os.path.basename(csv_path))[0] + EXTENSION)
+            convert_csv(csv_path, out_path)
+            csv_bytes += os.path.getsize(csv_path)
+            bin_bytes += os.path.getsize(out_path)
+
+            if not np.array_equal(open_recording(out_path).to_board_data(), DataFilter.read_file(csv_path)):
+                print('WARNING: %s does not round trip' % csv_path)
+
+            times = {
+                'DataFilter.read_file': timed(DataFilter.read_file, csv_path),
+                'np.genfromtxt': timed(np.genfromtxt, csv_path, delimiter='\t'),
+                'pd.read_csv': timed(pd.read_csv, csv_path, sep='\t', header=None),
+                'memmap open': timed(open_recording, out_path),
+                'memmap to_board_data': timed(lambda path: open_recording(path).to_board_data(), out_path),
+            }
+            for name, value in times.items():
+                totals[name] = totals.get(name, 0.0) + value
+
+    print('%d recordings' % len(files))
+    print('Disk: CSV %.1f KB, binary %.1f KB (%.1fx smaller)' % (csv_bytes / 1024, bin_bytes / 1024, csv_bytes / bin_bytes))
+    baseline = totals['DataFilter.read_file']
+    for name, value in totals.items():
+        print('%-22s %8.2f ms total  (%.1fx vs read_file)' % (name, value * 1000, baseline / value))
+
+
+if __name__ == "__main__":
+    main()
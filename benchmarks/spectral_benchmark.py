@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from brainflow.board_shim import BoardShim, BoardIds
+from brainflow.data_filter import DataFilter, WindowOperations
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from spectral_analysis import compute_spectrum
+from dataset_catalog import DatasetCatalog
+
+# Peak frequencies of the EMG channels of every official-tests recording, cut in
+# 1024 sample windows as in mycodes/fft.py: the old per channel perform_fft + boolean
+# mask + argsort against one compute_spectrum call per window. Math only, no plots.
+
+
+def legacy_peaks(window, channels, sampling_rate):
+    # mycodes/fft.py plot_fft before spectral_analysis, with the rfft frequency axis
+    peaks = list()
+    for channel in channels:
+        magnitude = np.abs(DataFilter.perform_fft(window[channel].copy(), WindowOperations.NO_WINDOW.value))
+        freq = np.fft.rfftfreq(window.shape[1], 1 / sampling_rate)
+        positive_freq = freq[(freq > 0) & (freq < 50)]
+        positive_mag = magnitude[(freq > 0) & (freq < 50)]
+        peaks.append(positive_freq[np.argsort(positive_mag)[-3:][::-1]])
+    return np.array(peaks)
+
+
+def batched_peaks(window, channels, sampling_rate):
+    return compute_spectrum(window, sampling_rate, channels, max_freq=50, num_peaks=3).peak_freqs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--window', type=int, help='samples per FFT window', default=1024)
+    parser.add_argument('--repeats', type=int, help='passes over the archive, the best is reported', default=5)
+    args = parser.parse_args()
+
+    board_id = BoardIds.GANGLION_BOARD.value
+    channels = BoardShim.get_emg_channels(board_id)
+    sampling_rate = BoardShim.get_sampling_rate(board_id)
+    catalog = DatasetCatalog()
+    windows = list()
+    for entry in catalog:
+        data = catalog.load(entry, copy=False)
+        for start in range(0, data.shape[1] - args.window + 1, args.window):
+            windows.append(np.ascontiguousarray(data[:, start:start + args.window]))
+    print('%d windows of %d samples x %d channels' % (len(windows), args.window, len(channels)))
+
+    results = dict()
+    for name, function in [('per channel + argsort', legacy_peaks), ('compute_spectrum', batched_peaks)]:
+        best = None
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            peaks = [function(window, channels, sampling_rate) for window in windows]
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = (best, peaks)
+        print('    %-22s %8.2f ms  %6.1f us/window' % (name, best * 1000, best * 1e6 / max(len(windows), 1)))
+
+    legacy, batched = results['per channel + argsort'][1], results['compute_spectrum'][1]
+    same = all(np.array_equal(a, b) for a, b in zip(legacy, batched))
+    print('speedup %.1fx, same peaks: %s' % (results['per channel + argsort'][0] / results['compute_spectrum'][0], same))
+
+
+if __name__ == "__main__":
+    main()
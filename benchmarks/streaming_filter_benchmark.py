@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from brainflow.board_shim import BoardShim, BoardIds
+from brainflow.data_filter import DataFilter, FilterTypes, DetrendOperations
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from ring_buffer import RingBuffer
+from streaming_filter import StreamingFilter
+
+# Replays a recording tick by tick the way plot_real_time.Graph.update sees it
+# and compares re-filtering the whole window against the streaming chain.
+
+FILTER_STAGES = [
+    {'type': 'bandpass', 'low': 3.0, 'high': 45.0, 'order': 2, 'filter': 'butterworth'},
+    {'type': 'bandstop', 'low': 48.0, 'high': 52.0, 'order': 2, 'filter': 'butterworth'},
+    {'type': 'bandstop', 'low': 58.0, 'high': 62.0, 'order': 2, 'filter': 'butterworth'},
+]
+
+
+def window_filter(window, sampling_rate):
+    # Current Graph.update chain, run over the full window every tick
+    for row in window:
+        DataFilter.detrend(row, DetrendOperations.CONSTANT.value)
+        DataFilter.perform_bandpass(row, sampling_rate, 3.0, 45.0, 2, FilterTypes.BUTTERWORTH_ZERO_PHASE, 0)
+        DataFilter.perform_bandstop(row, sampling_rate, 48.0, 52.0, 2, FilterTypes.BUTTERWORTH_ZERO_PHASE, 0)
+        DataFilter.perform_bandstop(row, sampling_rate, 58.0, 62.0, 2, FilterTypes.BUTTERWORTH_ZERO_PHASE, 0)
+    return window
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--file', type=str, help='recording to replay',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'official-tests', 'Ian-BB-3.1(unfiltered).csv'))
+    parser.add_argument('--board-id', type=int, help='board the recording comes from', default=BoardIds.GANGLION_BOARD.value)
+    parser.add_argument('--update-speed-ms', type=int, default=50)
+    parser.add_argument('--window-size', type=int, help='plotted window in seconds', default=4)
+    args = parser.parse_args()
+
+    data = DataFilter.read_file(args.file)
+    channels = BoardShim.get_emg_channels(args.board_id)
+    sampling_rate = BoardShim.get_sampling_rate(args.board_id)
+    num_points = args.window_size * sampling_rate
+    tick = max(1, sampling_rate * args.update_speed_ms // 1000)
+    signals = np.ascontiguousarray(data[channels])
+    if signals.shape[1] < num_points:
+        parser.error('recording has %d samples, shorter than a %d s window' % (signals.shape[1], args.window_size))
+
+    stream = StreamingFilter(FILTER_STAGES, sampling_rate)
+    filtered = RingBuffer(len(channels), num_points)
+    window_times = []
+    stream_times = []
+    errors = []
+    amplitude_ratios = []
+    # Prime the streaming chain with the first window, like the plot filling up
+    filtered.append(stream.process(signals[:, :num_points]))
+    for end in range(num_points + tick, signals.shape[1] + 1, tick):
+        start = time.perf_counter()
+        reference = window_filter(signals[:, end - num_points:end].copy(), sampling_rate)
+        window_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        filtered.append(stream.process(signals[:, end - tick:end]))
+        window = filtered.get()
+        stream_times.append(time.perf_counter() - start)
+
+        # Compare on the second half of the window, away from the zero-phase edge effects
+        half = num_points // 2
+        diff = window[:, half:] - reference[:, half:]
+        reference_rms = np.sqrt(np.mean(reference[:, half:] ** 2, axis=1))
+        errors.append(np.sqrt(np.mean(diff ** 2, axis=1)) / reference_rms)
+        amplitude_ratios.append(np.sqrt(np.mean(window[:, half:] ** 2, axis=1)) / reference_rms)
+
+    window_times = np.array(window_times) * 1000
+    stream_times = np.array(stream_times) * 1000
+    errors = np.array(errors)
+    amplitude_ratios = np.array(amplitude_ratios)
+    print('Recording: %s' % os.path.basename(args.file))
+    print('Ticks: %d, %d new samples per tick, %d sample window' % (len(window_times), tick, num_points))
+    print('Full window filter: %.3f ms/tick (p95 %.3f ms)' % (window_times.mean(), np.percentile(window_times, 95)))
+    print('Streaming filter:   %.3f ms/tick (p95 %.3f ms)' % (stream_times.mean(), np.percentile(stream_times, 95)))
+    print('Speedup: %.1fx' % (window_times.mean() / stream_times.mean()))
+    print('Relative RMS difference vs zero-phase output per channel: %s' %
+          ', '.join('%.3f' % e for e in errors.mean(axis=0)))
+    # Causal filters delay each frequency differently, so sample by sample the traces
+    # differ even when the amplitude on screen is the same
+    print('RMS amplitude ratio vs zero-phase output per channel: %s' %
+          ', '.join('%.3f' % r for r in amplitude_ratios.mean(axis=0)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+import text_loader
+
+# Parsing the spectogram/ text recordings: the line split + DataFrame + to_numeric of
+# spectogram/txt.py, np.genfromtxt as in editEMG.py, and text_loader (uncached parse,
+# first load that also writes the cache, cached memmap load). The files are copied to
+# a temporary directory so the cache is not written into the repository.
+
+FILES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spectogram', 'files')
+
+
+def split_lines(path, header):
+    # spectogram/txt.py
+    with open(path, 'r') as file:
+        lines = [line.strip() for line in file.readlines() if not line.startswith('%')]
+    if header['format'] == 'openbci_txt':
+        columns = lines[0].split(', ')
+        lines = lines[1:]
+    else:
+        columns = None
+    separator = ', ' if header['delimiter'] == ',' else header['delimiter']
+    df = pd.DataFrame([line.split(separator) for line in lines], columns=columns)
+    df = df.iloc[:, :header['num_columns']].apply(pd.to_numeric)
+    return df.to_numpy().T
+
+
+def genfromtxt(path, header):
+    # editEMG.py
+    data = np.genfromtxt(path, delimiter=header['delimiter'], skip_header=header['header_lines'],
+                         usecols=range(header['num_columns']))
+    return data.T
+
+
+def timed(function, repeats):
+    times = list()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        # Touch every value so lazily mapped pages are paid for too
+        float(np.sum(result))
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='*', help='text recordings, defaults to OpenBCI2.txt and brainflow5.csv')
+    parser.add_argument('--repeats', type=int, help='runs per method, the best is reported', default=5)
+    args = parser.parse_args()
+
+    files = args.files or [os.path.join(FILES_DIRECTORY, 'OpenBCI2.txt'), os.path.join(FILES_DIRECTORY, 'brainflow5.csv')]
+    with tempfile.TemporaryDirectory() as directory:
+        for source in files:
+            path = os.path.join(directory, os.path.basename(source))
+            shutil.copy(source, path)
+            header = text_loader.read_header(path)
+            _, data_path, meta_path = text_loader.cache_paths(path)
+
+            def first_load():
+                for cached in (data_path, meta_path):
+                    if os.path.exists(cached):
+                        os.remove(cached)
+                return text_loader.load(path)[0]
+
+            # np.genfromtxt parses with float(), the values every method is compared to
+            expected = genfromtxt(path, header)
+            reference = None
+            print('%s (%d bytes, %s)' % (os.path.basename(path), os.path.getsize(path), header['format']))
+            for name, function, repeats in [
+                    ('split lines + DataFrame', lambda: split_lines(path, header), args.repeats),
+                    ('np.genfromtxt', lambda: genfromtxt(path, header), args.repeats),
+                    ('text_loader, no cache', lambda: text_loader.load(path, use_cache=False)[0], args.repeats),
+                    ('text_loader, first load', first_load, args.repeats),
+                    ('text_loader, cached', lambda: text_loader.load(path)[0], args.repeats * 20)]:
+                seconds, data = timed(function, repeats)
+                if reference is None:
+                    reference = seconds
+                error = np.max(np.abs(np.asarray(data) - expected))
+                print('    %-26s %9.3f ms  %7.1fx  max |error| %.3g' % (name, seconds * 1000, reference / seconds, error))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from brainflow.board_shim import BoardShim
+from brainflow.data_filter import DataFilter, WaveletTypes, WaveletDenoisingTypes, ThresholdTypes, \
+    WaveletExtensionTypes, NoiseEstimationLevelTypes
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from dataset_catalog import DatasetCatalog, DEFAULT_DIRECTORY
+from wavelet_denoising import WaveletDenoiser, denoise_recording, filter_bank, overlap_save_windows
+
+# Cuts every recording of the archive in blocks of --block-length samples, like the
+# 500 samples of brainflow_code_samples/denoising.py, and denoises each block of every
+# EMG channel with DataFilter.perform_wavelet_denoising, one call per channel and
+# block, and with WaveletDenoiser, all blocks and channels of the archive in one call.
+# Reports throughput (best of --repeats runs) and the largest difference for every
+# denoising / threshold / noise estimation combination, then the same for the
+# overlap-save offline pass over every recording, against BrainFlow denoising the
+# same windows.
+
+METHODS = [(denoising, threshold, noise_level)
+           for denoising in WaveletDenoisingTypes for threshold in ThresholdTypes for noise_level in NoiseEstimationLevelTypes]
+
+
+def brainflow_blocks(blocks, wavelet, level, denoising, threshold, noise_level):
+    out = blocks.copy()
+    for block in out:
+        for row in block:
+            DataFilter.perform_wavelet_denoising(row, wavelet, level, denoising, threshold,
+                                                 WaveletExtensionTypes.SYMMETRIC, noise_level)
+    return out
+
+
+def brainflow_recording(signals, block_length, wavelet, level):
+    # denoise_recording's windows and segments, one DataFilter call per channel and window
+    num_samples = signals.shape[-1]
+    segments, starts, hop = overlap_save_windows(num_samples, block_length)
+    out = np.empty_like(signals)
+    for segment, start in zip(segments, starts):
+        window = signals[:, start:start + block_length].copy()
+        for row in window:
+            DataFilter.perform_wavelet_denoising(row, wavelet, level)
+        end = min(segment + hop, num_samples)
+        out[:, segment:end] = window[:, segment - start:end - start]
+    return out
+
+
+def best_time(function, repeats):
+    # Shortest of `repeats` runs, and the result of the last one
+    elapsed = list()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--directory', type=str, help='recordings archive', required=False, default=DEFAULT_DIRECTORY)
+    parser.add_argument('--block-length', type=int, help='samples per block', required=False, default=500)
+    parser.add_argument('--level', type=int, help='decomposition level', required=False, default=3)
+    parser.add_argument('--workers', type=int, help='threads of the offline pass', required=False, default=None)
+    parser.add_argument('--repeats', type=int, help='runs timed per measurement', required=False, default=5)
+    args = parser.parse_args()
+
+    DataFilter.disable_data_logger()
+    wavelet = WaveletTypes.BIOR3_9
+    catalog = DatasetCatalog(args.directory)
+    channels = BoardShim.get_emg_channels(catalog.board_id)
+    recordings = list()
+    blocks = list()
+    for entry in catalog:
+        signals = np.ascontiguousarray(catalog.load(entry, copy=False)[channels])
+        num_blocks = signals.shape[1] // args.block_length
+        recording_blocks = signals[:, :num_blocks * args.block_length].reshape(len(channels), num_blocks,
+                                                                               args.block_length)
+        recordings.append(signals)
+        blocks.append(recording_blocks.transpose(1, 0, 2))
+    # (blocks x channels x samples)
+    blocks = np.ascontiguousarray(np.concatenate(blocks))
+
+    start = time.perf_counter()
+    filter_bank(wavelet)
+    print('Recordings: %d, %d blocks of %d channels x %d samples' % (len(recordings), blocks.shape[0], len(channels),
+                                                                   args.block_length))
+    print('Filter bank read from BrainFlow in %.1f ms (once per wavelet)\n' % ((time.perf_counter() - start) * 1000))
+
+    print('%-11s %-5s %-11s %12s %12s %8s %10s %13s' %
+          ('denoising', 'thr', 'noise', 'brainflow', 'denoiser', 'speedup', 'max |err|', 'blocks equal'))
+    for denoising, threshold, noise_level in METHODS:
+        denoiser = WaveletDenoiser(wavelet, args.level, denoising, threshold, noise_level=noise_level)
+        brainflow_time, reference = best_time(
+            lambda: brainflow_blocks(blocks, wavelet, args.level, denoising, threshold, noise_level), args.repeats)
+        denoiser_time, denoised = best_time(lambda: denoiser.denoise(blocks), args.repeats)
+        # Largest difference of every channel block
+        errors = np.abs(denoised - reference).max(axis=2)
+        print('%-11s %-5s %-11s %8.2f MS/s %8.2f MS/s %7.1fx %10.2e %6d / %d' %
+              (denoising.name, threshold.name, noise_level.name, blocks.size / brainflow_time / 1e6,
+               blocks.size / denoiser_time / 1e6, brainflow_time / denoiser_time, errors.max(),
+               np.count_nonzero(errors < 1e-9), errors.size))
+
+    # Offline overlap-save pass over the whole recordings, default method
+    total_samples = sum(signals.size for signals in recordings)
+    brainflow_time, reference = best_time(
+        lambda: [brainflow_recording(signals, args.block_length, wavelet, args.level) for signals in recordings],
+        args.repeats)
+    print('\nOverlap-save over the recordings, brainflow %.2f MS/s' % (total_samples / brainflow_time / 1e6))
+    for workers in (1, args.workers):
+        denoiser_time, denoised = best_time(
+            lambda: [denoise_recording(signals, args.block_length, workers=workers) for signals in recordings],
+            args.repeats)
+        errors = [np.abs(out - expected).max() for out, expected in zip(denoised, reference)]
+        print('  denoiser, %s threads: %.2f MS/s, %.1fx, max |err| %.2e, %d / %d recordings equal' %
+              (workers or 'all', total_samples / denoiser_time / 1e6, brainflow_time / denoiser_time, max(errors),
+               sum(error < 1e-9 for error in errors), len(errors)))
+
+
+if __name__ == "__main__":
+    main()
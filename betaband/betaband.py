@@ -1,10 +1,15 @@
+import os
+import sys
 import argparse
 import time
 import numpy as np
 import matplotlib.pyplot as plt
 
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
-from brainflow.data_filter import DataFilter, FilterTypes, NoiseTypes, DetrendOperations
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from shared_board import SharedBoard
+from band_features import BandPowerExtractor, BRAINFLOW_BANDS, BRAINFLOW_FILTER_STAGES
 
 DELTA = 0 # 1-4 Hz
 THETA = 1 # 4-8 Hz
@@ -30,6 +35,32 @@ COLOR = 'r'
 
 CALIBRATION_TIME = 10
 
+FEATURE_WINDOW = 2.0 # seconds of signal behind every feature
+FEATURE_HOP = 0.25 # seconds between two features
+
+CUSTOM_FILTER_STAGES = [
+    {'type': 'detrend', 'detrend': 'constant'},
+    {'type': 'bandpass', 'low': 0.5, 'high': 40.0, 'order': 4},
+    {'type': 'environmental_noise', 'noise': 50},
+]
+
+def make_extractor (sampling_rate, timestamp_channel = None):
+    # Custom filters replace the ones Brainflow applies before its band powers
+    bands = [CUSTOM_LOW_BAND, CUSTOM_BETA_BAND] if APPLY_CUSTOM_BANDS else BRAINFLOW_BANDS
+    stages = CUSTOM_FILTER_STAGES if APPLY_CUSTOM_FILTERS else BRAINFLOW_FILTER_STAGES
+    return BandPowerExtractor([1], sampling_rate, bands, FEATURE_WINDOW, FEATURE_HOP, filter_stages = stages,
+                              timestamp_channel = timestamp_channel)
+
+def get_low_beta_band_powers (features):
+    # Low and beta relative band powers, averaged over the given BandFeatures
+    avg_bps = np.mean([feature.avg for feature in features], axis = 0)
+    if(APPLY_CUSTOM_BANDS):
+        ### Custom Band Powers
+        return avg_bps[0], avg_bps[1]
+
+    ### Brainflow default Band Powers
+    return sum(avg_bps[:BETA]), avg_bps[BETA]
+
 def main ():
     parser = argparse.ArgumentParser ()
     
@@ -46,6 +77,7 @@ def main ():
     parser.add_argument ('--board-id', type = int, help  = 'board id, check docs to get a list of supported boards', required = False, default = BoardIds.GANGLION_BOARD.value)
     parser.add_argument ('--log', action = 'store_true')
     parser.add_argument ('--file-name', type = str, help  = 'file name', required = False, default = 'default')
+    parser.add_argument ('--shared-board', type = str, help = 'read from the acquisition daemon with this shared memory name', required = False, default = '')
     args = parser.parse_args ()
 
     params = BrainFlowInputParams ()
@@ -59,13 +91,17 @@ def main ():
     params.timeout = args.timeout
 
     sampling_rate = BoardShim.get_sampling_rate(BoardIds.GANGLION_BOARD.value)
+    extractor = make_extractor(sampling_rate, BoardShim.get_timestamp_channel(BoardIds.GANGLION_BOARD.value))
 
     if (args.log):
         BoardShim.enable_dev_board_logger()
     else:
         BoardShim.disable_board_logger()
 
-    board = BoardShim (args.board_id, params)
+    if args.shared_board:
+        board = SharedBoard (args.shared_board)
+    else:
+        board = BoardShim (args.board_id, params)
     board.prepare_session ()
 
     board.start_stream (45000, args.streamer_params)
@@ -82,24 +118,8 @@ def main ():
         time.sleep(1)
 
     data = board.get_board_data() # get data
-    
-    # Filter & Denoise
-    if(APPLY_CUSTOM_FILTERS):
-        DataFilter.detrend(data[1], DetrendOperations.CONSTANT.value)
-        DataFilter.perform_bandpass(data[1], sampling_rate, 0.5, 40.0, 4, FilterTypes.BUTTERWORTH_ZERO_PHASE, 0)
-        DataFilter.remove_environmental_noise(data[1], sampling_rate, NoiseTypes.FIFTY.value)
-    
-    if(APPLY_CUSTOM_BANDS):
-        ### Custom Band Powers
-        avg_bps = DataFilter.get_custom_band_powers(data, [CUSTOM_LOW_BAND, CUSTOM_BETA_BAND], [1], sampling_rate, not APPLY_CUSTOM_FILTERS)
-        avg_low_bp = avg_bps[0][0]
-        avg_beta_bp = avg_bps[0][1]
-    else:
-        ### Brainflow default Band Powers
-        avg_bps = DataFilter.get_avg_band_powers(data, [1], sampling_rate, not APPLY_CUSTOM_FILTERS)
-        avg_beta_bp = avg_bps[0][BETA]
-        avg_low_bp = sum(avg_bps[0][:BETA])
-    
+    # Baseline: mean of the features of every window in the calibration
+    avg_low_bp, avg_beta_bp = get_low_beta_band_powers(extractor.update(data))
 
     print("Avg Beta Band Power")
     print(avg_beta_bp)
@@ -131,23 +151,12 @@ def main ():
             if(len(x) > MAX_STEPS): break
             time.sleep(2)
             data = board.get_board_data() # get data 
-            
-            if(APPLY_CUSTOM_FILTERS):
-                # Filter & Denoise
-                DataFilter.detrend(data[1], DetrendOperations.CONSTANT.value)
-                DataFilter.perform_bandpass(data[1], sampling_rate, 0.5, 40.0, 4, FilterTypes.BUTTERWORTH_ZERO_PHASE, 0)
-                DataFilter.remove_environmental_noise(data[1], sampling_rate, NoiseTypes.FIFTY.value)
-            
-            if(APPLY_CUSTOM_BANDS):
-                ### Custom Band Powers
-                new_avg_bps = DataFilter.get_custom_band_powers(data, [CUSTOM_LOW_BAND, CUSTOM_BETA_BAND], [1], sampling_rate, not APPLY_CUSTOM_FILTERS)
-                new_avg_low_bp = new_avg_bps[0][0]
-                new_avg_beta_bp = new_avg_bps[0][1]
-            else:
-                ### Brainflow default Band Powers
-                new_avg_bps = DataFilter.get_avg_band_powers(data, [1], sampling_rate, not APPLY_CUSTOM_FILTERS)
-                new_avg_low_bp = sum(new_avg_bps[0][:BETA])
-                new_avg_beta_bp = new_avg_bps[0][BETA]
+            features = extractor.update(data)
+            if not features:
+                continue
+            # mean of every window completed since the last step (one per FEATURE_HOP),
+            # as for the calibration baseline
+            new_avg_low_bp, new_avg_beta_bp = get_low_beta_band_powers(features)
                 
             # checking if new low band avg is above threshold
             if(new_avg_low_bp >= avg_low_bp):
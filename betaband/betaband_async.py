@@ -0,0 +1,215 @@
+import os
+import sys
+import queue
+import argparse
+import threading
+import time
+import matplotlib.pyplot as plt
+
+from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from shared_board import SharedBoard
+from betaband import make_extractor, get_low_beta_band_powers, MAX_X, MAX_Y, MAX_STEPS, POINT_X, POINT_Y, COLOR, CALIBRATION_TIME
+
+# Same experiment as betaband.py, split in three parts so drawing never moves the
+# measurement windows:
+#   acquisition thread  wakes up on a fixed grid (start + n * STEP_PERIOD), so a late
+#                       wake up does not push the following ones, and drains the board
+#   feature thread      feeds each window to the band power extractor, steps the cursor
+#                       on the mean of the features it completed, logged with timestamps
+#   main thread         matplotlib only, appends the new points to one Line2D
+# A slow redraw only delays when a step shows up on screen, not when it is measured.
+
+STEP_PERIOD = 2.0 # seconds between band power measurements
+RENDER_INTERVAL = 0.05 # GUI event loop slice of the renderer
+
+def acquisition_loop (board, windows, stop_event, start):
+    step = 0
+    while not stop_event.is_set():
+        step += 1
+        deadline = start + step * STEP_PERIOD
+        if stop_event.wait(max(0.0, deadline - time.monotonic())):
+            break
+        acquired = time.monotonic()
+        data = board.get_board_data()
+        # Drop grid points that were missed entirely, the window just gets longer
+        missed = int((acquired - deadline) // STEP_PERIOD)
+        windows.put((step, deadline, acquired, data))
+        step += missed
+    windows.put(None)
+
+def feature_loop (windows, points, stop_event, extractor, avg_low_bp, avg_beta_bp, log, start):
+    x, y = 0, 0
+    num_steps = 0
+    while True:
+        window = windows.get()
+        if window is None:
+            break
+        step, deadline, acquired, data = window
+        features = extractor.update(data)
+        if not features:
+            continue
+        # mean of every window completed since the last step, as for the baseline
+        new_avg_low_bp, new_avg_beta_bp = get_low_beta_band_powers(features)
+        done = time.monotonic()
+
+        # checking if new low band avg is above threshold
+        if(new_avg_low_bp >= avg_low_bp):
+            x = min(x + 1, MAX_X - 1)
+        else:
+            x = max(x - 1, 0)
+
+        # checking if new beta band avg is above threshold
+        if(new_avg_beta_bp >= avg_beta_bp):
+            y = min(y + 1, MAX_Y - 1)
+        else:
+            y = max(y - 1, 0)
+
+        num_steps += 1
+        points.put((x, y))
+        print("Step {}: [{}, {}]".format(num_steps, x, y))
+        log.write("{:.3f}\t{}\t{}\t{:.3f}\t{:.2f}\t{:.2f}\t{}\t{:.6g}\t{:.6g}\t{}\t{}\n".format(
+            time.time(), num_steps, step, deadline - start, (acquired - deadline) * 1000, (done - acquired) * 1000,
+            data.shape[1], new_avg_low_bp, new_avg_beta_bp, x, y))
+        log.flush()
+        if num_steps >= MAX_STEPS:
+            stop_event.set()
+    points.put(None)
+
+def main ():
+    parser = argparse.ArgumentParser ()
+
+    # use docs to check which parameters are required for specific board, e.g. for Cyton - set serial port
+    parser.add_argument ('--timeout', type = int, help  = 'timeout for device discovery or connection', required = False, default = 0)
+    parser.add_argument ('--ip-port', type = int, help  = 'ip port', required = False, default = 0)
+    parser.add_argument ('--ip-protocol', type = int, help  = 'ip protocol, check IpProtocolType enum', required = False, default = 0)
+    parser.add_argument ('--ip-address', type = str, help  = 'ip address', required = False, default = '')
+    parser.add_argument ('--serial-port', type = str, help  = 'serial port', required = False, default = '/dev/cu.usbmodem11')
+    parser.add_argument ('--mac-address', type = str, help  = 'mac address', required = False, default = '')
+    parser.add_argument ('--other-info', type = str, help  = 'other info', required = False, default = '')
+    parser.add_argument ('--streamer-params', type = str, help  = 'streamer params', required = False, default = '')
+    parser.add_argument ('--serial-number', type = str, help  = 'serial number', required = False, default = '')
+    parser.add_argument ('--board-id', type = int, help  = 'board id, check docs to get a list of supported boards', required = False, default = BoardIds.GANGLION_BOARD.value)
+    parser.add_argument ('--log', action = 'store_true')
+    parser.add_argument ('--file-name', type = str, help  = 'file name', required = False, default = 'default')
+    parser.add_argument ('--shared-board', type = str, help = 'read from the acquisition daemon with this shared memory name', required = False, default = '')
+    parser.add_argument ('--settle-time', type = float, help = 'seconds to wait for data to stabilize', required = False, default = 10)
+    args = parser.parse_args ()
+
+    params = BrainFlowInputParams ()
+    params.ip_port = args.ip_port
+    params.serial_port = args.serial_port
+    params.mac_address = args.mac_address
+    params.other_info = args.other_info
+    params.serial_number = args.serial_number
+    params.ip_address = args.ip_address
+    params.ip_protocol = args.ip_protocol
+    params.timeout = args.timeout
+
+    if (args.log):
+        BoardShim.enable_dev_board_logger()
+    else:
+        BoardShim.disable_board_logger()
+
+    if args.shared_board:
+        board = SharedBoard (args.shared_board)
+    else:
+        board = BoardShim (args.board_id, params)
+    sampling_rate = BoardShim.get_sampling_rate(board.get_board_id())
+    extractor = make_extractor(sampling_rate, BoardShim.get_timestamp_channel(board.get_board_id()))
+    board.prepare_session ()
+
+    board.start_stream (45000, args.streamer_params)
+
+    ### Calibrate ###
+
+    print("Starting calibration...")
+    time.sleep(args.settle_time) # wait for data to stabilize
+    board.get_board_data() # clear buffer
+
+    print("Hold tight your muscle for a few seconds.")
+    for i in range(CALIBRATION_TIME):
+        print(CALIBRATION_TIME-i)
+        time.sleep(1)
+
+    data = board.get_board_data() # get data
+    avg_low_bp, avg_beta_bp = get_low_beta_band_powers(extractor.update(data))
+
+    print("Avg Beta Band Power")
+    print(avg_beta_bp)
+    print("Avg Low Band Powers")
+    print(avg_low_bp)
+
+    ### MAIN LOOP ###
+
+    # plotting the first frame, later steps only extend this line
+    x = [0]
+    y = [0]
+    fig = plt.figure()
+    graph = plt.plot(x, y, color = COLOR, linewidth = 2)[0]
+    circle = plt.Circle((POINT_X, POINT_Y), radius=4, color=COLOR, fill=False, linewidth=2)
+    plt.gca().add_artist(circle)
+    plt.plot(POINT_X, POINT_Y, '+', color='black')
+    plt.ylim(0,MAX_X)
+    plt.xlim(0,MAX_Y)
+    plt.xlabel('Low frequency')
+    plt.ylabel('High frequency')
+    plt.show(block=False)
+    plt.pause(1)
+
+    print("Calibration complete. Start!")
+    print("Try to get into the circle. Press 'Ctrl+C' to quit.")
+    f = open(args.file_name + '.txt', 'w')
+    f.write("time\tstep\tgrid_step\tdeadline_s\tacquire_lag_ms\tfeature_ms\tsamples\tlow_bp\tbeta_bp\tx\ty\n")
+
+    windows = queue.Queue()
+    points = queue.Queue()
+    stop_event = threading.Event()
+    board.get_board_data() # first window starts now
+    # The calibration samples, filter state and hop count would otherwise be joined to
+    # samples taken after the plot setup
+    extractor.reset()
+    start = time.monotonic()
+    threads = [
+        threading.Thread(target=acquisition_loop, args=(board, windows, stop_event, start), daemon=True),
+        threading.Thread(target=feature_loop, args=(windows, points, stop_event, extractor,
+                                                    avg_low_bp, avg_beta_bp, f, start), daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        running = True
+        while running:
+            updated = False
+            while True:
+                try:
+                    point = points.get_nowait()
+                except queue.Empty:
+                    break
+                if point is None:
+                    running = False
+                    break
+                x.append(point[0])
+                y.append(point[1])
+                updated = True
+            if updated:
+                graph.set_data(x, y)
+                fig.canvas.draw_idle()
+            plt.pause(RENDER_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+    plt.savefig(args.file_name + ".png")
+    f.close()
+
+    board.stop_stream ()
+    board.release_session ()
+
+
+if __name__ == "__main__":
+    main ()
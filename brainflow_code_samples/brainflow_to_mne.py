@@ -1,3 +1,5 @@
+import os
+import sys
 import time
 
 import matplotlib
@@ -7,7 +9,9 @@ import matplotlib.pyplot as plt
 
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
 
-import mne
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from recording import RecordingWriter
+from mne_export import read_raw_recording
 
 
 def main():
@@ -17,21 +21,16 @@ def main():
     board = BoardShim(BoardIds.SYNTHETIC_BOARD.value, params)
     board.prepare_session()
     board.start_stream()
-    time.sleep(10)
-    data = board.get_board_data()
+    # Chunks go to a recording as they arrive, MNE reads it back with preload=False
+    with RecordingWriter('synthetic.bfrec', BoardIds.SYNTHETIC_BOARD.value) as writer:
+        for _ in range(10):
+            time.sleep(1)
+            writer.append(board.get_board_data())
     board.stop_stream()
     board.release_session()
 
-    eeg_channels = BoardShim.get_eeg_channels(BoardIds.SYNTHETIC_BOARD.value)
-    eeg_data = data[eeg_channels, :]
-    eeg_data = eeg_data / 1000000  # BrainFlow returns uV, convert to V for MNE
-
-    # Creating MNE objects from brainflow data arrays
-    ch_types = ['eeg'] * len(eeg_channels)
-    ch_names = BoardShim.get_eeg_names(BoardIds.SYNTHETIC_BOARD.value)
-    sfreq = BoardShim.get_sampling_rate(BoardIds.SYNTHETIC_BOARD.value)
-    info = mne.create_info(ch_names=ch_names, sfreq=sfreq, ch_types=ch_types)
-    raw = mne.io.RawArray(eeg_data, info)
+    # Creating an MNE object backed by the recording, in V with the board's EEG names
+    raw = read_raw_recording('synthetic.bfrec', ch_type='eeg')
     # its time to plot something!
     raw.plot_psd(average=True)
     plt.savefig('psd.png')
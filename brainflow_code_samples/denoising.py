@@ -1,3 +1,5 @@
+import os
+import sys
 import time
 
 import matplotlib
@@ -11,6 +13,9 @@ from brainflow.board_shim import BoardShim, BrainFlowInputParams, LogLevels, Boa
 from brainflow.data_filter import DataFilter, AggOperations, WaveletTypes, NoiseEstimationLevelTypes, \
     WaveletExtensionTypes, ThresholdTypes, WaveletDenoisingTypes
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from wavelet_denoising import WaveletDenoiser
+
 
 def main():
     BoardShim.enable_dev_board_logger()
@@ -35,18 +40,16 @@ def main():
     plt.savefig('before_processing.png')
 
     # demo for denoising, apply different methods to different channels for demo
-    for count, channel in enumerate(eeg_channels):
-        # first of all you can try simple moving median or moving average with different window size
-        if count == 0:
-            DataFilter.perform_rolling_filter(data[channel], 3, AggOperations.MEAN.value)
-        elif count == 1:
-            DataFilter.perform_rolling_filter(data[channel], 3, AggOperations.MEDIAN.value)
-        # if methods above dont work for your signal you can try wavelet based denoising
-        # feel free to try different parameters
-        else:
-            DataFilter.perform_wavelet_denoising(data[channel], WaveletTypes.BIOR3_9, 3,
-                                                 WaveletDenoisingTypes.SURESHRINK, ThresholdTypes.HARD,
-                                                 WaveletExtensionTypes.SYMMETRIC, NoiseEstimationLevelTypes.FIRST_LEVEL)
+    # first of all you can try simple moving median or moving average with different window size
+    DataFilter.perform_rolling_filter(data[eeg_channels[0]], 3, AggOperations.MEAN.value)
+    DataFilter.perform_rolling_filter(data[eeg_channels[1]], 3, AggOperations.MEDIAN.value)
+    # if methods above dont work for your signal you can try wavelet based denoising
+    # feel free to try different parameters; all remaining channels are denoised in one
+    # call, same as DataFilter.perform_wavelet_denoising on each of them
+    wavelet_channels = eeg_channels[2:]
+    denoiser = WaveletDenoiser(WaveletTypes.BIOR3_9, 3, WaveletDenoisingTypes.SURESHRINK, ThresholdTypes.HARD,
+                               WaveletExtensionTypes.SYMMETRIC, NoiseEstimationLevelTypes.FIRST_LEVEL)
+    data[wavelet_channels] = denoiser.denoise(data[wavelet_channels])
 
     df = pd.DataFrame(np.transpose(data))
     plt.figure()
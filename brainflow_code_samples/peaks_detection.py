@@ -1,3 +1,5 @@
+import os
+import sys
 import time
 
 import matplotlib
@@ -10,6 +12,9 @@ import matplotlib.pyplot as plt
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, LogLevels, BoardIds
 from brainflow.data_filter import DataFilter, ThresholdTypes, AggOperations, NoiseTypes, WaveletTypes, DetrendOperations
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from zscore_peaks import ZScorePeakDetector
+
 
 def main():
     BoardShim.enable_dev_board_logger()
@@ -45,7 +50,13 @@ def main():
         #df_wavelets[channel] = data[channel]
         # try different params for lag, influence and threshold, more info here https://stackoverflow.com/a/22640362
         # you can also try it wo wavelets
-        df_peaks[channel] = DataFilter.detect_peaks_z_score(data[channel], lag=20, influence=0.1, threshold=3.5)
+
+    # Same signals as DataFilter.detect_peaks_z_score(lag=20, influence=0.1, threshold=3.5) channel by
+    # channel, for all channels at once; the detector also takes the stream chunk by chunk
+    detector = ZScorePeakDetector(len(eeg_channels), lag=20, influence=0.1, threshold=3.5)
+    signals, events = detector.process(data[eeg_channels], data[BoardShim.get_timestamp_channel(board_id)])
+    for count, channel in enumerate(eeg_channels):
+        df_peaks[channel] = signals[count]
 
     plt.figure()
     df_wavelets[eeg_channels].plot(subplots=True)
@@ -1,3 +1,5 @@
+import os
+import sys
 import argparse
 import logging
 
@@ -6,9 +8,21 @@ from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
 from brainflow.data_filter import DataFilter, FilterTypes, WindowOperations, DetrendOperations
 from pyqtgraph.Qt import QtGui, QtCore
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from minmax_pyramid import MinMaxPyramid
+from ring_buffer import RingBuffer
+from streaming_filter import StreamingFilter
+from incremental_psd import IncrementalWelch, BandPowers, DEFAULT_BANDS
+from spatial_filter import SpatialFilter
+
+FILTER_STAGES = [
+    {'type': 'bandpass', 'low': 3.0, 'high': 45.0, 'order': 2, 'filter': 'butterworth'},
+    {'type': 'environmental_noise', 'noise': 'both', 'order': 2},
+]
+
 
 class Graph:
-    def __init__(self, board_shim):
+    def __init__(self, board_shim, window_size=4, spatial_filter=None, refit_seconds=0.0, calibration_seconds=10.0):
         pg.setConfigOption('background', 'w')
         pg.setConfigOption('foreground', 'k')
 
@@ -17,8 +31,30 @@ class Graph:
         self.exg_channels = [1,2]
         self.sampling_rate = BoardShim.get_sampling_rate(self.board_id)
         self.update_speed_ms = 50
-        self.window_size = 4
+        self.window_size = window_size
         self.num_points = self.window_size * self.sampling_rate
+        # Only new samples go through the filters, the plotted window is kept filtered
+        # and min/max decimated down to what the plots can show
+        self.filter = StreamingFilter(FILTER_STAGES, self.sampling_rate)
+        self.filtered = MinMaxPyramid(len(self.exg_channels), self.num_points, sampling_rate=self.sampling_rate)
+        # Optional artifact removal on all the EXG channels the model was fitted on,
+        # before the plotted ones are picked, refitted in the background every
+        # refit_seconds on the last calibration_seconds. Only a model with excluded
+        # components gives channels back, without them it gives sources.
+        self.spatial_filter = spatial_filter
+        self.spatial_channels = BoardShim.get_exg_channels(self.board_id)
+        self.spatial_rows = [self.spatial_channels.index(channel) for channel in self.exg_channels]
+        if spatial_filter is not None and spatial_filter.model.mean.shape[0] != len(self.spatial_channels):
+            raise ValueError('spatial model is for %d channels, board %d has %d EXG channels' %
+                             (spatial_filter.model.mean.shape[0], self.board_id, len(self.spatial_channels)))
+        if spatial_filter is not None and not spatial_filter.model.exclude:
+            raise ValueError('spatial model has no excluded components, the plot needs channels back: '
+                             'fit it with spatial_filter.py --exclude')
+        self.refit_samples = int(refit_seconds * self.sampling_rate)
+        self.calibration = None
+        if spatial_filter is not None and self.refit_samples > 0:
+            self.calibration = RingBuffer(len(self.spatial_channels), int(calibration_seconds * self.sampling_rate))
+        self.since_refit = 0
 
         self.app = QtGui.QApplication([])
         self.win = pg.GraphicsWindow(title='BrainFlow Plot', size=(800, 600))
@@ -61,8 +97,8 @@ class Graph:
             if i == 0:
                 p.setTitle('TimeSeries Plot')
             self.plots.append(p)
+            # Downsampling is done by MinMaxPyramid before setData
             curve = p.plot(pen=self.pens[i % len(self.pens)])
-            # curve.setDownsampling(auto=True, method='mean', ds=3)
             self.curves.append(curve)
 
     def _init_psd(self):
@@ -77,6 +113,12 @@ class Graph:
         self.psd_plot.showGrid(x=True, y=True)
         self.psd_curves = list()
         self.psd_size = DataFilter.get_nearest_power_of_two(self.sampling_rate)
+        # Same segments as get_psd_welch over the window, but each one is transformed only once
+        num_segments = max(1, (self.num_points - self.psd_size) // (self.psd_size // 2) + 1)
+        self.welch = IncrementalWelch(len(self.exg_channels), self.sampling_rate, self.psd_size,
+                                      self.psd_size // 2, num_segments, 'blackmanharris')
+        self.band_powers = BandPowers(self.welch.freqs, DEFAULT_BANDS)
+        self.psd_lim = min(70, len(self.welch.freqs))
         for i in range(len(self.exg_channels)):
             psd_curve = self.psd_plot.plot(pen=self.pens[i % len(self.pens)])
             psd_curve.setDownsampling(auto=True, method='mean', ds=3)
@@ -99,38 +141,46 @@ class Graph:
         self.band_plot.getAxis('bottom').setTicks([[(i + 1, string_labels[i]) for i in range(len(string_labels))]])
         
     def update(self):
-        data = self.board_shim.get_current_board_data(self.num_points)
-        avg_bands = [0, 0, 0, 0, 0]
-        channels = [1,2]
-        for count, channel in enumerate(channels):
+        new_data = self.board_shim.get_board_data()
+        if new_data.shape[1] > 0:
+            signals = new_data[self.exg_channels]
+            if self.spatial_filter is not None:
+                raw = new_data[self.spatial_channels]
+                signals = self.spatial_filter.process(raw)[self.spatial_rows]
+                if self.calibration is not None:
+                    self.refit(raw)
+            new_filtered = self.filter.process(signals)
+            self.filtered.append(new_filtered)
+            self.welch.update(new_filtered)
+        # One point pair per pixel column is enough, all channels share the width
+        x, data = self.filtered.get(max(int(self.plots[0].getViewBox().width()), 100))
+        for count in range(len(self.exg_channels)):
             # plot timeseries
-            DataFilter.detrend(data[channel], DetrendOperations.CONSTANT.value)
-            DataFilter.perform_bandpass(data[channel], self.sampling_rate, 3.0, 45.0, 2,
-                                        FilterTypes.BUTTERWORTH_ZERO_PHASE, 0)
-            DataFilter.perform_bandstop(data[channel], self.sampling_rate, 48.0, 52.0, 2,
-                                        FilterTypes.BUTTERWORTH_ZERO_PHASE, 0)
-            DataFilter.perform_bandstop(data[channel], self.sampling_rate, 58.0, 62.0, 2,
-                                        FilterTypes.BUTTERWORTH_ZERO_PHASE, 0)
-            self.curves[count].setData(data[channel].tolist())
-            if data.shape[1] > self.psd_size:
-                # plot psd
-                psd_data = DataFilter.get_psd_welch(data[channel], self.psd_size, self.psd_size // 2,
-                                                    self.sampling_rate,
-                                                    WindowOperations.BLACKMAN_HARRIS.value)
-                lim = min(70, len(psd_data[0]))
-                self.psd_curves[count].setData(psd_data[1][0:lim].tolist(), psd_data[0][0:lim].tolist())
-                # plot bands
-                avg_bands[0] = avg_bands[0] + DataFilter.get_band_power(psd_data, 2.0, 4.0)
-                avg_bands[1] = avg_bands[1] + DataFilter.get_band_power(psd_data, 4.0, 8.0)
-                avg_bands[2] = avg_bands[2] + DataFilter.get_band_power(psd_data, 8.0, 13.0)
-                avg_bands[3] = avg_bands[3] + DataFilter.get_band_power(psd_data, 13.0, 30.0)
-                avg_bands[4] = avg_bands[4] + DataFilter.get_band_power(psd_data, 30.0, 50.0)
-
-        avg_bands = [int(x * 100 / len(self.exg_channels)) for x in avg_bands]
-        self.band_bar.setOpts(height=avg_bands)
+            self.curves[count].setData(x, data[count])
+
+        if len(self.welch) > 0:
+            # plot psd
+            psd = self.welch.psd
+            freqs = self.welch.freqs[0:self.psd_lim]
+            for count in range(len(self.exg_channels)):
+                self.psd_curves[count].setData(freqs, psd[count][0:self.psd_lim])
+            # plot bands, all channels and bands in one go
+            avg_bands = self.band_powers.compute(psd).sum(axis=0)
+            avg_bands = [int(x * 100 / len(self.exg_channels)) for x in avg_bands]
+            self.band_bar.setOpts(height=avg_bands)
 
         self.app.processEvents()
 
+    def refit(self, raw):
+        # The worker fits on a copy of the calibration window, plotting goes on with the
+        # previous model until it is done
+        self.calibration.append(raw)
+        self.since_refit += raw.shape[1]
+        if self.since_refit >= self.refit_samples and len(self.calibration) == self.calibration.capacity:
+            num_components = self.spatial_filter.model.unmixing.shape[0]
+            if self.spatial_filter.fit_async(self.calibration.get(), num_components):
+                self.since_refit = 0
+
 
 def main():
     BoardShim.enable_dev_board_logger()
@@ -154,6 +204,14 @@ def main():
     parser.add_argument('--file', type=str, help='file', required=False, default='')
     parser.add_argument('--master-board', type=int, help='master board id for streaming and playback boards',
                         required=False, default=BoardIds.NO_BOARD)
+    parser.add_argument('--window-size', type=int, help='seconds of signal shown', required=False, default=4)
+    parser.add_argument('--spatial-model', type=str, help='spatial_filter.py model (.npz) with excluded '
+                        'components, removed from the EXG channels',
+                        required=False, default='')
+    parser.add_argument('--refit-seconds', type=float, help='refit the spatial model in the background this often, '
+                                                            'never if 0', required=False, default=0.0)
+    parser.add_argument('--calibration-seconds', type=float, help='seconds of signal a refit uses', required=False,
+                        default=10.0)
     args = parser.parse_args()
 
     params = BrainFlowInputParams()
@@ -172,7 +230,11 @@ def main():
     try:
         board_shim.prepare_session()
         board_shim.start_stream(450000, args.streamer_params)
-        Graph(board_shim)
+        spatial_filter = None
+        if args.spatial_model:
+            spatial_filter = SpatialFilter()
+            spatial_filter.load(args.spatial_model)
+        Graph(board_shim, args.window_size, spatial_filter, args.refit_seconds, args.calibration_seconds)
     except BaseException:
         logging.warning('Exception', exc_info=True)
     finally:
@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import argparse
+import matplotlib
+import numpy as np
+import pandas as pd
+
+matplotlib.use('Agg')
+
+from concurrent.futures import ProcessPoolExecutor
+from brainflow.data_filter import DataFilter
+from brainflow.exit_codes import BrainFlowError
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from dataset_catalog import DatasetCatalog, DEFAULT_DIRECTORY
+from data_rate import filter_signal, compute_snr, calculate_channel_capacity, bandpass_low_limit, bandpass_high_limit
+
+# Runs the data_rate.py SNR / channel capacity pipeline over every recording of the
+# archive in a process pool, without any plotting, and writes one results table.
+
+catalog = None
+
+
+def init_worker(directory):
+    global catalog
+    catalog = DatasetCatalog(directory)
+    DataFilter.disable_data_logger()
+
+
+def process_recording(entry, channel):
+    data = catalog.load(entry)
+    signal = np.ascontiguousarray(data[channel])
+    filter_signal(signal)
+    row = {
+        'name': entry.name,
+        'subject': entry.subject,
+        'muscle': entry.muscle,
+        'force': entry.force,
+        'test': entry.test,
+        'attempt': entry.attempt,
+        'channel': channel,
+        'num_samples': len(signal),
+    }
+    try:
+        result = compute_snr(signal)
+    except (ValueError, BrainFlowError) as e:
+        # No peaks above the threshold, or too few peak / noise samples for a Welch segment
+        row.update({'num_peaks': np.nan, 'signal_power': np.nan, 'noise_power': np.nan,
+                    'snr': np.nan, 'snr_db': np.nan, 'capacity_bps': np.nan, 'error': str(e)})
+    else:
+        bandwidth = bandpass_high_limit - bandpass_low_limit
+        row.update({
+            'num_peaks': len(result['peaks']),
+            'signal_power': result['signal_power'],
+            'noise_power': result['noise_power'],
+            'snr': result['snr'],
+            'snr_db': 10 * np.log10(result['snr']),
+            'capacity_bps': calculate_channel_capacity(bandwidth, result['snr']),
+            'error': '',
+        })
+    return row
+
+
+def run_batch(directory=DEFAULT_DIRECTORY, channel=1, workers=None):
+    entries = DatasetCatalog(directory).entries
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(directory,)) as pool:
+        rows = list(pool.map(process_recording, entries, [channel] * len(entries)))
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--directory', type=str, help='recordings archive', required=False, default=DEFAULT_DIRECTORY)
+    parser.add_argument('--channel', type=int, help='board row to analyse', required=False, default=1)
+    parser.add_argument('--workers', type=int, help='worker processes, all cores if not set', required=False, default=None)
+    parser.add_argument('--output', type=str, help='results table, .csv or .parquet', required=False, default='snr_results.csv')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_batch(args.directory, args.channel, args.workers)
+    if args.output.endswith('.parquet'):
+        results.to_parquet(args.output, index=False)
+    else:
+        results.to_csv(args.output, index=False)
+    print(results[['name', 'num_peaks', 'signal_power', 'noise_power', 'snr_db', 'capacity_bps']].to_string(index=False))
+    print("\n%d recordings in %.2f s -> %s" % (len(results), time.perf_counter() - start, args.output))
+
+
+if __name__ == "__main__":
+    main()
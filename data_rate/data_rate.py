@@ -1,3 +1,5 @@
+import os
+import sys
 import numpy as np
 import pandas as pd
 from scipy.signal import find_peaks, savgol_filter
@@ -5,6 +7,10 @@ import matplotlib.pyplot as plt
 from brainflow.data_filter import DataFilter, FilterTypes, NoiseTypes, AggOperations, DetrendOperations, WindowOperations
 from brainflow.board_shim import BoardShim, BoardIds
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from dataset_catalog import DatasetCatalog
+from spectral_analysis import compute_spectrum, plot_spectrum
+
 np.set_printoptions(suppress=True, precision=6, threshold=np.inf)
 bandpass_low_limit = 0.5
 bandpass_high_limit = 40.0
@@ -14,8 +20,7 @@ peak_treshold = 15
 def main():
     # Read .csv data file and get sampling rate
     test_name = "Justi-TA-3.1"
-    data_file = f"../official-tests/{test_name}(unfiltered).csv"
-    data = DataFilter.read_file(data_file)
+    data = DatasetCatalog().load(test_name)
     data_ch1 = data[1]
     
     # Bandwidth limits recommended for the OpenBCI Ganglion Board
@@ -34,11 +39,7 @@ def main():
     plt.savefig('original_signal.png')
 
     # First filtering step of original signal
-    # https://la.mathworks.com/help/signal/ug/peak-analysis.html
-    DataFilter.perform_rolling_filter(data_ch1, 2, AggOperations.MEAN.value)
-    DataFilter.detrend(data_ch1, DetrendOperations.CONSTANT.value)
-    DataFilter.perform_bandpass(data_ch1, sampling_rate, bandpass_low_limit, bandpass_high_limit, 7, FilterTypes.BUTTERWORTH_ZERO_PHASE, 0)
-    DataFilter.remove_environmental_noise(data_ch1, sampling_rate, NoiseTypes.FIFTY.value)
+    filter_signal(data_ch1)
     savgol_filter(data_ch1, 20, 5)
 
     # Plot the signal after filtering
@@ -60,12 +61,58 @@ def main():
     print("\nChannel Capacity: %.3f bps" % channel_capacity)
 
 
-def calculate_snr(data):
-    # Find peaks in signal
+def filter_signal(data):
+    # https://la.mathworks.com/help/signal/ug/peak-analysis.html
+    DataFilter.perform_rolling_filter(data, 2, AggOperations.MEAN.value)
+    DataFilter.detrend(data, DetrendOperations.CONSTANT.value)
+    DataFilter.perform_bandpass(data, sampling_rate, bandpass_low_limit, bandpass_high_limit, 7, FilterTypes.BUTTERWORTH_ZERO_PHASE, 0)
+    DataFilter.remove_environmental_noise(data, sampling_rate, NoiseTypes.FIFTY.value)
+
+
+def compute_snr(data):
+    # SNR math only, no plots or prints, so it can run headless over the archive
     positive_peaks, _ = find_peaks(data, height=(peak_treshold, None))
     negative_peaks, _ = find_peaks(-data, height=(peak_treshold, None))
     peaks = np.concatenate((positive_peaks, negative_peaks))
-    
+
+    # Get noisy signal after excluding peaks
+    mask = np.ones(len(data), dtype=bool)
+    mask[peaks] = False
+    min_peak = np.min(abs(data[peaks]))
+    no_peaks = data[mask]
+    noise = (no_peaks < min_peak) & (no_peaks > -min_peak)
+    noise_signal = no_peaks[noise]
+
+    # Calculate SNR (expressed as a linear power ratio, not as logarithmic decibels)
+    # https://en.wikipedia.org/wiki/Shannon%E2%80%93Hartley_theorem
+    nfft = DataFilter.get_nearest_power_of_two(sampling_rate)
+    psd_s = DataFilter.get_psd_welch(data[peaks], nfft, nfft // 2, sampling_rate,
+                                   WindowOperations.BLACKMAN_HARRIS.value)
+    psd_n = DataFilter.get_psd_welch(noise_signal, nfft, nfft // 2, sampling_rate,
+                                   WindowOperations.BLACKMAN_HARRIS.value)
+    Ps = DataFilter.get_band_power(psd_s, bandpass_low_limit, bandpass_high_limit)
+    Pn = DataFilter.get_band_power(psd_n, bandpass_low_limit, bandpass_high_limit)
+
+    return {
+        'positive_peaks': positive_peaks,
+        'negative_peaks': negative_peaks,
+        'peaks': peaks,
+        'mask': mask,
+        'min_peak': min_peak,
+        'noise_signal': noise_signal,
+        'signal_power': Ps,
+        'noise_power': Pn,
+        'snr': Ps/Pn,
+    }
+
+
+def calculate_snr(data):
+    result = compute_snr(data)
+    positive_peaks = result['positive_peaks']
+    negative_peaks = result['negative_peaks']
+    mask = result['mask']
+    noise_signal = result['noise_signal']
+
     # Plot peaks found in signal
     plt.figure()
     plt.plot(data)
@@ -80,8 +127,6 @@ def calculate_snr(data):
     plt.savefig("peaks.png")
 
     # Boolean peaks mask
-    mask = np.ones(len(data), dtype=bool)
-    mask[peaks] = False
     plt.figure()
     plt.plot(~mask)
     plt.xlabel('Nº Sample')
@@ -91,12 +136,8 @@ def calculate_snr(data):
     plt.ylim(False,True)
     plt.savefig('mask.png')
 
-    # Get noisy signal after excluding peaks
-    min_peak = np.min(abs(data[peaks]))
-    print("Max Noise Amplitude: %.3f μV" % min_peak)
-    no_peaks = data[mask]
-    noise = (no_peaks < min_peak) & (no_peaks > -min_peak)
-    noise_signal = no_peaks[noise]
+    # Noisy signal after excluding peaks
+    print("Max Noise Amplitude: %.3f μV" % result['min_peak'])
     plt.figure()
     plt.plot(noise_signal)
     plt.xlim(0, len(noise_signal))
@@ -105,16 +146,9 @@ def calculate_snr(data):
     plt.ylabel('Amplitude (μV)')
     plt.savefig('noise_signal.png')
 
-    # Calculate SNR (expressed as a linear power ratio, not as logarithmic decibels)
-    # https://en.wikipedia.org/wiki/Shannon%E2%80%93Hartley_theorem
-    nfft = DataFilter.get_nearest_power_of_two(sampling_rate)
-    psd_s = DataFilter.get_psd_welch(data[peaks], nfft, nfft // 2, sampling_rate,
-                                   WindowOperations.BLACKMAN_HARRIS.value)
-    psd_n = DataFilter.get_psd_welch(noise_signal, nfft, nfft // 2, sampling_rate,
-                                   WindowOperations.BLACKMAN_HARRIS.value)
-    Ps = DataFilter.get_band_power(psd_s, bandpass_low_limit, bandpass_high_limit)
-    Pn = DataFilter.get_band_power(psd_n, bandpass_low_limit, bandpass_high_limit)
-    SNR = Ps/Pn
+    Ps = result['signal_power']
+    Pn = result['noise_power']
+    SNR = result['snr']
     logSNR = 10*np.log10(Ps/Pn) # SNR in logarithmic decibels for printing
     
     print("Signal Power: %.3f μW" % Ps)
@@ -129,18 +163,10 @@ def calculate_channel_capacity(bandwidth, snr):
 
 
 def plot_fft(data, channel, sampling_rate):
-    # Calculate FFT values
-    fft_data = np.fft.fft(data)
-    magnitude = np.abs(fft_data)
-
-    # Generate the frequency axis
-    N = len(fft_data)
-    T = 1 / sampling_rate
-    freq = np.fft.fftfreq(N, T)
-
-    # Filter positive frequencies
-    positive_freq = freq[(freq > 0)]
-    positive_mag = magnitude[(freq > 0)]
+    # Calculate FFT values, positive frequencies only
+    spectrum = compute_spectrum(data, sampling_rate, [channel], num_peaks=0)
+    positive_freq = spectrum.freqs
+    positive_mag = spectrum.magnitude[0]
 
     # Find the index where xx% of the signal is accumulated
     # acc_percentage = 0.99
@@ -150,14 +176,7 @@ def plot_fft(data, channel, sampling_rate):
     # index = np.searchsorted(cum_sum, threshold)  # Find the index where cumulative sum exceeds the threshold
 
     # Plot the FFT result
-    plt.figure(figsize=(10, 5))
-    plt.plot(positive_freq, positive_mag, linestyle='-', linewidth=1)
-    plt.xlabel('Frequency (Hz)')
-    plt.ylabel('Amplitude (μV)')
-    plt.xlim(0, auto=True)
-    plt.ylim(0, auto=True)
-    plt.title('FFT Channel %d Plot' % channel)
-    plt.grid(True)
+    plot_spectrum(spectrum, 0)
 
     # Annotate the % accumulation point with its frequency
     # bandwidth = positive_freq[index]
@@ -1,3 +1,5 @@
+import os
+import sys
 import argparse
 import logging
 
@@ -6,15 +8,30 @@ from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
 from brainflow.data_filter import DataFilter, FilterTypes, DetrendOperations, AggOperations
 from pyqtgraph.Qt import QtGui, QtCore
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from shared_board import SharedBoard
+from minmax_pyramid import MinMaxPyramid
+from streaming_filter import StreamingFilter
+
+FILTER_STAGES = [
+    {'type': 'rolling_mean', 'period': 2},
+    {'type': 'bandpass', 'low': 0.5, 'high': 90.0, 'order': 4, 'filter': 'bessel'},
+    {'type': 'bandstop', 'low': 48.0, 'high': 52.0, 'order': 3, 'filter': 'butterworth'}, # notch
+]
+
 class Graph:
-    def __init__(self, board_shim):
+    def __init__(self, board_shim, window_size=4):
         self.board_id = board_shim.get_board_id()
         self.board_shim = board_shim
         self.emg_channels = BoardShim.get_emg_channels(self.board_id)
         self.sampling_rate = BoardShim.get_sampling_rate(self.board_id)
         self.update_speed_ms = 50
-        self.window_size = 4
+        self.window_size = window_size
         self.num_points = self.window_size * self.sampling_rate
+        # Only new samples go through the filters, the plotted window is kept filtered
+        # and min/max decimated down to what the plots can show
+        self.filter = StreamingFilter(FILTER_STAGES, self.sampling_rate)
+        self.filtered = MinMaxPyramid(len(self.emg_channels), self.num_points, sampling_rate=self.sampling_rate)
 
         self.app = QtGui.QApplication([])
         self.win = pg.GraphicsWindow(title='BrainFlow Plot', size=(1000, 800))
@@ -45,15 +62,14 @@ class Graph:
             self.curves.append(curve)
 
     def update(self):
-        data = self.board_shim.get_current_board_data(self.num_points)
-        for count, channel in enumerate(self.emg_channels):
+        new_data = self.board_shim.get_board_data()
+        if new_data.shape[1] > 0:
+            self.filtered.append(self.filter.process(new_data[self.emg_channels]))
+        # One point pair per pixel column is enough, all channels share the width
+        x, data = self.filtered.get(max(int(self.plots[0].getViewBox().width()), 100))
+        for count in range(len(self.emg_channels)):
             # plot timeseries
-            DataFilter.perform_rolling_filter (data[channel], 2, AggOperations.MEAN.value) # denoise data
-            DataFilter.perform_bandpass(data[channel], self.sampling_rate, 0.5, 90.0, 4,
-                                        FilterTypes.BESSEL_ZERO_PHASE, 0)
-            DataFilter.perform_bandstop(data[channel], self.sampling_rate, 48.0, 52.0, 3,
-                                        FilterTypes.BUTTERWORTH_ZERO_PHASE, 0) # notch
-            self.curves[count].setData(data[channel].tolist())
+            self.curves[count].setData(x, data[count])
 
         self.app.processEvents()
 
@@ -73,9 +89,11 @@ def main ():
     parser.add_argument ('--other-info', type = str, help  = 'other info', required = False, default = '')
     parser.add_argument ('--streamer-params', type = str, help  = 'streamer params', required = False, default = '')
     parser.add_argument ('--serial-number', type = str, help  = 'serial number', required = False, default = '')
-    parser.add_argument ('--board-id', type = int, help  = 'board id, check docs to get a list of supported boards', required = True)
+    parser.add_argument ('--board-id', type = int, help  = 'board id, check docs to get a list of supported boards', required = False, default = BoardIds.GANGLION_BOARD.value)
     parser.add_argument('--file', type=str, help='file', required=False, default='')
     parser.add_argument('--master-board', type=int, help='master board id for streaming and playback boards', required=False, default=BoardIds.NO_BOARD)
+    parser.add_argument('--shared-board', type=str, help='read from the acquisition daemon with this shared memory name', required=False, default='')
+    parser.add_argument('--window-size', type=int, help='seconds of signal shown', required=False, default=4)
     args = parser.parse_args ()
 
     params = BrainFlowInputParams ()
@@ -91,11 +109,14 @@ def main ():
     params.master_board = args.master_board
 
 
-    board = BoardShim(args.board_id, params)
+    if args.shared_board:
+        board = SharedBoard(args.shared_board)
+    else:
+        board = BoardShim(args.board_id, params)
     try:
         board.prepare_session()
         board.start_stream(450000, args.streamer_params)
-        Graph(board)
+        Graph(board, args.window_size)
     except BaseException:
         logging.warning('Exception', exc_info=True)
     finally:
@@ -0,0 +1,322 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from brainflow.board_shim import BoardShim
+from brainflow.data_filter import DataFilter
+
+from dataset_catalog import DatasetCatalog, DEFAULT_DIRECTORY
+from streaming_filter import FilterPipeline
+
+# Muscle activation onsets and offsets, online or over a whole recording.
+#
+# Every channel is high-passed (causal FilterPipeline stages). The Teager-Kaiser
+# energy x[n]^2 - x[n-1] x[n+1] is taken next, which lags the input by one sample,
+# then rectified and smoothed by a low-pass into an envelope. Thresholds come from
+# the envelope of a rest baseline taken after the filters settled: the median plus
+# on_ratio / off_ratio times the MAD of the quieter half of its blocks, since subjects
+# often start moving before the baseline is over. Detection then runs over the baseline as well,
+# so such an onset is not cut to the end of it. A channel whose baseline went above
+# the on threshold, or whose envelope later stays on_ratio times below the baseline
+# median for more than a block in a row (it was active through all of it; samples
+# within one smoother period of activity, where the low-pass undershoots, do not
+# count), is flagged in `contaminated`, and a segment already active on the
+# first detected sample is `clipped`: its real onset came before the recording did
+# (or the recording has no rest at all). A channel turns active above the on threshold
+# and stays active until it falls below the off threshold. That hysteresis is one
+# vectorized pass per chunk for all channels (last decisive sample, carried over
+# between chunks). Only the transitions go through Python: a run must last min_active
+# seconds to count, and an offset is final once the channel stayed quiet for min_gap
+# seconds, so shorter breaks merge into one segment.
+#
+# process() returns the segments that ended in the chunk, finish() the ones still
+# open at the end of the stream. segment_recording() is the batch version: one
+# process() call on the whole recording, so batch and streaming give the same
+# segments.
+
+MAD_SCALE = 0.6745
+DEFAULT_STAGES = [
+    {'type': 'highpass', 'cutoff': 20.0, 'order': 4},
+    {'type': 'environmental_noise', 'noise': 'both'},
+]
+
+
+@dataclass(frozen=True)
+class ActivationSegment:
+    channel: int # row of the processed chunks
+    onset: int # first active sample
+    offset: int # first sample after the segment
+    onset_time: float
+    offset_time: float
+    clipped: bool # active from the first detected sample, the onset is not an onset
+
+
+class ActivationSegmenter:
+    def __init__(self, num_channels, sampling_rate, filter_stages=DEFAULT_STAGES, envelope_cutoff=3.0, settle=0.25,
+                 baseline=1.0, baseline_block=0.25, on_ratio=10.0, off_ratio=5.0, min_active=0.3, min_gap=0.2):
+        self.num_channels = num_channels
+        self.sampling_rate = sampling_rate
+        self.settle_samples = int(round(settle * sampling_rate)) # filter start up, left out of the baseline
+        self.baseline_samples = max(1, int(round(baseline * sampling_rate)))
+        self.block_samples = max(1, min(int(round(baseline_block * sampling_rate)), self.baseline_samples))
+        self.on_ratio = on_ratio
+        self.off_ratio = off_ratio
+        self.min_active = int(round(min_active * sampling_rate))
+        self.min_gap = int(round(min_gap * sampling_rate))
+        self.undershoot_samples = int(round(sampling_rate / envelope_cutoff))
+        self.filter = FilterPipeline(filter_stages, sampling_rate) if filter_stages else None
+        self.smoother = FilterPipeline([{'type': 'lowpass', 'cutoff': envelope_cutoff, 'order': 2}], sampling_rate)
+        self.reset()
+
+    def reset(self):
+        if self.filter is not None:
+            self.filter.reset()
+        self.smoother.reset()
+        self.tail = None # last two filtered samples, the energy of the last one needs the next
+        self.timestamp_tail = None
+        self.total = 0 # envelope samples
+        self.baseline = list()
+        self.baseline_stamps = list()
+        self.rest_level = None
+        self.on_threshold = None
+        self.off_threshold = None
+        self.contaminated = np.zeros(self.num_channels, dtype=bool)
+        self.quiet_samples = np.zeros(self.num_channels, dtype=np.int64) # current run far below the baseline median
+        self.last_active = np.full(self.num_channels, -self.sampling_rate, dtype=np.int64)
+        self.active = np.zeros(self.num_channels, dtype=bool)
+        # Per channel (index, time) of the current run, the segment it belongs to and
+        # the offset waiting for min_gap
+        self.run_start = [None] * self.num_channels
+        self.segment_start = [None] * self.num_channels
+        self.pending = [None] * self.num_channels
+        self.last_time = np.nan
+
+    def envelope(self, values, timestamps):
+        # Teager-Kaiser energy envelope of a chunk and the timestamps of its samples
+        filtered = self.filter.process(values) if self.filter is not None else values
+        if self.tail is None:
+            # The first sample is its own left neighbour
+            self.tail = filtered[:, :1]
+            self.timestamp_tail = timestamps[:1]
+        joined = np.concatenate((self.tail, filtered), axis=1)
+        stamps = np.concatenate((self.timestamp_tail, timestamps))
+        self.tail = joined[:, -2:]
+        self.timestamp_tail = stamps[-2:]
+        energy = joined[:, 1:-1] ** 2 - joined[:, :-2] * joined[:, 2:]
+        if energy.shape[1] == 0:
+            return energy, stamps[1:-1]
+        return self.smoother.process(np.abs(energy)), stamps[1:-1]
+
+    def check_baseline(self, envelope, active, start):
+        # Runs of samples far below the baseline median, carried over between chunks
+        index = start + np.arange(envelope.shape[1])
+        last_active = np.maximum.accumulate(np.where(active, index, self.last_active[:, None]), axis=1)
+        self.last_active = last_active[:, -1]
+        quiet = (envelope < self.rest_level[:, None] / self.on_ratio) & \
+                (index - last_active > self.undershoot_samples)
+        # Length of the run each sample ends, the first one continues the previous chunk's
+        last_loud = np.maximum.accumulate(np.where(quiet, -1, np.arange(envelope.shape[1])), axis=1)
+        runs = np.arange(envelope.shape[1]) - last_loud
+        runs[last_loud < 0] += self.quiet_samples[np.nonzero(last_loud < 0)[0]]
+        runs[~quiet] = 0
+        self.quiet_samples = runs[:, -1]
+        self.contaminated |= runs.max(axis=1) > self.block_samples
+
+    def calibrate(self, envelope, stamps, start):
+        # Collects the baseline; once it is complete returns it followed by the rest of
+        # the chunk, so detection starts where the baseline does
+        first = self.settle_samples
+        end = first + self.baseline_samples
+        low = max(first - start, 0)
+        high = min(end - start, envelope.shape[1])
+        if high > low:
+            self.baseline.append(envelope[:, low:high])
+            self.baseline_stamps.append(stamps[low:high])
+        if start + envelope.shape[1] < end:
+            return envelope[:, :0], stamps[:0], start
+        baseline = np.concatenate(self.baseline, axis=1)
+        baseline_stamps = np.concatenate(self.baseline_stamps)
+        self.baseline = list()
+        self.baseline_stamps = list()
+
+        # Median and MAD of the quieter half of the blocks of every channel
+        num_blocks = self.baseline_samples // self.block_samples
+        blocks = baseline[:, :num_blocks * self.block_samples].reshape(self.num_channels, num_blocks, -1)
+        levels = np.median(blocks, axis=2)
+        quiet = np.argsort(levels, axis=1)[:, :max(1, num_blocks // 2)]
+        quietest = np.take_along_axis(blocks, quiet[:, :, None], axis=1).reshape(self.num_channels, -1)
+        median = np.median(quietest, axis=1)
+        mad = np.median(np.abs(quietest - median[:, None]), axis=1) / MAD_SCALE
+        self.rest_level = median
+        self.on_threshold = median + self.on_ratio * mad
+        self.off_threshold = median + self.off_ratio * mad
+        self.contaminated = levels.max(axis=1) > self.on_threshold
+        return (np.concatenate((baseline, envelope[:, end - start:]), axis=1),
+                np.concatenate((baseline_stamps, stamps[end - start:])), first)
+
+    def hysteresis(self, envelope):
+        # (channels x samples) activity: the state set by the last sample above the on
+        # threshold or below the off threshold, the previous state before the first one
+        above = envelope > self.on_threshold[:, None]
+        decided = above | (envelope < self.off_threshold[:, None])
+        last = np.maximum.accumulate(np.where(decided, np.arange(envelope.shape[1]), -1), axis=1)
+        return np.where(last >= 0, np.take_along_axis(above, np.maximum(last, 0), axis=1), self.active[:, None])
+
+    def process(self, values, timestamps=None):
+        # values is (channels x samples) of any size, timestamps the board timestamps of
+        # the samples; returns the segments that ended, oldest offset first
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape[1] == 0:
+            return list()
+        timestamps = np.full(values.shape[1], np.nan) if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+        envelope, stamps = self.envelope(values, timestamps)
+        start = self.total
+        self.total += envelope.shape[1]
+        if len(stamps):
+            self.last_time = stamps[-1]
+        if self.on_threshold is None:
+            envelope, stamps, start = self.calibrate(envelope, stamps, start)
+        if envelope.shape[1] == 0:
+            return list()
+
+        active = self.hysteresis(envelope)
+        self.check_baseline(envelope, active, start)
+        changes = active != np.concatenate((self.active[:, None], active[:, :-1]), axis=1)
+        self.active = active[:, -1].copy()
+        segments = list()
+        for channel in np.flatnonzero(changes.any(axis=1)):
+            for index in np.flatnonzero(changes[channel]):
+                if active[channel, index]:
+                    self.rise(channel, start + index, stamps[index], segments)
+                else:
+                    self.fall(channel, start + index, stamps[index])
+        for channel, pending in enumerate(self.pending):
+            if pending is not None and self.total - pending[0] >= self.min_gap:
+                segments.append(self.close(channel))
+        segments.sort(key=lambda segment: segment.offset)
+        return segments
+
+    def rise(self, channel, index, timestamp, segments):
+        pending = self.pending[channel]
+        if pending is not None:
+            if index - pending[0] >= self.min_gap:
+                segments.append(self.close(channel))
+            else:
+                # Short break, the segment goes on
+                self.pending[channel] = None
+        self.run_start[channel] = (index, timestamp)
+
+    def fall(self, channel, index, timestamp):
+        run = self.run_start[channel]
+        self.run_start[channel] = None
+        if self.segment_start[channel] is None and index - run[0] >= self.min_active:
+            self.segment_start[channel] = run
+        if self.segment_start[channel] is not None:
+            self.pending[channel] = (index, timestamp)
+
+    def close(self, channel):
+        (onset, onset_time), (offset, offset_time) = self.segment_start[channel], self.pending[channel]
+        self.segment_start[channel] = None
+        self.pending[channel] = None
+        return ActivationSegment(int(channel), int(onset), int(offset), float(onset_time), float(offset_time),
+                                 onset == self.settle_samples)
+
+    def finish(self):
+        # End of the stream: segments still open end at the last sample
+        segments = list()
+        for channel in range(self.num_channels):
+            if self.run_start[channel] is not None:
+                self.fall(channel, self.total, self.last_time)
+            if self.pending[channel] is not None:
+                segments.append(self.close(channel))
+        self.active[:] = False
+        return segments
+
+
+def segment_recording(signals, sampling_rate, timestamps=None, **segmenter_args):
+    # Batch version, segments of a whole (channels x samples) recording by onset
+    segmenter = ActivationSegmenter(signals.shape[0], sampling_rate, **segmenter_args)
+    segments = segmenter.process(signals, timestamps) + segmenter.finish()
+    return sorted(segments, key=lambda segment: (segment.onset, segment.channel))
+
+
+def longest_run(mask):
+    # (start, stop) of the longest run of True, None if there is none
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    if len(edges) == 0:
+        return None
+    starts, stops = edges[::2], edges[1::2]
+    longest = np.argmax(stops - starts)
+    return int(starts[longest]), int(stops[longest])
+
+
+def phase_ranges(segments, num_samples):
+    # (relax, move) sample ranges: the longest stretch with some channel active and the
+    # longest one with none, None where there is no such stretch
+    mask = np.zeros(num_samples, dtype=bool)
+    for segment in segments:
+        mask[segment.onset:segment.offset] = True
+    return longest_run(~mask), longest_run(mask)
+
+
+catalog = None
+
+
+def init_worker(directory):
+    global catalog
+    catalog = DatasetCatalog(directory)
+    DataFilter.disable_data_logger()
+
+
+def segment_entry(entry):
+    data = catalog.load(entry, copy=False)
+    channels = BoardShim.get_emg_channels(catalog.board_id)
+    timestamps = data[BoardShim.get_timestamp_channel(catalog.board_id)]
+    start = time.perf_counter()
+    segmenter = ActivationSegmenter(len(channels), catalog.sampling_rate)
+    segments = segmenter.process(data[channels], timestamps) + segmenter.finish()
+    elapsed = time.perf_counter() - start
+    rows = [{'name': entry.name, 'channel': channels[segment.channel], 'onset': segment.onset,
+             'offset': segment.offset, 'onset_s': segment.onset / catalog.sampling_rate,
+             'duration_s': (segment.offset - segment.onset) / catalog.sampling_rate, 'clipped': segment.clipped}
+            for segment in segments]
+    relax, move = phase_ranges(segments, data.shape[1])
+    contaminated = [channels[channel] for channel in np.flatnonzero(segmenter.contaminated)]
+    return entry.name, data.shape[1], rows, relax, move, contaminated, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--directory', type=str, help='recordings archive', required=False, default=DEFAULT_DIRECTORY)
+    parser.add_argument('--workers', type=int, help='worker processes, all cores if not set', required=False, default=None)
+    parser.add_argument('--output', type=str, help='segments table, .csv or .parquet', required=False, default='')
+    args = parser.parse_args()
+
+    # Segments every recording of the archive in a process pool
+    entries = DatasetCatalog(args.directory).entries
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.directory,)) as pool:
+        results = list(pool.map(segment_entry, entries))
+
+    print('%-22s %8s %9s %8s %15s %15s %12s %9s' % ('name', 'samples', 'segments', 'clipped', 'relax', 'move',
+                                                     'contaminated', 'time'))
+    for name, num_samples, rows, relax, move, contaminated, elapsed in results:
+        print('%-22s %8d %9d %8d %15s %15s %12s %6.1f ms' %
+              (name, num_samples, len(rows), sum(row['clipped'] for row in rows), '%d-%d' % relax if relax else '-',
+               '%d-%d' % move if move else '-', ','.join(map(str, contaminated)) or '-', elapsed * 1000))
+    print('\n%d recordings in %.2f s' % (len(results), time.perf_counter() - start))
+
+    if args.output:
+        table = pd.DataFrame([row for result in results for row in result[2]],
+                             columns=['name', 'channel', 'onset', 'offset', 'onset_s', 'duration_s', 'clipped'])
+        if args.output.endswith('.parquet'):
+            table.to_parquet(args.output, index=False)
+        else:
+            table.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
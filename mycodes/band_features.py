@@ -0,0 +1,124 @@
+import numpy as np
+from scipy import signal
+
+from dataclasses import dataclass
+
+from ring_buffer import RingBuffer
+from incremental_psd import BandPowers, DEFAULT_BANDS
+from streaming_filter import FilterPipeline
+
+# Online band power features over a fixed-length sliding window.
+#
+# Samples go through an optional causal filter pipeline once, as they arrive, into a
+# (channels x window) ring. Every `hop` seconds one Welch PSD of the window is taken
+# for all channels at once (segments of the nearest power of two of the sampling rate,
+# half overlap, Blackman-Harris, like DataFilter.get_avg_band_powers) and integrated
+# over every band with the precomputed BandPowers weights. Each hop gives a
+# BandFeatures record stamped with the board timestamp of the last sample in the
+# window. The per-channel relative powers (each band over the sum of all bands) and
+# their mean / std across channels follow get_avg_band_powers / get_custom_band_powers
+# (segments are demeaned as in scipy.signal.welch, so values differ slightly), and a
+# 250 ms hop costs one small rfft instead of a recomputation over whatever
+# get_board_data returned.
+
+# Band edges used by DataFilter.get_avg_band_powers: the default bands with gamma
+# stopping at 45 Hz, where its bandpass does
+BRAINFLOW_BANDS = DEFAULT_BANDS[:-1] + [(DEFAULT_BANDS[-1][0], 45.0)]
+# The filters get_avg_band_powers applies with apply_filter=True, as pipeline stages
+BRAINFLOW_FILTER_STAGES = [
+    {'type': 'bandpass', 'low': 2.0, 'high': 45.0, 'order': 4},
+    {'type': 'environmental_noise', 'noise': 'both', 'order': 4},
+]
+
+
+@dataclass(frozen=True)
+class BandFeatures:
+    timestamp: float
+    sample_index: int # samples seen by the extractor when the window ended
+    powers: np.ndarray # channels x bands, absolute
+    relative: np.ndarray # channels x bands, each channel over the sum of its bands
+    avg: np.ndarray # bands, mean of relative across channels
+    std: np.ndarray # bands
+
+
+def nearest_power_of_two(value):
+    return 1 << int(round(np.log2(value)))
+
+
+class BandPowerExtractor:
+    def __init__(self, channels, sampling_rate, bands=BRAINFLOW_BANDS, window=2.0, hop=0.25, nperseg=None,
+                 window_function='blackmanharris', filter_stages=None, timestamp_channel=None):
+        self.channels = list(channels)
+        self.sampling_rate = sampling_rate
+        self.bands = list(bands)
+        self.window_samples = int(round(window * sampling_rate))
+        self.hop_samples = max(1, int(round(hop * sampling_rate)))
+        self.nperseg = min(nperseg or nearest_power_of_two(sampling_rate), self.window_samples)
+        self.step = max(1, self.nperseg // 2)
+        self.num_segments = (self.window_samples - self.nperseg) // self.step + 1
+        self.timestamp_channel = timestamp_channel
+
+        self.taper = signal.get_window(window_function, self.nperseg)
+        self.freqs = np.fft.rfftfreq(self.nperseg, 1.0 / sampling_rate)
+        # One sided density scaling, same as scipy.signal.welch
+        self.scale = np.full(len(self.freqs), 2.0 / (sampling_rate * np.sum(self.taper ** 2)))
+        self.scale[0] /= 2
+        if self.nperseg % 2 == 0:
+            self.scale[-1] /= 2
+        self.band_powers = BandPowers(self.freqs, self.bands)
+
+        self.filter = FilterPipeline(filter_stages, sampling_rate) if filter_stages else None
+        self.buffer = RingBuffer(len(self.channels), self.window_samples)
+        self.timestamps = RingBuffer(1, self.window_samples)
+        self.reset()
+
+    def reset(self):
+        self.buffer.clear()
+        self.timestamps.clear()
+        if self.filter is not None:
+            self.filter.reset()
+        self.since_hop = 0
+        self.total = 0
+
+    def psd(self, window):
+        # (channels x freqs) Welch average over the segments of a (channels x samples) window
+        frames = np.lib.stride_tricks.sliding_window_view(window, self.nperseg, axis=1)[:, ::self.step]
+        frames = frames - frames.mean(axis=2, keepdims=True)
+        spectra = np.abs(np.fft.rfft(frames * self.taper, axis=2)) ** 2
+        return spectra.mean(axis=1) * self.scale
+
+    def compute(self, window, timestamp=np.nan):
+        # Features of one (channels x samples) window, at least nperseg samples long
+        powers = self.band_powers.compute(self.psd(window))
+        total = powers.sum(axis=1, keepdims=True)
+        relative = np.divide(powers, total, out=np.zeros_like(powers), where=total > 0)
+        return BandFeatures(timestamp=timestamp, sample_index=self.total, powers=powers, relative=relative,
+                            avg=relative.mean(axis=0), std=relative.std(axis=0))
+
+    def update(self, data):
+        # data is a BrainFlow (rows x samples) chunk of any size; returns the features
+        # of every hop completed in it, oldest first
+        num_samples = data.shape[1]
+        if num_samples == 0:
+            return list()
+        chunk = data[self.channels]
+        if self.filter is not None:
+            chunk = self.filter.process(chunk)
+        stamps = data[self.timestamp_channel][None, :] if self.timestamp_channel is not None else None
+
+        features = list()
+        position = 0
+        while position < num_samples:
+            take = min(num_samples - position, self.hop_samples - self.since_hop)
+            self.buffer.append(chunk[:, position:position + take])
+            if stamps is not None:
+                self.timestamps.append(stamps[:, position:position + take])
+            position += take
+            self.since_hop += take
+            self.total += take
+            if self.since_hop == self.hop_samples:
+                self.since_hop = 0
+                if len(self.buffer) == self.window_samples:
+                    timestamp = self.timestamps.get(1)[0, 0] if stamps is not None else np.nan
+                    features.append(self.compute(self.buffer.get(), timestamp))
+        return features
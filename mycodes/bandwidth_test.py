@@ -9,6 +9,14 @@ import matplotlib.pyplot as plt
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, LogLevels, BoardIds
 from brainflow.data_filter import DataFilter, FilterTypes, NoiseTypes, AggOperations, WindowOperations
 
+from streaming_filter import FilterPipeline
+
+FILTER_STAGES = [
+    {'type': 'rolling_mean', 'period': 2},
+    {'type': 'bandpass', 'low': 0.5, 'high': 10.0, 'order': 4},
+    {'type': 'environmental_noise', 'noise': 50},
+]
+
 def main():
     parser = argparse.ArgumentParser ()
 
@@ -82,9 +90,7 @@ def main():
     df[1].plot(subplots=True)
     plt.show()
 
-    DataFilter.perform_rolling_filter (data[1], 2, AggOperations.MEAN.value)
-    DataFilter.perform_bandpass(data[1], sampling_rate, 0.5, 10.0, 4, FilterTypes.BUTTERWORTH, 0)
-    DataFilter.remove_environmental_noise(data[1], sampling_rate, NoiseTypes.FIFTY.value)
+    data[1] = FilterPipeline(FILTER_STAGES, sampling_rate).apply(data[1])
 
     df2 = pd.DataFrame(np.transpose(data))
     plt.figure()
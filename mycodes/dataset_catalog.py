@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import glob
+import collections
+
+from dataclasses import dataclass
+from brainflow.board_shim import BoardShim, BoardIds
+from brainflow.data_filter import DataFilter
+
+from recording import open_recording, EXTENSION
+
+# Queryable index over the recordings archive.
+#
+# File names follow the protocol in ReadMe.md: Subject-Muscle-[soft|hard]-test.attempt,
+# e.g. Justi-TA-hard-1.2(unfiltered).csv. The index is built from the names alone, so
+# queries never touch signal data. Metadata (sample count, duration, per-channel stats)
+# is computed the first time it is asked for and cached in a JSON file next to the
+# recordings, keyed by file size and mtime. Decoded arrays are kept in an LRU cache.
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'official-tests')
+METADATA_FILE = '.catalog_cache.json'
+
+NAME_PATTERN = re.compile(r'^(?P<subject>[^-]+)-(?P<muscle>[^-]+)(?:-(?P<force>soft|hard))?'
+                          r'-(?P<test>\d+)\.(?P<attempt>\d+)(?:\((?P<variant>[^)]*)\))?$')
+
+
+@dataclass(frozen=True)
+class Entry:
+    name: str
+    path: str
+    subject: str
+    muscle: str
+    force: str
+    test: int
+    attempt: int
+    variant: str
+
+
+def parse_name(path):
+    # Returns an Entry for a file that follows the naming scheme, None otherwise
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = NAME_PATTERN.match(stem)
+    if match is None:
+        return None
+    name = stem if match.group('variant') is None else stem[:stem.index('(')]
+    return Entry(name=name, path=path, subject=match.group('subject'), muscle=match.group('muscle'),
+                 force=match.group('force'), test=int(match.group('test')),
+                 attempt=int(match.group('attempt')), variant=match.group('variant'))
+
+
+class DatasetCatalog:
+    def __init__(self, directory=DEFAULT_DIRECTORY, board_id=BoardIds.GANGLION_BOARD.value, cache_size=16):
+        self.directory = directory
+        self.board_id = board_id
+        self.sampling_rate = BoardShim.get_sampling_rate(board_id)
+        self.emg_channels = BoardShim.get_emg_channels(board_id)
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.metadata_path = os.path.join(directory, METADATA_FILE)
+        self.metadata_cache = None
+
+        self.entries = list()
+        for path in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+            entry = parse_name(path)
+            if entry is not None:
+                self.entries.append(entry)
+        self.by_name = {entry.name: entry for entry in self.entries}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def get(self, name):
+        return name if isinstance(name, Entry) else self.by_name[name]
+
+    def query(self, **conditions):
+        # e.g. query(subject='Justi', muscle='TA', force='hard'); None matches anything
+        return [entry for entry in self.entries
+                if all(value is None or getattr(entry, key) == value for key, value in conditions.items())]
+
+    def source(self, name):
+        # Prefer an up to date binary copy of the recording when there is one
+        entry = self.get(name)
+        binary = os.path.splitext(entry.path)[0] + EXTENSION
+        if os.path.exists(binary) and os.path.getmtime(binary) >= os.path.getmtime(entry.path):
+            return binary
+        return entry.path
+
+    def load(self, name, copy=True):
+        # BrainFlow (rows x samples) array. The cached array is read only; by default a
+        # copy is returned because most scripts filter in place with DataFilter.
+        entry = self.get(name)
+        data = self.cache.get(entry.path)
+        if data is None:
+            source = self.source(entry)
+            if source.endswith(EXTENSION):
+                data = open_recording(source).to_board_data()
+            else:
+                data = DataFilter.read_file(source)
+            data.flags.writeable = False
+            self.cache[entry.path] = data
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(entry.path)
+        return data.copy() if copy else data
+
+    def _load_metadata_cache(self):
+        if self.metadata_cache is None:
+            try:
+                with open(self.metadata_path) as f:
+                    self.metadata_cache = json.load(f)
+            except (OSError, ValueError):
+                self.metadata_cache = dict()
+        return self.metadata_cache
+
+    def _save_metadata_cache(self):
+        try:
+            with open(self.metadata_path, 'w') as f:
+                json.dump(self.metadata_cache, f, indent=1)
+        except OSError:
+            pass
+
+    def metadata(self, name):
+        entry = self.get(name)
+        stat = os.stat(entry.path)
+        key = os.path.basename(entry.path)
+        cache = self._load_metadata_cache()
+        cached = cache.get(key)
+        if cached is not None and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime:
+            return cached
+
+        data = self.load(entry, copy=False)
+        emg = data[self.emg_channels]
+        num_samples = data.shape[1]
+        cached = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'num_samples': num_samples,
+            'sampling_rate': self.sampling_rate,
+            'duration': num_samples / self.sampling_rate,
+            'channels': {
+                str(channel): {'mean': float(row.mean()), 'std': float(row.std()),
+                               'min': float(row.min()), 'max': float(row.max())}
+                for channel, row in zip(self.emg_channels, emg)
+            } if num_samples > 0 else dict(),
+        }
+        cache[key] = cached
+        self._save_metadata_cache()
+        return cached
+
+
+def main():
+    catalog = DatasetCatalog()
+    print('%d recordings in %s' % (len(catalog), os.path.abspath(catalog.directory)))
+    for entry in catalog:
+        meta = catalog.metadata(entry)
+        print('%-22s %-6s %-3s %-5s test %d attempt %d  %6d samples  %6.2f s' %
+              (entry.name, entry.subject, entry.muscle, entry.force or '-', entry.test, entry.attempt,
+               meta['num_samples'], meta['duration']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import time
+import argparse
+import numpy as np
+
+from dataclasses import dataclass
+from brainflow.board_shim import BoardShim
+from brainflow.data_filter import DataFilter
+
+from dataset_catalog import DatasetCatalog
+from streaming_filter import FilterPipeline
+
+# Time-domain EMG features over sliding windows, for all channels at once.
+#
+#   mav    mean absolute value            rms    root mean square
+#   iemg   integrated EMG (sum of |x|)    var    sum of x^2 / (N - 1)
+#   wl     waveform length                dasdv  RMS of the first difference
+#   zc     zero crossings                 ssc    slope sign changes
+#   wamp   Willison amplitude
+#
+# zc, ssc and wamp count a sample only when the step (zc, wamp) or the product of the
+# two slopes (ssc) exceeds `threshold`, the usual dead zone against noise. The default
+# is above the 2-5 uV sample to sample steps of an idle Ganglion channel; without a
+# dead zone wamp is window - 1 on any noisy signal. zc needs a signal without DC
+# offset (high-passed).
+#
+# Every feature is a window sum of a per sample quantity (|x|, x^2, |dx|, a crossing
+# flag...). Each quantity gets one cumulative sum over the whole (channels x samples)
+# array, and all windows are one subtraction of two gathered columns, with no Python
+# loop over windows. The streaming EmgFeatureExtractor keeps only the samples from the
+# start of the next window on (less than window + hop), or the count of samples still
+# to skip when the hop is longer than the window, and computes the windows a chunk
+# completes the same way, so chunk after chunk it gives the batch values.
+
+FEATURES = ('mav', 'rms', 'wl', 'zc', 'ssc', 'var', 'iemg', 'wamp', 'dasdv')
+DEFAULT_THRESHOLD = 10.0 # uV
+
+
+@dataclass(frozen=True)
+class EmgFeatures:
+    names: tuple # features, last axis of values
+    values: np.ndarray # channels x windows x features
+    sample_index: np.ndarray # windows, samples seen by the extractor when each window ended
+    timestamps: np.ndarray # windows, board timestamp of the last sample of each window
+
+    def feature(self, name):
+        # channels x windows
+        return self.values[..., self.names.index(name)]
+
+
+def window_starts(num_samples, window, hop=1):
+    if num_samples < window:
+        return np.zeros(0, dtype=np.intp)
+    return np.arange(0, num_samples - window + 1, hop)
+
+
+def window_sums(values, length, starts):
+    # Sums of values[..., start:start + length] for every start, from one cumulative sum
+    zero = np.zeros(values.shape[:-1] + (1,), dtype=np.int64 if values.dtype == bool else values.dtype)
+    sums = np.concatenate((zero, np.cumsum(values, axis=-1)), axis=-1)
+    return sums[..., starts + length] - sums[..., starts]
+
+
+def compute_features(signals, window, hop=1, features=FEATURES, threshold=DEFAULT_THRESHOLD):
+    # signals is (channels x samples); returns (channels x windows x features) for the
+    # windows starting every hop samples, see window_starts
+    signals = np.asarray(signals, dtype=np.float64)
+    if window < 3:
+        raise ValueError('window must be at least 3 samples, got %d' % window)
+    for name in features:
+        if name not in FEATURES:
+            raise ValueError('unknown feature: %s, expected one of %s' % (name, FEATURES))
+    starts = window_starts(signals.shape[-1], window, hop)
+    out = np.empty(signals.shape[:-1] + (len(starts), len(features)))
+    if len(starts) == 0:
+        return out
+
+    diff = np.diff(signals, axis=-1)
+    sums = dict()
+
+    def total(quantity):
+        # Window sums of a per sample quantity, each computed once
+        if quantity not in sums:
+            if quantity == 'abs':
+                sums[quantity] = window_sums(np.abs(signals), window, starts)
+            elif quantity == 'square':
+                sums[quantity] = window_sums(signals ** 2, window, starts)
+            elif quantity == 'abs_diff':
+                sums[quantity] = window_sums(np.abs(diff), window - 1, starts)
+            elif quantity == 'square_diff':
+                sums[quantity] = window_sums(diff ** 2, window - 1, starts)
+            elif quantity == 'zc':
+                crossing = (signals[..., :-1] * signals[..., 1:] < 0) & (np.abs(diff) > threshold)
+                sums[quantity] = window_sums(crossing, window - 1, starts)
+            elif quantity == 'ssc':
+                # Centre sample k + 1 of every triple
+                change = -diff[..., :-1] * diff[..., 1:] > threshold
+                sums[quantity] = window_sums(change, window - 2, starts)
+            elif quantity == 'wamp':
+                sums[quantity] = window_sums(np.abs(diff) > threshold, window - 1, starts)
+        return sums[quantity]
+
+    for i, name in enumerate(features):
+        if name == 'mav':
+            out[..., i] = total('abs') / window
+        elif name == 'iemg':
+            out[..., i] = total('abs')
+        elif name == 'rms':
+            out[..., i] = np.sqrt(np.maximum(total('square'), 0.0) / window)
+        elif name == 'var':
+            out[..., i] = np.maximum(total('square'), 0.0) / (window - 1)
+        elif name == 'wl':
+            out[..., i] = total('abs_diff')
+        elif name == 'dasdv':
+            out[..., i] = np.sqrt(np.maximum(total('square_diff'), 0.0) / (window - 1))
+        else:
+            out[..., i] = total(name)
+    return out
+
+
+class EmgFeatureExtractor:
+    def __init__(self, channels, sampling_rate, window=0.2, hop=0.05, features=FEATURES, threshold=DEFAULT_THRESHOLD,
+                 filter_stages=None, timestamp_channel=None):
+        self.channels = list(channels)
+        self.sampling_rate = sampling_rate
+        self.window_samples = int(round(window * sampling_rate))
+        self.hop_samples = max(1, int(round(hop * sampling_rate)))
+        self.features = tuple(features)
+        self.threshold = threshold
+        self.timestamp_channel = timestamp_channel
+        self.filter = FilterPipeline(filter_stages, sampling_rate) if filter_stages else None
+        self.reset()
+
+    def reset(self):
+        if self.filter is not None:
+            self.filter.reset()
+        self.tail = np.zeros((len(self.channels), 0)) # samples from the start of the next window on
+        self.timestamp_tail = np.zeros(0)
+        self.next_start = 0
+        self.skip = 0 # samples before the next window start that have not arrived yet (hop > window)
+        self.total = 0
+
+    def compute(self, signals):
+        # Features of a whole (channels x samples) recording, same windows as update()
+        return compute_features(signals, self.window_samples, self.hop_samples, self.features, self.threshold)
+
+    def update(self, data):
+        # data is a BrainFlow (rows x samples) chunk of any size; returns the features
+        # of every window completed in it, oldest first
+        chunk = data[self.channels]
+        if self.filter is not None and chunk.shape[1] > 0:
+            chunk = self.filter.process(chunk)
+        if self.timestamp_channel is not None:
+            stamps = data[self.timestamp_channel]
+        else:
+            stamps = np.full(chunk.shape[1], np.nan)
+        self.total += chunk.shape[1]
+        if self.skip > 0:
+            dropped = min(self.skip, chunk.shape[1])
+            chunk = chunk[:, dropped:]
+            stamps = stamps[dropped:]
+            self.skip -= dropped
+
+        joined = np.concatenate((self.tail, chunk), axis=1)
+        stamps = np.concatenate((self.timestamp_tail, stamps))
+        if joined.shape[1] >= self.window_samples:
+            values = self.compute(joined)
+        else:
+            # Most packets complete no window
+            values = np.empty((len(self.channels), 0, len(self.features)))
+        num_windows = values.shape[1]
+        ends = np.arange(num_windows) * self.hop_samples + self.window_samples
+        features = EmgFeatures(names=self.features, values=values, sample_index=self.next_start + ends,
+                               timestamps=stamps[ends - 1])
+        consumed = num_windows * self.hop_samples
+        self.next_start += consumed
+        self.skip += max(consumed - joined.shape[1], 0)
+        self.tail = joined[:, consumed:]
+        self.timestamp_tail = stamps[consumed:]
+        return features
+
+
+def reference_features(signals, window, hop, threshold=DEFAULT_THRESHOLD):
+    # Straightforward per window loop, to check compute_features against
+    out = list()
+    for start in window_starts(signals.shape[-1], window, hop):
+        x = signals[:, start:start + window]
+        d = np.diff(x, axis=1)
+        out.append(np.stack([
+            np.mean(np.abs(x), axis=1),
+            np.sqrt(np.mean(x ** 2, axis=1)),
+            np.sum(np.abs(d), axis=1),
+            np.sum((x[:, :-1] * x[:, 1:] < 0) & (np.abs(d) > threshold), axis=1),
+            np.sum(-d[:, :-1] * d[:, 1:] > threshold, axis=1),
+            np.sum(x ** 2, axis=1) / (window - 1),
+            np.sum(np.abs(x), axis=1),
+            np.sum(np.abs(d) > threshold, axis=1),
+            np.sqrt(np.mean(d ** 2, axis=1)),
+        ], axis=1))
+    return np.stack(out, axis=1)
+
+
+def stream_difference(extractor, data, batch, chunk_samples):
+    # Largest relative difference of a chunk by chunk pass from the batch features,
+    # inf if the windows differ
+    streamed = list()
+    ends = list()
+    for begin in range(0, data.shape[1], chunk_samples):
+        features = extractor.update(data[:, begin:begin + chunk_samples])
+        streamed.append(features.values)
+        ends.append(features.sample_index)
+    streamed = np.concatenate(streamed, axis=1)
+    expected = np.arange(batch.shape[1]) * extractor.hop_samples + extractor.window_samples
+    if streamed.shape != batch.shape or not np.array_equal(np.concatenate(ends), expected):
+        return np.inf
+    return np.max(np.abs(streamed - batch) / np.maximum(np.abs(batch), 1.0), initial=0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--window', type=float, help='window in seconds', required=False, default=0.2)
+    parser.add_argument('--hop', type=float, help='hop in seconds', required=False, default=0.005)
+    parser.add_argument('--threshold', type=float, help='zc / ssc / wamp dead zone', required=False,
+                        default=DEFAULT_THRESHOLD)
+    parser.add_argument('--chunk-samples', type=int, help='samples per streaming call', required=False, default=2)
+    args = parser.parse_args()
+
+    # Features of every recording of the archive: throughput of the batch pass, its
+    # largest relative difference from a per window loop, and the largest relative
+    # difference of a packet by packet streaming pass from the batch one, with the
+    # given hop and with a hop longer than the window (stream hop > window)
+    DataFilter.disable_data_logger()
+    catalog = DatasetCatalog()
+    channels = BoardShim.get_emg_channels(catalog.board_id)
+    timestamp_channel = BoardShim.get_timestamp_channel(catalog.board_id)
+    print('%-22s %8s %8s %10s %12s %12s %12s %12s' % ('name', 'windows', 'batch', 'windows/ms', 'loop error',
+                                                      'stream error', 'stream call', 'hop > window'))
+    for entry in catalog:
+        data = catalog.load(entry, copy=False)
+        signals = np.ascontiguousarray(data[channels])
+        extractor = EmgFeatureExtractor(channels, catalog.sampling_rate, args.window, args.hop,
+                                        threshold=args.threshold, timestamp_channel=timestamp_channel)
+        start = time.perf_counter()
+        batch = extractor.compute(signals)
+        batch_time = time.perf_counter() - start
+        scale = np.maximum(np.abs(batch), 1.0)
+        reference = reference_features(signals, extractor.window_samples, extractor.hop_samples, args.threshold)
+        loop_error = np.max(np.abs(batch - reference) / scale)
+
+        start = time.perf_counter()
+        stream_error = stream_difference(extractor, data, batch, args.chunk_samples)
+        stream_time = time.perf_counter() - start
+        num_calls = -(-data.shape[1] // args.chunk_samples)
+        sparse = EmgFeatureExtractor(channels, catalog.sampling_rate, args.window, 4 * args.window,
+                                     threshold=args.threshold, timestamp_channel=timestamp_channel)
+        sparse_error = stream_difference(sparse, data, sparse.compute(signals), 7)
+        print('%-22s %8d %5.2f ms %10.0f %12.1e %12.1e %9.1f us %12.1e' %
+              (entry.name, batch.shape[1], batch_time * 1000, batch.shape[1] / (batch_time * 1000), loop_error,
+               stream_error, stream_time / num_calls * 1e6, sparse_error))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,18 @@ import matplotlib.pyplot as plt
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, LogLevels, BoardIds
 from brainflow.data_filter import DataFilter, DetrendOperations, FilterTypes, NoiseTypes, AggOperations, WindowOperations
 
+from activation_segmenter import ActivationSegmenter, phase_ranges
+from spectral_analysis import compute_spectrum, plot_spectrum
+from streaming_filter import FilterPipeline
+
+FILTER_STAGES = [
+    {'type': 'rolling_mean', 'period': 2},
+    {'type': 'detrend', 'detrend': 'linear'},
+    {'type': 'environmental_noise', 'noise': 'both'},
+    {'type': 'highpass', 'cutoff': 10.0, 'order': 4},
+    {'type': 'bandstop', 'low': 0.5, 'high': 1.5, 'order': 4}, # ECG notch
+]
+
 def plot_timeseries(data, emg_channels, sample_rate, file_name):
     # Convert it to pandas DF
     df = pd.DataFrame(np.transpose(data))
@@ -29,48 +41,12 @@ def plot_timeseries(data, emg_channels, sample_rate, file_name):
     plt.grid(True)
     plt.savefig(file_name)
     
-def plot_fft(data, channel, sampling_rate, file_name):
-    fft_data = DataFilter.perform_fft(data, WindowOperations.NO_WINDOW.value)
-
-    # Compute the magnitudes of the FFT result
-    magnitude = np.abs(fft_data)
-
-    # Generate the frequency axis
-    N = len(fft_data)
-    freq = np.fft.fftfreq(N, d=1/sampling_rate)
-    
-    # Filter frequencies and amplitudes
-    positive_freq = freq[(freq > 0) & (freq < 50) & (magnitude > 0)]
-    positive_mag = magnitude[(freq > 0) & (freq < 50) & (magnitude > 0)]
-    
-    # Filter frequencies and amplitudes above 30% of max value
-    #max_mag = magnitude.max()
-    #marked_freq = freq[magnitude > max_mag*0.5]
-    #marked_mag = magnitude[magnitude > max_mag*0.5]
-    
-    # Find the three most powerful frequencies and their amplitudes
-    marked_indices = np.argsort(positive_mag)[-3:]
-    marked_freq = positive_freq[marked_indices]
-    marked_mag = positive_mag[marked_indices]
-
-    # Plot the FFT result
-    plt.figure(figsize=(10, 5))
-    plt.plot(positive_freq, positive_mag, linestyle='-', linewidth=1)
-    plt.scatter(marked_freq, marked_mag, marker='o')  # Plot markers for positive amplitudes
-    plt.xlabel('Frequency (Hz)')
-    plt.ylabel('Amplitude (μV)')
-    # Set the x-axis limit to 0-100 Hz and the y-axis limit to auto
-    plt.xlim(0, 50)
-    plt.ylim(0, auto=True)
-    plt.title('FFT Channel %d Plot' % channel)
-    plt.grid(True)
-
-    # Annotate the three most powerful frequencies with their amplitudes
-    for f, mag in zip(marked_freq, marked_mag):
-        plt.annotate(f'{f:.2f} Hz\n{mag:.2f} μV', xy=(f, mag), xytext=(f + 5, mag),
-                    arrowprops=dict(facecolor='black', arrowstyle='->'), bbox=dict(facecolor='white', alpha=0.5))
-    
-    plt.savefig(file_name + '_fft_channel_%d.png' % channel)
+def plot_fft(spectrum, file_name):
+    # One figure per channel of a spectral_analysis.Spectrum, three strongest peaks annotated
+    for index, channel in enumerate(spectrum.channels):
+        plot_spectrum(spectrum, index, max_freq=50)
+        plt.savefig(file_name + '_fft_channel_%d.png' % channel)
+        plt.close()
     
     
 def main():
@@ -145,23 +121,30 @@ def main():
     
     plot_timeseries(data, emg_channels, sampling_rate, args.file_name + '_original_signals.png')
 
-    for channel in emg_channels:
-        # Detrend the signal by removing the mean
-        DataFilter.perform_rolling_filter(data[channel], 2, AggOperations.MEAN.value)
-        DataFilter.detrend(data[channel], DetrendOperations.LINEAR.value)
-
-        #Denoise data
-        DataFilter.remove_environmental_noise(data[channel], sampling_rate, NoiseTypes.FIFTY_AND_SIXTY)
-        DataFilter.perform_highpass(data[channel], sampling_rate, 10, 4, FilterTypes.BUTTERWORTH, 0)
-
-        # Remove ECG artifacts
-        DataFilter.perform_bandstop(data[channel], sampling_rate, 0.5, 1.5, 4, FilterTypes.BUTTERWORTH_ZERO_PHASE, 0) # notch
-        
-        # Calculate FFT on the detrended signal, len of data must be a power of 2 (256 in this case)
-        first_array = data[channel][:1024]
-        second_array = data[channel][1024:]
-        plot_fft(first_array, channel, sampling_rate, args.file_name + '_relax')
-        plot_fft(second_array, channel, sampling_rate, args.file_name + '_move')
+    # Relax and move phases from the activation segments of the raw signals, the
+    # subject does not start moving exactly when told to
+    segmenter = ActivationSegmenter(len(emg_channels), sampling_rate)
+    segments = segmenter.process(data[emg_channels]) + segmenter.finish()
+    if segmenter.contaminated.any():
+        print("Warning: EMG channels %s were not at rest during calibration, their thresholds are too high" %
+              [emg_channels[i] for i in np.flatnonzero(segmenter.contaminated)])
+    relax, move = phase_ranges(segments, data.shape[1])
+    if relax is None or move is None:
+        # Short recordings are split in half
+        split = min(1024, data.shape[1] // 2)
+        print("No activation found, splitting at sample %d" % split)
+        relax, move = (0, split), (split, data.shape[1])
+    print("Relax: %.2f - %.2f s, move: %.2f - %.2f s" % (relax[0] / sampling_rate, relax[1] / sampling_rate,
+                                                         move[0] / sampling_rate, move[1] / sampling_rate))
+
+    # Detrend, denoise and remove ECG artifacts on all channels at once (zero-phase)
+    data[emg_channels] = FilterPipeline(FILTER_STAGES, sampling_rate).apply(data[emg_channels])
+
+    # Calculate FFT of all channels on the detrended signal, relax and move phases
+    relax_spectrum = compute_spectrum(data[:, relax[0]:relax[1]], sampling_rate, emg_channels, max_freq=50, num_peaks=3)
+    move_spectrum = compute_spectrum(data[:, move[0]:move[1]], sampling_rate, emg_channels, max_freq=50, num_peaks=3)
+    plot_fft(relax_spectrum, args.file_name + '_relax')
+    plot_fft(move_spectrum, args.file_name + '_move')
 
     plot_timeseries(data, emg_channels, sampling_rate, args.file_name + '_processed_signals.png')
     
@@ -0,0 +1,101 @@
+import time
+import numpy as np
+
+# Flex (jump) detector for the EMG controlled Dino game.
+#
+# Calibration keeps a running mean / variance / max (Welford, merged chunk by
+# chunk) so it costs O(1) memory whatever its length. Detection squares the
+# deviation of a whole chunk at once and returns the exact sample that crossed
+# the threshold together with its board timestamp.
+
+
+class FlexDetector:
+    def __init__(self, threshold_ratio=0.25, refractory_time=0.1, smoothing_period=2):
+        self.threshold_ratio = threshold_ratio  # needs to be set per person
+        self.refractory_time = refractory_time  # seconds between two flexes
+        self.smoothing_period = smoothing_period
+        self.tail = np.zeros(0)
+        self.reset_calibration()
+
+    def reset_calibration(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max_val = -np.inf
+        self.threshold = None
+        self.last_flex_time = -np.inf
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count > 0 else 0.0
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def smooth(self, values):
+        # Causal rolling mean, carrying the last samples over from the previous chunk
+        if self.smoothing_period <= 1:
+            return np.asarray(values, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values
+        period = self.smoothing_period
+        if len(self.tail) == 0:
+            self.tail = np.full(period - 1, values[0])
+        joined = np.concatenate((self.tail, values))
+        cumsum = np.cumsum(np.concatenate(([0.0], joined)))
+        self.tail = joined[-(period - 1):]
+        return (cumsum[period:] - cumsum[:-period]) / period
+
+    def calibrate(self, values):
+        values = self.smooth(values)
+        if len(values) == 0:
+            return
+        # Chan et al. merge of the chunk statistics into the running ones
+        count = len(values)
+        mean = values.mean()
+        m2 = np.sum((values - mean) ** 2)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        self.max_val = max(self.max_val, values.max())
+
+    def finish_calibration(self):
+        self.threshold = self.threshold_ratio * ((self.max_val - self.mean) ** 2)
+        return self.threshold
+
+    def detect(self, values, timestamps):
+        # Returns a list of (sample index, timestamp) for every flex in the chunk
+        if self.threshold is None:
+            raise RuntimeError('calibrate the detector before detecting flexes')
+        values = self.smooth(values)
+        crossings = np.flatnonzero((values - self.mean) ** 2 >= self.threshold)
+        events = list()
+        while len(crossings) > 0:
+            index = crossings[0]
+            if timestamps[index] - self.last_flex_time >= self.refractory_time:
+                events.append((int(index), float(timestamps[index])))
+                self.last_flex_time = timestamps[index]
+            # Skip the crossings that fall in the refractory window
+            resume = np.searchsorted(timestamps, self.last_flex_time + self.refractory_time)
+            crossings = crossings[crossings >= max(resume, index + 1)]
+        return events
+
+
+def wait_for_samples(board, num_samples, sampling_rate=None, timeout=None, poll_interval=0.005):
+    # Sleeps until the board buffer holds num_samples samples instead of spinning on
+    # get_board_data(). Returns False if the timeout expired first.
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        missing = num_samples - board.get_board_data_count()
+        if missing <= 0:
+            return True
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        if sampling_rate:
+            time.sleep(max(poll_interval, missing / sampling_rate))
+        else:
+            time.sleep(poll_interval)
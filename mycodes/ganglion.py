@@ -9,6 +9,7 @@ import matplotlib.pyplot as plt
 
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, LogLevels, BoardIds
 from brainflow.data_filter import DataFilter, FilterTypes, NoiseTypes, AggOperations, WindowOperations
+from shared_board import SharedBoard
 
 def main():
     parser = argparse.ArgumentParser ()
@@ -28,6 +29,7 @@ def main():
     parser.add_argument ('--master-board', type=int, help='master board id for streaming and playback boards', required=False, default=BoardIds.NO_BOARD)
     parser.add_argument ('--log', action = 'store_true')
     parser.add_argument ('--file-name', type = str, help = 'file name for recorded data', required = False, default = 'default')
+    parser.add_argument ('--shared-board', type = str, help = 'read from the acquisition daemon with this shared memory name', required = False, default = '')
 
     args = parser.parse_args ()
 
@@ -48,10 +50,13 @@ def main():
     else:
         BoardShim.disable_board_logger()
 
-    board = BoardShim(args.board_id, params)
+    if args.shared_board:
+        board = SharedBoard(args.shared_board)
+    else:
+        board = BoardShim(args.board_id, params)
     board.prepare_session()
     print("Starting...")
-    sampling_rate = BoardShim.get_sampling_rate(args.board_id)
+    sampling_rate = BoardShim.get_sampling_rate(board.get_board_id())
     print("Sampling rate:", sampling_rate)
     board.start_stream(45000, args.streamer_params)
 
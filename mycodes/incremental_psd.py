@@ -0,0 +1,95 @@
+import collections
+import numpy as np
+from scipy import signal
+
+# Welch PSD that is updated as samples arrive instead of being recomputed over the
+# whole window. Each complete segment is transformed once, its periodogram is kept
+# in a deque and the average is updated by adding the new segment and removing the
+# one that falls out of the window.
+
+DEFAULT_BANDS = [(2.0, 4.0), (4.0, 8.0), (8.0, 13.0), (13.0, 30.0), (30.0, 50.0)]
+
+
+class IncrementalWelch:
+    def __init__(self, num_channels, sampling_rate, nperseg, noverlap=None, num_segments=8,
+                 window='blackmanharris'):
+        self.num_channels = num_channels
+        self.sampling_rate = sampling_rate
+        self.nperseg = nperseg
+        self.noverlap = nperseg // 2 if noverlap is None else noverlap
+        self.step = self.nperseg - self.noverlap
+        self.window = signal.get_window(window, nperseg)
+        self.freqs = np.fft.rfftfreq(nperseg, 1.0 / sampling_rate)
+
+        # One sided density scaling, same as scipy.signal.welch
+        self.scale = np.full(len(self.freqs), 2.0 / (sampling_rate * np.sum(self.window ** 2)))
+        self.scale[0] /= 2
+        if nperseg % 2 == 0:
+            self.scale[-1] /= 2
+
+        self.segments = collections.deque(maxlen=num_segments)
+        self.total = np.zeros((num_channels, len(self.freqs)))
+        self.pending = np.zeros((num_channels, 0))
+        self.updates = 0
+
+    def __len__(self):
+        return len(self.segments)
+
+    def reset(self):
+        self.segments.clear()
+        self.total[:] = 0
+        self.pending = np.zeros((self.num_channels, 0))
+
+    def update(self, chunk):
+        # chunk is (channels x new samples); returns the number of new segments
+        pending = np.concatenate((self.pending, chunk), axis=1)
+        if pending.shape[1] < self.nperseg:
+            self.pending = pending
+            return 0
+
+        # All newly complete segments go through a single rfft call
+        frames = np.lib.stride_tricks.sliding_window_view(pending, self.nperseg, axis=1)[:, ::self.step]
+        frames = frames - frames.mean(axis=2, keepdims=True)
+        spectra = np.abs(np.fft.rfft(frames * self.window, axis=2)) ** 2 * self.scale
+        num_new = spectra.shape[1]
+        self.pending = pending[:, num_new * self.step:]
+
+        for i in range(num_new):
+            if len(self.segments) == self.segments.maxlen:
+                self.total -= self.segments[0]
+            self.segments.append(spectra[:, i])
+            self.total += spectra[:, i]
+        self.updates += num_new
+        # Rebuild the running sum now and then so rounding errors do not pile up
+        if self.updates >= 64 * self.segments.maxlen:
+            self.total = np.sum(self.segments, axis=0)
+            self.updates = 0
+        return num_new
+
+    @property
+    def psd(self):
+        # (channels x freqs) average of the segments currently in the window
+        if not self.segments:
+            return np.zeros_like(self.total)
+        return self.total / len(self.segments)
+
+
+class BandPowers:
+    # Integrates a PSD over several bands at once. The trapezoid weights of every
+    # band are laid out as one (freqs x bands) matrix, so all channels and all bands
+    # come out of a single matrix product.
+
+    def __init__(self, freqs, bands=DEFAULT_BANDS):
+        self.bands = list(bands)
+        self.weights = np.zeros((len(freqs), len(self.bands)))
+        for i, (low, high) in enumerate(self.bands):
+            idx = np.flatnonzero((freqs >= low) & (freqs <= high))
+            if len(idx) < 2:
+                continue
+            widths = np.diff(freqs[idx])
+            self.weights[idx[:-1], i] += widths / 2
+            self.weights[idx[1:], i] += widths / 2
+
+    def compute(self, psd):
+        # psd is (channels x freqs), returns (channels x bands)
+        return psd @ self.weights
@@ -0,0 +1,288 @@
+import time
+import argparse
+import threading
+import collections
+import numpy as np
+
+from dataclasses import dataclass
+from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
+
+from ring_buffer import RingBuffer
+
+# Data integrity monitor for the board stream: package counter gaps, wraps and
+# timestamp jitter, tracked chunk by chunk.
+#
+# The Ganglion sends two samples per BLE packet and numbers packets 100..199 (row 0),
+# so a sample's counter either repeats (second sample of the packet), steps by one, or
+# jumps: a jump of d (mod 100) means d - 1 lost packets. Every chunk is checked with
+# one modular np.diff, the last counter and packet timestamp carry over to the next
+# chunk. The interval between packet timestamps gives jitter and a rolling histogram
+# over the last `window` packets. A timestamp gap much longer than a packet period is
+# reported even when the counter looks continuous (a loss of exactly 100 packets).
+#
+# update() is called by whoever owns the stream, stats() hands a frozen snapshot to
+# any other thread. main() audits the recordings archive, or watches a live board.
+
+GANGLION_LAYOUT = {'counter_min': 100, 'counter_max': 199, 'samples_per_packet': 2}
+DEFAULT_LAYOUT = {'counter_min': 0, 'counter_max': 255, 'samples_per_packet': 1}
+
+
+def board_layout(board_id):
+    # Package counter range and samples per packet of a board
+    if board_id in (BoardIds.GANGLION_BOARD.value, BoardIds.GANGLION_NATIVE_BOARD.value):
+        return dict(GANGLION_LAYOUT)
+    return dict(DEFAULT_LAYOUT)
+
+
+@dataclass(frozen=True)
+class IntegrityStats:
+    received_samples: int
+    received_packets: int
+    lost_packets: int
+    loss_rate: float
+    counter_wraps: int
+    repeated_samples: int
+    out_of_range: int
+    timestamp_gaps: int
+    effective_rate: float
+    window_rate: float
+    mean_interval: float
+    jitter: float
+    max_interval: float
+    histogram: np.ndarray
+    bin_edges: np.ndarray
+
+
+class IntegrityMonitor:
+    def __init__(self, sampling_rate, counter_row=0, timestamp_row=13, counter_min=100, counter_max=199,
+                 samples_per_packet=2, window=1000, bin_width=0.001, max_interval=0.1, gap_factor=10.0):
+        self.sampling_rate = sampling_rate
+        self.counter_row = counter_row
+        self.timestamp_row = timestamp_row
+        self.counter_min = counter_min
+        self.counter_max = counter_max
+        self.modulus = counter_max - counter_min + 1
+        self.samples_per_packet = samples_per_packet
+        self.packet_period = samples_per_packet / sampling_rate
+        self.gap_threshold = gap_factor * self.packet_period
+        # Intervals above max_interval go to the last bin
+        self.bin_edges = np.append(np.arange(0.0, max_interval, bin_width), np.inf)
+        self.num_bins = len(self.bin_edges) - 1
+        self.bin_width = bin_width
+        # Per packet: timestamp, interval to the previous packet, histogram bin
+        self.packets = RingBuffer(3, window)
+        self.gaps = collections.deque(maxlen=100)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.packets.clear()
+        self.gaps.clear()
+        self.histogram = np.zeros(self.num_bins, dtype=np.int64)
+        self.last_counter = None
+        self.last_packet_time = None
+        self.first_packet_time = None
+        self.open_packet_samples = 0
+        self.received_samples = 0
+        self.received_packets = 0
+        self.lost_packets = 0
+        self.counter_wraps = 0
+        self.repeated_samples = 0
+        self.out_of_range = 0
+        self.timestamp_gaps = 0
+        self.interval_sum = 0.0
+        self.interval_sum2 = 0.0
+        self.num_intervals = 0
+        self.max_interval = 0.0
+
+    def update(self, data):
+        # data is a BrainFlow (rows x samples) chunk; returns the packets lost in it
+        num_samples = data.shape[1]
+        if num_samples == 0:
+            return 0
+        counter = data[self.counter_row]
+        timestamps = data[self.timestamp_row]
+        with self.lock:
+            return self._update(counter, timestamps, num_samples)
+
+    def _update(self, counter, timestamps, num_samples):
+        self.out_of_range += int(np.count_nonzero((counter < self.counter_min) | (counter > self.counter_max)))
+
+        # Modular step of every sample against the one before it, across chunk borders.
+        # The very first sample opens a packet without any loss.
+        first_chunk = self.last_counter is None
+        raw_steps = np.diff(counter, prepend=counter[0] if first_chunk else self.last_counter)
+        steps = np.mod(raw_steps, self.modulus)
+        if first_chunk:
+            steps[0] = 1
+        self.counter_wraps += int(np.count_nonzero(raw_steps < 0))
+        starts = np.flatnonzero(steps != 0)
+        packet_lost = steps[starts] - 1
+        lost_packets = int(packet_lost.sum())
+
+        # Samples beyond samples_per_packet under one counter value are repeats
+        # (or a loss of a whole counter cycle, which the timestamps then show)
+        sizes = np.diff(np.append(starts, num_samples))
+        if len(starts):
+            self.repeated_samples += max(0, self.open_packet_samples + starts[0] - self.samples_per_packet)
+            self.repeated_samples += int(np.maximum(sizes[:-1] - self.samples_per_packet, 0).sum())
+            self.open_packet_samples = int(sizes[-1])
+        else:
+            self.open_packet_samples += num_samples
+
+        # Interval between consecutive packet timestamps; a lost packet stretches it
+        packet_times = timestamps[starts]
+        if first_chunk:
+            # The first packet only sets the reference time
+            self.first_packet_time = float(packet_times[0])
+            self.last_packet_time = self.first_packet_time
+            packet_times = packet_times[1:]
+            packet_lost = packet_lost[1:]
+        if len(packet_times):
+            intervals = np.diff(packet_times, prepend=self.last_packet_time)
+            bins = np.minimum((np.maximum(intervals, 0.0) / self.bin_width).astype(np.int64), self.num_bins - 1)
+            self._push_packets(packet_times, intervals, bins)
+            self.interval_sum += float(intervals.sum())
+            self.interval_sum2 += float((intervals * intervals).sum())
+            self.num_intervals += len(intervals)
+            self.max_interval = max(self.max_interval, float(intervals.max()))
+            gaps = np.flatnonzero(intervals > self.gap_threshold)
+            self.timestamp_gaps += len(gaps)
+            for index in gaps:
+                self.gaps.append((float(packet_times[index]), float(intervals[index]), int(packet_lost[index])))
+            self.last_packet_time = float(packet_times[-1])
+
+        self.last_counter = counter[-1]
+        self.received_samples += num_samples
+        self.received_packets += len(starts)
+        self.lost_packets += lost_packets
+        return lost_packets
+
+    def _push_packets(self, times, intervals, bins):
+        # Histogram of the last `window` intervals: add the new bins, drop the evicted ones
+        if len(bins) == 0:
+            return
+        capacity = self.packets.capacity
+        evicted = len(self.packets) + len(bins) - capacity
+        if evicted > 0:
+            old = self.packets.get()[2, :min(evicted, len(self.packets))]
+            self.histogram -= np.bincount(old.astype(np.int64), minlength=self.num_bins)
+        kept = bins[-capacity:]
+        self.histogram += np.bincount(kept, minlength=self.num_bins)
+        self.packets.append(np.vstack((times, intervals, bins)))
+
+    def stats(self):
+        with self.lock:
+            total_packets = self.received_packets + self.lost_packets
+            window = self.packets.get()
+            # Packets since the first one over the time they span
+            span = (self.last_packet_time - self.first_packet_time) if self.first_packet_time is not None else 0.0
+            effective_rate = (self.received_packets - 1) * self.samples_per_packet / span if span > 0 else 0.0
+            window_span = float(window[1].sum()) if window.shape[1] else 0.0
+            window_rate = window.shape[1] * self.samples_per_packet / window_span if window_span > 0 else 0.0
+            mean = self.interval_sum / self.num_intervals if self.num_intervals else 0.0
+            variance = self.interval_sum2 / self.num_intervals - mean * mean if self.num_intervals else 0.0
+            return IntegrityStats(
+                received_samples=self.received_samples,
+                received_packets=self.received_packets,
+                lost_packets=self.lost_packets,
+                loss_rate=self.lost_packets / total_packets if total_packets else 0.0,
+                counter_wraps=self.counter_wraps,
+                repeated_samples=self.repeated_samples,
+                out_of_range=self.out_of_range,
+                timestamp_gaps=self.timestamp_gaps,
+                effective_rate=effective_rate,
+                window_rate=window_rate,
+                mean_interval=mean,
+                jitter=float(np.sqrt(max(variance, 0.0))),
+                max_interval=self.max_interval,
+                histogram=self.histogram.copy(),
+                bin_edges=self.bin_edges,
+            )
+
+
+def audit(data, sampling_rate, **layout):
+    # Whole recording in one update
+    monitor = IntegrityMonitor(sampling_rate, **layout)
+    monitor.update(data)
+    return monitor.stats()
+
+
+def audit_archive(directory=None):
+    # One row per recording of the archive, as in data_rate/batch_snr.py
+    from dataset_catalog import DatasetCatalog, DEFAULT_DIRECTORY
+    catalog = DatasetCatalog(directory or DEFAULT_DIRECTORY)
+    layout = board_layout(catalog.board_id)
+    layout['timestamp_row'] = BoardShim.get_timestamp_channel(catalog.board_id)
+    layout['counter_row'] = BoardShim.get_package_num_channel(catalog.board_id)
+    rows = list()
+    for entry in catalog:
+        stats = audit(catalog.load(entry, copy=False), catalog.sampling_rate, **layout)
+        rows.append((entry.name, stats))
+    return rows
+
+
+def print_stats(stats):
+    print('%d samples, %d packets, %d lost (%.3f%%), %d wraps, %d repeated, %d out of range, %d timestamp gaps' %
+          (stats.received_samples, stats.received_packets, stats.lost_packets, stats.loss_rate * 100,
+           stats.counter_wraps, stats.repeated_samples, stats.out_of_range, stats.timestamp_gaps))
+    print('rate %.2f Hz (window %.2f Hz), packet interval %.2f ms +- %.2f ms, max %.2f ms' %
+          (stats.effective_rate, stats.window_rate, stats.mean_interval * 1000, stats.jitter * 1000,
+           stats.max_interval * 1000))
+
+
+def live(args):
+    params = BrainFlowInputParams()
+    params.serial_port = args.serial_port
+    params.mac_address = args.mac_address
+    BoardShim.disable_board_logger()
+    board = BoardShim(args.board_id, params)
+    sampling_rate = BoardShim.get_sampling_rate(args.board_id)
+    layout = board_layout(args.board_id)
+    monitor = IntegrityMonitor(sampling_rate, BoardShim.get_package_num_channel(args.board_id),
+                               BoardShim.get_timestamp_channel(args.board_id), **layout)
+    try:
+        board.prepare_session()
+        board.start_stream()
+        while True:
+            time.sleep(args.report_interval)
+            lost = monitor.update(board.get_board_data())
+            if lost:
+                print('lost %d packets' % lost)
+            print_stats(monitor.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if board.is_prepared():
+            board.release_session()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--directory', type=str, help='recordings archive', required=False, default=None)
+    parser.add_argument('--live', action='store_true', help='watch a board instead of auditing the archive')
+    parser.add_argument('--board-id', type=int, help='board id for --live', required=False,
+                        default=BoardIds.SYNTHETIC_BOARD.value)
+    parser.add_argument('--serial-port', type=str, help='serial port', required=False, default='')
+    parser.add_argument('--mac-address', type=str, help='mac address', required=False, default='')
+    parser.add_argument('--report-interval', type=float, help='seconds between reports', required=False, default=1.0)
+    args = parser.parse_args()
+
+    if args.live:
+        live(args)
+        return
+
+    start = time.perf_counter()
+    rows = audit_archive(args.directory)
+    print('%-22s %7s %7s %5s %8s %6s %9s %8s %8s %5s' %
+          ('name', 'samples', 'packets', 'lost', 'loss %', 'wraps', 'rate Hz', 'int ms', 'jit ms', 'gaps'))
+    for name, stats in rows:
+        print('%-22s %7d %7d %5d %8.3f %6d %9.2f %8.2f %8.2f %5d' %
+              (name, stats.received_samples, stats.received_packets, stats.lost_packets, stats.loss_rate * 100,
+               stats.counter_wraps, stats.effective_rate, stats.mean_interval * 1000, stats.jitter * 1000,
+               stats.timestamp_gaps))
+    print('\n%d recordings audited in %.2f ms' % (len(rows), (time.perf_counter() - start) * 1000))
+
+
+if __name__ == "__main__":
+    main()
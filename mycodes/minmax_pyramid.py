@@ -0,0 +1,102 @@
+import numpy as np
+
+from ring_buffer import RingBuffer
+
+# Display side of the live plots: the last `capacity` samples of every channel plus
+# min/max decimated copies at block sizes factor, factor**2, ... Levels are updated
+# incrementally as chunks arrive (each level only reduces the blocks completed by
+# the level below), so drawing a 60 s window costs the same as drawing a 4 s one:
+# get() picks the finest level that fits the plot's pixel width and returns NumPy
+# arrays that go straight to curve.setData. Interleaving each block's min and max
+# keeps spikes visible, unlike plain decimation.
+
+
+class MinMaxPyramid:
+    def __init__(self, num_channels, capacity, factor=2, sampling_rate=1.0):
+        self.num_channels = num_channels
+        self.capacity = capacity
+        self.factor = factor
+        self.sampling_rate = sampling_rate
+        self.raw = RingBuffer(num_channels, capacity)
+        self.total = 0
+
+        # Level k holds blocks of factor**k samples, mins in the first half of the rows
+        self.block_sizes = list()
+        self.levels = list()
+        block_size = factor
+        while block_size <= capacity:
+            self.block_sizes.append(block_size)
+            self.levels.append(RingBuffer(2 * num_channels, capacity // block_size + 1))
+            block_size *= factor
+        self.pending = [np.zeros((2 * num_channels, 0)) for _ in self.levels]
+
+    def __len__(self):
+        return len(self.raw)
+
+    def clear(self):
+        self.raw.clear()
+        for level in self.levels:
+            level.clear()
+        self.pending = [np.zeros((2 * self.num_channels, 0)) for _ in self.levels]
+        self.total = 0
+
+    def append(self, chunk):
+        # chunk is (channels x new samples)
+        num_samples = chunk.shape[1]
+        if num_samples == 0:
+            return
+        self.raw.append(chunk)
+        self.total += num_samples
+
+        # Samples enter the first level as blocks whose min and max are the sample itself
+        items = np.concatenate((chunk, chunk), axis=0)
+        c = self.num_channels
+        for i, level in enumerate(self.levels):
+            items = np.concatenate((self.pending[i], items), axis=1)
+            num_blocks = items.shape[1] // self.factor
+            self.pending[i] = items[:, num_blocks * self.factor:]
+            if num_blocks == 0:
+                break
+            blocks = items[:, :num_blocks * self.factor].reshape(2 * c, num_blocks, self.factor)
+            items = np.concatenate((blocks[:c].min(axis=2), blocks[c:].max(axis=2)), axis=0)
+            level.append(items)
+
+    def level_for(self, max_points):
+        # Index of the finest level with at most max_points blocks in the window, -1 for raw
+        window = len(self.raw)
+        if window <= max_points:
+            return -1
+        for i, block_size in enumerate(self.block_sizes):
+            if window / block_size <= max_points:
+                return i
+        return len(self.levels) - 1
+
+    def get(self, max_points):
+        # Returns (x in seconds, y as channels x points) for a plot max_points pixels wide
+        window = len(self.raw)
+        level_index = self.level_for(max_points)
+        if level_index < 0:
+            x = (np.arange(self.total - window, self.total)) / self.sampling_rate
+            return x, self.raw.get()
+
+        block_size = self.block_sizes[level_index]
+        level = self.levels[level_index]
+        complete = self.total // block_size
+        first = max(0, (self.total - window) // block_size)
+        blocks = level.get(complete - first)
+        c = self.num_channels
+
+        # Samples after the last complete block are reduced straight from the raw data
+        tail = self.total - complete * block_size
+        num_points = blocks.shape[1] + (1 if tail > 0 else 0)
+        y = np.empty((c, 2 * num_points))
+        y[:, 0:2 * blocks.shape[1]:2] = blocks[:c]
+        y[:, 1:2 * blocks.shape[1]:2] = blocks[c:]
+        centers = (np.arange(complete - blocks.shape[1], complete) + 0.5) * block_size
+        if tail > 0:
+            recent = self.raw.get(tail)
+            y[:, -2] = recent.min(axis=1)
+            y[:, -1] = recent.max(axis=1)
+            centers = np.append(centers, complete * block_size + tail / 2.0)
+        x = np.repeat(centers, 2) / self.sampling_rate
+        return x, y
@@ -0,0 +1,217 @@
+import os
+import time
+import argparse
+import tempfile
+import functools
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from brainflow.board_shim import BoardShim, BoardIds
+
+import mne
+from mne.io import BaseRaw
+
+from dataset_catalog import DatasetCatalog, DEFAULT_DIRECTORY
+from recording import open_recording, EXTENSION
+from streaming_spectrogram import open_source
+
+# Recordings as MNE Raw objects without loading them.
+#
+# RecordingRaw opens a .bfrec recording, a DataFilter CSV or an OpenBCI GUI .txt
+# export (through open_source, so text files go through the text_loader parse cache
+# and everything ends up as a memmap) with preload=False. MNE asks for the samples it
+# needs through _read_segment_file, which reads only those columns of the EXG rows.
+# Channels keep the board units (uV) and carry a 1e-6 calibration, so MNE sees volts
+# and a FIF file keeps the uV values. Nothing is scaled or copied up front, which
+# RawArray on get_board_data() output does.
+#
+# Channel names are the board's EEG names where it has them (get_eeg_names) and EMG1,
+# EMG2, ... otherwise. Rows in get_emg_channels are typed 'emg' and the rest 'eeg'.
+# export_fif writes a Raw in buffers of chunk_seconds, and main() converts the whole
+# archive in a process pool.
+#
+# BaseRaw subclasses rely on private MNE API (_read_segment_file, _raw_extras, the
+# cals / mult arguments), checked against mne 1.10.1: check_recording() compares
+# get_data() (whole, sliced and picked) and a FIF round trip with a RawArray of the
+# same samples, and main() --check runs it over the archive.
+
+UNIT_SCALE = 1e-6 # BrainFlow EXG rows are uV, MNE works in V
+FIF_SUFFIX = '_raw.fif'
+CHUNK_SECONDS = 10.0
+
+
+def channel_info(board_id, rows, ch_type=None):
+    # (names, types) of some board rows
+    try:
+        eeg_names = dict(zip(BoardShim.get_eeg_channels(board_id), BoardShim.get_eeg_names(board_id)))
+    except Exception:
+        eeg_names = dict()
+    try:
+        emg_channels = set(BoardShim.get_emg_channels(board_id))
+    except Exception:
+        emg_channels = set()
+    types = [ch_type or ('emg' if row in emg_channels else 'eeg') for row in rows]
+    names = [eeg_names.get(row, '%s%d' % (kind.upper(), i + 1)) for i, (row, kind) in enumerate(zip(rows, types))]
+    return names, types
+
+
+def create_info(board_id, rows, sampling_rate, ch_type=None):
+    names, types = channel_info(board_id, rows, ch_type)
+    info = mne.create_info(ch_names=names, sfreq=sampling_rate, ch_types=types)
+    for channel in info['chs']:
+        channel['cal'] = UNIT_SCALE
+    return info
+
+
+@functools.lru_cache(maxsize=8)
+def _open(path, board_id, rows, size, mtime):
+    # MNE reads a Raw one buffer at a time, the source is opened once per process
+    # and file version (size and mtime, a rewritten file is opened again)
+    return open_source(path, board_id, list(rows))
+
+
+def open_cached(path, board_id, rows):
+    stat = os.stat(path)
+    return _open(path, board_id, rows, stat.st_size, stat.st_mtime)
+
+
+class RecordingRaw(BaseRaw):
+    def __init__(self, path, board_id=None, rows=None, ch_type=None, verbose=None):
+        if path.endswith(EXTENSION):
+            board_id = open_recording(path).board_id
+        elif board_id is None:
+            board_id = BoardIds.GANGLION_BOARD.value
+        read, num_samples, rows, sampling_rate = open_source(path, board_id, rows)
+        if num_samples == 0:
+            raise ValueError('%s has no samples' % path)
+        rows = tuple(rows)
+
+        info = create_info(board_id, rows, sampling_rate, ch_type)
+        extras = {'path': path, 'board_id': board_id, 'rows': rows}
+        super().__init__(info, preload=False, first_samps=[0], last_samps=[num_samples - 1], filenames=[path],
+                         raw_extras=[extras], orig_format='double', verbose=verbose)
+
+        timestamp_channel = BoardShim.get_timestamp_channel(board_id)
+        read, _, _, _ = open_source(path, board_id, [timestamp_channel])
+        start_timestamp = float(read(0, 1)[0, 0])
+        if start_timestamp > 0:
+            self.set_meas_date(start_timestamp)
+
+    def _read_segment_file(self, data, idx, fi, start, stop, cals, mult):
+        # Samples [start, stop) of every row, in uV; calibration (and projection) as
+        # mne.io.utils._mult_cal_one does
+        extras = self._raw_extras[fi]
+        read, _, _, _ = open_cached(extras['path'], extras['board_id'], extras['rows'])
+        block = read(start, stop)
+        if mult is not None:
+            data[:] = mult @ block
+        else:
+            data[:] = block[idx] * cals
+
+
+def read_raw_recording(path, board_id=None, rows=None, ch_type=None, verbose=None):
+    return RecordingRaw(path, board_id, rows, ch_type, verbose)
+
+
+def export_fif(path, out_path=None, board_id=None, chunk_seconds=CHUNK_SECONDS, overwrite=True):
+    # Writes the recording to a FIF file chunk_seconds of signal at a time. Samples are
+    # stored as float32 uV, as in a .bfrec recording.
+    if out_path is None:
+        out_path = os.path.splitext(path)[0] + FIF_SUFFIX
+    raw = RecordingRaw(path, board_id, verbose='error')
+    raw.save(out_path, buffer_size_sec=chunk_seconds, fmt='single', overwrite=overwrite, verbose='error')
+    return out_path, raw.n_times
+
+
+def check_recording(path, board_id=None, rows=None):
+    # Largest absolute difference (V) of RecordingRaw from a RawArray of the same
+    # samples: whole get_data(), a slice of picked channels and a FIF round trip
+    raw = RecordingRaw(path, board_id, rows, verbose='error')
+    read, num_samples, rows, _ = open_source(path, raw._raw_extras[0]['board_id'], rows)
+    array = mne.io.RawArray(read(0, num_samples) * UNIT_SCALE, raw.info.copy(), verbose='error')
+    picks = list(range(0, len(rows), 2))
+    start, stop = num_samples // 3, num_samples // 3 + min(num_samples // 2, 1000)
+    errors = [np.max(np.abs(raw.get_data() - array.get_data())),
+              np.max(np.abs(raw.get_data(picks, start, stop) - array.get_data(picks, start, stop)))]
+    with tempfile.TemporaryDirectory() as directory:
+        out_path, _ = export_fif(path, os.path.join(directory, 'check' + FIF_SUFFIX), board_id)
+        saved = mne.io.read_raw_fif(out_path, preload=True, verbose='error')
+        # stored as float32 uV
+        errors.append(np.max(np.abs(saved.get_data() - array.get_data()) / np.maximum(np.abs(array.get_data()), UNIT_SCALE)))
+    return errors
+
+
+catalog = None
+
+
+def init_worker(directory):
+    global catalog
+    catalog = DatasetCatalog(directory)
+    BoardShim.disable_board_logger()
+
+
+def export_entry(entry, output_directory, chunk_seconds):
+    start = time.perf_counter()
+    out_path = os.path.join(output_directory, entry.name + FIF_SUFFIX)
+    out_path, num_samples = export_fif(catalog.source(entry), out_path, catalog.board_id, chunk_seconds)
+    return entry.name, num_samples, out_path, time.perf_counter() - start
+
+
+def check_entry(entry):
+    return (entry.name,) + tuple(check_recording(catalog.source(entry), catalog.board_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='export recordings to MNE FIF files')
+    parser.add_argument('files', nargs='*', help='.bfrec, DataFilter CSV or OpenBCI GUI .txt recordings, '
+                                                 'defaults to the archive')
+    parser.add_argument('--directory', type=str, help='recordings archive', required=False, default=DEFAULT_DIRECTORY)
+    parser.add_argument('--board-id', type=int, help='board the text recordings come from', required=False,
+                        default=BoardIds.GANGLION_BOARD.value)
+    parser.add_argument('--output-directory', type=str, help='FIF files go here; next to each file, or in fif/ of the archive, if empty',
+                        required=False, default='')
+    parser.add_argument('--chunk-seconds', type=float, help='seconds of signal written at a time', required=False,
+                        default=CHUNK_SECONDS)
+    parser.add_argument('--check', action='store_true', help='compare each recording with a RawArray instead of exporting')
+    parser.add_argument('--workers', type=int, help='worker processes, all cores if not set', required=False, default=None)
+    args = parser.parse_args()
+
+    BoardShim.disable_board_logger()
+    if args.output_directory:
+        os.makedirs(args.output_directory, exist_ok=True)
+    start = time.perf_counter()
+    if args.check:
+        print('mne %s' % mne.__version__)
+        print('%-22s %12s %12s %12s' % ('name', 'get_data', 'slice', 'fif (rel)'))
+        if args.files:
+            results = [(path,) + tuple(check_recording(path, args.board_id)) for path in args.files]
+        else:
+            entries = DatasetCatalog(args.directory).entries
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                     initargs=(args.directory,)) as pool:
+                results = list(pool.map(check_entry, entries))
+        for name, whole, part, fif in results:
+            print('%-22s %12.1e %12.1e %12.1e' % (name, whole, part, fif))
+        return
+    if args.files:
+        for path in args.files:
+            out_path = None
+            if args.output_directory:
+                out_path = os.path.join(args.output_directory, os.path.splitext(os.path.basename(path))[0] + FIF_SUFFIX)
+            out_path, num_samples = export_fif(path, out_path, args.board_id, args.chunk_seconds)
+            print('%s -> %s (%d samples)' % (path, out_path, num_samples))
+        return
+
+    entries = DatasetCatalog(args.directory).entries
+    output_directory = args.output_directory or os.path.join(args.directory, 'fif')
+    os.makedirs(output_directory, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.directory,)) as pool:
+        results = list(pool.map(export_entry, entries, [output_directory] * len(entries),
+                                [args.chunk_seconds] * len(entries)))
+    for name, num_samples, out_path, elapsed in results:
+        print('%-22s %8d samples %8.1f ms -> %s' % (name, num_samples, elapsed * 1000, out_path))
+    print('\n%d recordings in %.2f s' % (len(results), time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
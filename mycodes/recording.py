@@ -0,0 +1,221 @@
+import os
+import json
+import glob
+import time
+import struct
+import argparse
+import numpy as np
+
+from brainflow.board_shim import BoardShim, BoardIds
+from brainflow.data_filter import DataFilter
+
+# Compact binary recordings, an alternative to DataFilter.write_file CSVs.
+#
+# File layout:
+#   8 bytes   magic 'BFREC001'
+#   4 bytes   little endian length of the JSON header
+#   JSON      board id, sampling rate, channel map, start timestamp, ...
+#   padding   up to a multiple of 64 bytes
+#   records   one packed record per sample, one field per stored board row
+#
+# Only the rows that carry data are stored (the Ganglion leaves most of the 15
+# rows at zero). Live EXG rows are float32, converted CSV rows are float32 when that
+# is exact at the CSV precision, and the timestamp row always stays float64. The file
+# is append only, the sample count comes from the file size, so a recording cut short
+# by a crash is still readable. Readers get zero-copy np.memmap column views.
+
+MAGIC = b'BFREC001'
+EXTENSION = '.bfrec'
+ALIGNMENT = 64
+CSV_DECIMALS = 6  # DataFilter.write_file precision
+
+
+def record_dtype(channels):
+    return np.dtype([('ch%d' % channel['row'], channel['dtype']) for channel in channels])
+
+
+def board_channels(board_id, dtype='<f4'):
+    # Rows worth keeping for a live board: package counter, EXG, accel, markers and timestamp
+    rows = [BoardShim.get_package_num_channel(board_id)]
+    for getter in (BoardShim.get_exg_channels, BoardShim.get_accel_channels):
+        try:
+            rows += getter(board_id)
+        except Exception:
+            pass
+    try:
+        rows.append(BoardShim.get_marker_channel(board_id))
+    except Exception:
+        pass
+    timestamp_channel = BoardShim.get_timestamp_channel(board_id)
+    channels = [{'row': row, 'dtype': dtype} for row in sorted(set(rows)) if row != timestamp_channel]
+    channels.append({'row': timestamp_channel, 'dtype': '<f8'})
+    return channels, timestamp_channel
+
+
+class RecordingWriter:
+    def __init__(self, path, board_id, sampling_rate=None, channels=None, timestamp_channel=None,
+                 num_rows=None, start_timestamp=None, decimals=None):
+        if channels is None:
+            channels, timestamp_channel = board_channels(board_id)
+        self.path = path
+        self.header = {
+            'version': 1,
+            'board_id': int(board_id),
+            'sampling_rate': int(sampling_rate if sampling_rate is not None else BoardShim.get_sampling_rate(board_id)),
+            'num_rows': int(num_rows if num_rows is not None else BoardShim.get_num_rows(board_id)),
+            'timestamp_channel': timestamp_channel,
+            'start_timestamp': start_timestamp,
+            'channels': channels,
+            'decimals': decimals,
+        }
+        self.dtype = record_dtype(channels)
+        self.rows = [channel['row'] for channel in channels]
+        self.file = open(path, 'wb')
+        self.num_samples = 0
+        self.header_written = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_header(self):
+        if self.header['start_timestamp'] is None:
+            self.header['start_timestamp'] = time.time()
+        payload = json.dumps(self.header).encode('utf-8')
+        size = len(MAGIC) + 4 + len(payload)
+        padding = (-size) % ALIGNMENT
+        self.file.write(MAGIC + struct.pack('<I', len(payload) + padding) + payload + b' ' * padding)
+        self.header_written = True
+
+    def append(self, data):
+        # data is a BrainFlow (rows x samples) array, as returned by get_board_data()
+        num_samples = data.shape[1]
+        if num_samples == 0:
+            return
+        if not self.header_written:
+            if self.header['start_timestamp'] is None and self.header['timestamp_channel'] is not None:
+                self.header['start_timestamp'] = float(data[self.header['timestamp_channel'], 0])
+            self._write_header()
+        records = np.empty(num_samples, dtype=self.dtype)
+        for name, row in zip(self.dtype.names, self.rows):
+            records[name] = data[row]
+        self.file.write(records.tobytes())
+        self.file.flush()
+        self.num_samples += num_samples
+
+    def close(self):
+        if self.file is None:
+            return
+        if not self.header_written:
+            self._write_header()
+        self.file.close()
+        self.file = None
+
+
+class Recording:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('%s is not a %s recording' % (path, EXTENSION))
+            header_size = struct.unpack('<I', f.read(4))[0]
+            self.header = json.loads(f.read(header_size).decode('utf-8'))
+        self.board_id = self.header['board_id']
+        self.sampling_rate = self.header['sampling_rate']
+        self.num_rows = self.header['num_rows']
+        self.timestamp_channel = self.header['timestamp_channel']
+        self.start_timestamp = self.header['start_timestamp']
+        self.channels = self.header['channels']
+        self.decimals = self.header.get('decimals')
+        self.rows = [channel['row'] for channel in self.channels]
+        self.dtype = record_dtype(self.channels)
+
+        offset = len(MAGIC) + 4 + header_size
+        # A trailing partial record (crash while writing) is ignored
+        num_samples = (os.path.getsize(path) - offset) // self.dtype.itemsize
+        if num_samples > 0:
+            self.records = np.memmap(path, dtype=self.dtype, mode='r', offset=offset, shape=(num_samples,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def duration(self):
+        return len(self) / self.sampling_rate
+
+    def channel(self, row):
+        # Zero-copy (strided) view of one board row, zeros if the row was not stored
+        if row not in self.rows:
+            return np.zeros(len(self))
+        return self.records['ch%d' % row]
+
+    @property
+    def timestamps(self):
+        return self.channel(self.timestamp_channel)
+
+    def to_board_data(self, start=0, stop=None):
+        # Full BrainFlow layout, same as DataFilter.read_file returns
+        records = self.records[start:stop]
+        data = np.zeros((self.num_rows, len(records)))
+        for name, row in zip(self.dtype.names, self.rows):
+            data[row] = records[name]
+            if self.decimals is not None and records.dtype[name] == np.float32:
+                # Converted CSVs come back exactly as DataFilter.read_file parses them
+                data[row] = np.round(data[row], self.decimals)
+        return data
+
+
+def open_recording(path):
+    return Recording(path)
+
+
+def _fits_float32(values, decimals=CSV_DECIMALS):
+    # True if float32 gives back exactly what the CSV had at its printed precision
+    restored = values.astype(np.float32).astype(np.float64)
+    return np.array_equal(np.round(restored, decimals), values)
+
+
+def convert_csv(csv_path, out_path=None, board_id=BoardIds.GANGLION_BOARD.value):
+    # Lossless CSV -> binary conversion. All-zero rows are dropped (they come back
+    # as zeros) and a row is stored as float32 only if that is exact at the CSV
+    # precision, otherwise float64.
+    if out_path is None:
+        out_path = os.path.splitext(csv_path)[0] + EXTENSION
+    data = DataFilter.read_file(csv_path)
+    timestamp_channel = BoardShim.get_timestamp_channel(board_id)
+    channels = list()
+    for row in range(data.shape[0]):
+        if row == timestamp_channel:
+            channels.append({'row': row, 'dtype': '<f8'})
+        elif np.any(data[row] != 0):
+            channels.append({'row': row, 'dtype': '<f4' if _fits_float32(data[row]) else '<f8'})
+    start_timestamp = float(data[timestamp_channel, 0]) if data.shape[1] > 0 else None
+    with RecordingWriter(out_path, board_id, channels=channels, timestamp_channel=timestamp_channel,
+                         num_rows=data.shape[0], start_timestamp=start_timestamp, decimals=CSV_DECIMALS) as writer:
+        writer.append(data)
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='convert DataFilter CSV recordings to %s files' % EXTENSION)
+    parser.add_argument('files', nargs='*', help='CSV files, defaults to the official-tests archive')
+    parser.add_argument('--out-dir', type=str, help='output directory, next to each CSV if empty', default='')
+    parser.add_argument('--board-id', type=int, help='board the recordings come from', default=BoardIds.GANGLION_BOARD.value)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'official-tests', '*.csv')))
+    for csv_path in files:
+        out_path = None
+        if args.out_dir:
+            os.makedirs(args.out_dir, exist_ok=True)
+            out_path = os.path.join(args.out_dir, os.path.splitext(os.path.basename(csv_path))[0] + EXTENSION)
+        out_path = convert_csv(csv_path, out_path, args.board_id)
+        print('%s -> %s (%d -> %d bytes)' % (csv_path, out_path, os.path.getsize(csv_path), os.path.getsize(out_path)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class RingBuffer:
+    # Fixed size (channels x capacity) buffer that keeps the newest samples.
+    # Every sample is stored twice, at i and i + capacity, so the current window
+    # is always one contiguous slice and get() never has to copy.
+
+    def __init__(self, num_channels, capacity, dtype=np.float64):
+        self.capacity = capacity
+        self.data = np.zeros((num_channels, 2 * capacity), dtype=dtype)
+        self.pos = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, chunk):
+        num_samples = chunk.shape[1]
+        if num_samples == 0:
+            return
+        if num_samples > self.capacity:
+            chunk = chunk[:, -self.capacity:]
+            num_samples = self.capacity
+        first = min(num_samples, self.capacity - self.pos)
+        for offset in (0, self.capacity):
+            self.data[:, offset + self.pos:offset + self.pos + first] = chunk[:, :first]
+            if first < num_samples:
+                self.data[:, offset:offset + num_samples - first] = chunk[:, first:]
+        self.pos = (self.pos + num_samples) % self.capacity
+        self.count = min(self.count + num_samples, self.capacity)
+
+    def get(self, num_samples=None):
+        # Oldest to newest view of the last num_samples samples
+        num_samples = self.count if num_samples is None else min(num_samples, self.count)
+        start = (self.pos - num_samples) % self.capacity
+        return self.data[:, start:start + num_samples]
+
+    def clear(self):
+        self.pos = 0
+        self.count = 0
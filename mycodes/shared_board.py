@@ -0,0 +1,368 @@
+import os
+import time
+import argparse
+import logging
+import numpy as np
+
+from multiprocessing import shared_memory, resource_tracker
+from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
+from recording import RecordingWriter
+from integrity_monitor import IntegrityMonitor, board_layout
+
+# Single-writer / many-reader ring buffer living in shared memory.
+#
+# Layout: a small int64 header followed by a (num_rows x capacity) float64 block.
+# Each row is one BrainFlow channel, so a channel slice of the ring is contiguous.
+# The writer first raises the reserve counter to the count it is about to reach,
+# copies the samples in and only then raises the write counter to match, so a
+# reader never sees half written samples and no lock is needed. Samples older than
+# reserve count - capacity may be overwritten at any time: a reader copies first and
+# checks the reserve counter afterwards (as a seqlock does), dropping what the writer
+# lapped during the copy. Zero-copy views are valid only until the writer laps them.
+# The header keeps the daemon's pid, so a block left behind by a killed daemon is
+# recognised and replaced on the next start.
+
+DEFAULT_NAME = 'mind_control_board'
+DEFAULT_CAPACITY = 45000
+
+MAGIC = 0x4D494E44  # 'MIND'
+HEADER_FIELDS = 16
+H_MAGIC = 0
+H_NUM_ROWS = 1
+H_CAPACITY = 2
+H_WRITE_COUNT = 3
+H_BOARD_ID = 4
+H_SAMPLING_RATE = 5
+H_RUNNING = 6
+H_RESERVE_COUNT = 7
+H_OWNER_PID = 8
+HEADER_BYTES = HEADER_FIELDS * 8
+
+
+def _attach_shared_memory(name):
+    # Readers must not unlink the block when they exit, only the daemon owns it
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class SharedRingBuffer:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        if self.header[H_MAGIC] != MAGIC:
+            raise ValueError('shared memory block %s is not a board ring buffer' % shm.name)
+        self.num_rows = int(self.header[H_NUM_ROWS])
+        self.capacity = int(self.header[H_CAPACITY])
+        self.data = np.ndarray((self.num_rows, self.capacity), dtype=np.float64,
+                               buffer=shm.buf, offset=HEADER_BYTES)
+
+    @classmethod
+    def create(cls, name, num_rows, capacity, board_id, sampling_rate):
+        size = HEADER_BYTES + num_rows * capacity * 8
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            cls.remove_stale(name)
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[H_NUM_ROWS] = num_rows
+        header[H_CAPACITY] = capacity
+        header[H_BOARD_ID] = board_id
+        header[H_SAMPLING_RATE] = sampling_rate
+        header[H_RUNNING] = 1
+        header[H_OWNER_PID] = os.getpid()
+        header[H_MAGIC] = MAGIC
+        return cls(shm, owner=True)
+
+    @staticmethod
+    def remove_stale(name):
+        # A daemon that was killed (SIGKILL, a crash inside BrainFlow) leaves its block
+        # behind; it is removed only if it is a ring buffer whose daemon is gone
+        try:
+            ring = SharedRingBuffer.attach(name)
+        except (ValueError, TypeError):
+            raise FileExistsError('shared memory block %s exists and is not a board ring buffer, '
+                                  'remove /dev/shm/%s or use another --name' % (name, name)) from None
+        running = ring.running and ring.owner_alive()
+        ring.close()
+        if running:
+            raise FileExistsError('shared memory block %s is in use by a running daemon; if that daemon was '
+                                  'killed, remove /dev/shm/%s' % (name, name))
+        logging.warning('Removing stale shared memory block %s', name)
+        shm = shared_memory.SharedMemory(name=name)
+        shm.close()
+        shm.unlink()
+
+    @classmethod
+    def attach(cls, name):
+        return cls(_attach_shared_memory(name), owner=False)
+
+    @property
+    def write_count(self):
+        return int(self.header[H_WRITE_COUNT])
+
+    @property
+    def reserve_count(self):
+        return int(self.header[H_RESERVE_COUNT])
+
+    def oldest(self):
+        # First absolute sample position the writer has not started overwriting
+        return max(0, self.reserve_count - self.capacity)
+
+    @property
+    def board_id(self):
+        return int(self.header[H_BOARD_ID])
+
+    @property
+    def sampling_rate(self):
+        return int(self.header[H_SAMPLING_RATE])
+
+    @property
+    def running(self):
+        return bool(self.header[H_RUNNING])
+
+    def owner_alive(self):
+        # A killed daemon never clears running, its process is gone though
+        try:
+            os.kill(int(self.header[H_OWNER_PID]), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def write(self, chunk):
+        num_samples = chunk.shape[1]
+        if num_samples == 0:
+            return
+        write_count = self.write_count + num_samples
+        self.header[H_RESERVE_COUNT] = write_count
+        # Only the newest capacity samples can survive anyway
+        if num_samples > self.capacity:
+            chunk = chunk[:, -self.capacity:]
+        kept = chunk.shape[1]
+        start = (write_count - kept) % self.capacity
+        first = min(kept, self.capacity - start)
+        self.data[:, start:start + first] = chunk[:, :first]
+        if first < kept:
+            self.data[:, :kept - first] = chunk[:, first:]
+        # Publish only after the samples are in place
+        self.header[H_WRITE_COUNT] = write_count
+
+    def view(self, start, stop):
+        # Read only window over absolute sample positions [start, stop).
+        # Zero-copy when it does not wrap around the end of the ring.
+        begin = start % self.capacity
+        end = begin + (stop - start)
+        if end <= self.capacity:
+            window = self.data[:, begin:end]
+        else:
+            window = np.concatenate((self.data[:, begin:], self.data[:, :end - self.capacity]), axis=1)
+        window.flags.writeable = False
+        return window
+
+    def stop(self):
+        self.header[H_RUNNING] = 0
+
+    def close(self):
+        # Drop our numpy views first, SharedMemory refuses to close while exported
+        self.header = None
+        self.data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingReader:
+    def __init__(self, ring, from_start=False):
+        self.ring = ring
+        self.cursor = max(0, ring.write_count - ring.capacity) if from_start else ring.write_count
+        self.lost_samples = 0
+
+    def available(self):
+        return min(self.ring.write_count - self.cursor, self.ring.capacity)
+
+    def read(self, max_samples=None, copy=False):
+        # Returns the samples written since the last call. Without copy it is a read
+        # only view of the ring, valid only until the writer laps it; with copy, the
+        # samples the writer overwrote while they were copied are dropped from the
+        # front and counted in lost_samples.
+        write_count = self.ring.write_count
+        oldest = self.ring.oldest()
+        if self.cursor < oldest:
+            # The writer lapped us, skip what was overwritten
+            self.lost_samples += oldest - self.cursor
+            self.cursor = oldest
+        start = self.cursor
+        # A write larger than the ring can reserve past what is published yet
+        stop = max(start, write_count if max_samples is None else min(write_count, start + max_samples))
+        window = self.ring.view(start, stop)
+        self.cursor = stop
+        if copy:
+            window = np.array(window)
+            dropped = min(max(self.ring.oldest() - start, 0), window.shape[1])
+            self.lost_samples += dropped
+            window = window[:, dropped:]
+        return window
+
+    def latest(self, num_samples, copy=False):
+        # Newest num_samples samples; a view or a checked copy as in read()
+        write_count = self.ring.write_count
+        start = min(max(write_count - num_samples, self.ring.oldest()), write_count)
+        window = self.ring.view(start, write_count)
+        if copy:
+            window = np.array(window)
+            window = window[:, min(max(self.ring.oldest() - start, 0), window.shape[1]):]
+        return window
+
+    def wait(self, num_samples, timeout=None, poll_interval=0.005):
+        # Sleep until at least num_samples new samples are available
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.available() < num_samples:
+            if not self.ring.running:
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+        return True
+
+
+class SharedBoard:
+    # Drop-in replacement for the parts of BoardShim the scripts use, reading from
+    # the acquisition daemon instead of opening a session of its own.
+    # Data is copied out because callers filter it in place with DataFilter.
+
+    def __init__(self, name=DEFAULT_NAME):
+        self.name = name
+        self.ring = SharedRingBuffer.attach(name)
+        self.reader = RingReader(self.ring)
+
+    def get_board_id(self):
+        return self.ring.board_id
+
+    def prepare_session(self):
+        pass
+
+    def start_stream(self, *args, **kwargs):
+        self.reader.cursor = self.ring.write_count
+
+    def stop_stream(self):
+        pass
+
+    def release_session(self):
+        if self.ring is not None:
+            self.reader = None
+            self.ring.close()
+            self.ring = None
+
+    def is_prepared(self):
+        return self.ring is not None
+
+    def get_board_data_count(self):
+        return self.reader.available()
+
+    def get_board_data(self, num_samples=None):
+        return self.reader.read(num_samples, copy=True)
+
+    def get_current_board_data(self, num_samples):
+        return self.reader.latest(num_samples, copy=True)
+
+
+def run_daemon(board, ring, poll_interval=0.01, recorder=None, monitor=None):
+    logging.info('Publishing board %d to shared memory %s', ring.board_id, ring.shm.name)
+    try:
+        while True:
+            data = board.get_board_data()
+            if data.shape[1] > 0:
+                ring.write(data)
+                if recorder is not None:
+                    recorder.append(data)
+                if monitor is not None:
+                    lost = monitor.update(data)
+                    if lost:
+                        logging.warning('Lost %d packets (%.3f%% so far)', lost, monitor.stats().loss_rate * 100)
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.stop()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser ()
+
+    # use docs to check which parameters are required for specific board, e.g. for Cyton - set serial port
+    parser.add_argument ('--timeout', type = int, help  = 'timeout for device discovery or connection', required = False, default = 0)
+    parser.add_argument ('--ip-port', type = int, help  = 'ip port', required = False, default = 0)
+    parser.add_argument ('--ip-protocol', type = int, help  = 'ip protocol, check IpProtocolType enum', required = False, default = 0)
+    parser.add_argument ('--ip-address', type = str, help  = 'ip address', required = False, default = '')
+    parser.add_argument ('--serial-port', type = str, help  = 'serial port', required = False, default = '/dev/cu.usbmodem11')
+    parser.add_argument ('--mac-address', type = str, help  = 'mac address', required = False, default = '')
+    parser.add_argument ('--other-info', type = str, help  = 'other info', required = False, default = '')
+    parser.add_argument ('--streamer-params', type = str, help  = 'streamer params', required = False, default = '')
+    parser.add_argument ('--serial-number', type = str, help  = 'serial number', required = False, default = '')
+    parser.add_argument ('--board-id', type = int, help  = 'board id, check docs to get a list of supported boards', required = False, default = BoardIds.GANGLION_BOARD.value)
+    parser.add_argument ('--file', type=str, help='file', required=False, default='')
+    parser.add_argument ('--master-board', type=int, help='master board id for streaming and playback boards', required=False, default=BoardIds.NO_BOARD.value)
+    parser.add_argument ('--log', action = 'store_true')
+    parser.add_argument ('--name', type = str, help = 'shared memory name readers attach to', required = False, default = DEFAULT_NAME)
+    parser.add_argument ('--capacity', type = int, help = 'ring buffer size in samples', required = False, default = DEFAULT_CAPACITY)
+    parser.add_argument ('--poll-ms', type = int, help = 'board polling period in ms', required = False, default = 10)
+    parser.add_argument ('--record', type = str, help = 'also append everything to this .bfrec file', required = False, default = '')
+    args = parser.parse_args ()
+
+    params = BrainFlowInputParams ()
+    params.ip_port = args.ip_port
+    params.serial_port = args.serial_port
+    params.mac_address = args.mac_address
+    params.other_info = args.other_info
+    params.serial_number = args.serial_number
+    params.ip_address = args.ip_address
+    params.ip_protocol = args.ip_protocol
+    params.timeout = args.timeout
+    params.file = args.file
+    params.master_board = args.master_board
+
+    if (args.log):
+        BoardShim.enable_dev_board_logger()
+    else:
+        BoardShim.disable_board_logger()
+
+    # Playback boards describe the data of their master board
+    data_board_id = args.master_board if args.master_board != BoardIds.NO_BOARD.value else args.board_id
+
+    board = BoardShim(args.board_id, params)
+    ring = None
+    recorder = None
+    try:
+        board.prepare_session()
+        board.start_stream(args.capacity, args.streamer_params)
+        ring = SharedRingBuffer.create(args.name, BoardShim.get_num_rows(data_board_id), args.capacity,
+                                       data_board_id, BoardShim.get_sampling_rate(data_board_id))
+        if args.record:
+            recorder = RecordingWriter(args.record, data_board_id)
+        monitor = IntegrityMonitor(BoardShim.get_sampling_rate(data_board_id),
+                                   BoardShim.get_package_num_channel(data_board_id),
+                                   BoardShim.get_timestamp_channel(data_board_id), **board_layout(data_board_id))
+        run_daemon(board, ring, args.poll_ms / 1000.0, recorder, monitor)
+    finally:
+        logging.info('End')
+        if recorder is not None:
+            recorder.close()
+        if ring is not None:
+            ring.close()
+        if board.is_prepared():
+            logging.info('Releasing session')
+            board.release_session()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import os
+import re
+import time
+import argparse
+import threading
+import numpy as np
+
+from dataclasses import dataclass
+
+# PCA / FastICA spatial filters for the EXG channels.
+#
+# A model is fitted once on a calibration window (channels x samples) and saved to
+# disk as <subject>-<setup>-<method>.npz, so the next session with the same electrode
+# placement starts with it. Applying a model is one matrix multiply per chunk: the
+# unmixing (to sources) or, with excluded components, the combined
+# mixing[:, keep] @ unmixing[keep] back projection (artifact removal) is folded into a
+# single channels x channels matrix together with the mean when the model is built.
+#
+# FastICA is the symmetric, logcosh variant (same algorithm as sklearn's FastICA,
+# which is not a dependency here) written on whole matrices, so a fit over the 4
+# Ganglion channels takes a few milliseconds. SpatialFilter refits in a worker thread
+# and swaps the model reference when the fit is done; chunks keep going through the
+# previous model meanwhile. Components come out sorted by kurtosis (ICA) or variance
+# (PCA), which can change order between calibration windows, so a refit excludes the
+# new components whose mixing columns (their scalp patterns) best match the excluded
+# ones of the previous model, not the same indices.
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spatial_models')
+METHODS = ('pca', 'ica')
+
+
+def _whitening(data):
+    # Centered data, eigen decomposition of the covariance sorted by decreasing variance
+    mean = data.mean(axis=1)
+    centered = data - mean[:, None]
+    covariance = centered @ centered.T / centered.shape[1]
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    order = np.argsort(eigenvalues)[::-1]
+    eigenvalues = np.maximum(eigenvalues[order], np.finfo(np.float64).tiny)
+    return mean, centered, eigenvalues, eigenvectors[:, order]
+
+
+def _symmetric_decorrelation(w):
+    # W <- (W W^T)^(-1/2) W
+    eigenvalues, eigenvectors = np.linalg.eigh(w @ w.T)
+    eigenvalues = np.maximum(eigenvalues, np.finfo(np.float64).tiny)
+    return (eigenvectors / np.sqrt(eigenvalues)) @ eigenvectors.T @ w
+
+
+def fit_pca(data, num_components=None):
+    # Rows of the unmixing matrix are the principal axes, strongest first
+    data = np.asarray(data, dtype=np.float64)
+    mean, _, _, eigenvectors = _whitening(data)
+    num_components = num_components or data.shape[0]
+    unmixing = eigenvectors[:, :num_components].T
+    return mean, unmixing, unmixing.T.copy()
+
+
+def fit_ica(data, num_components=None, max_iter=200, tol=1e-4, seed=0):
+    data = np.asarray(data, dtype=np.float64)
+    mean, centered, eigenvalues, eigenvectors = _whitening(data)
+    num_components = num_components or data.shape[0]
+    num_samples = centered.shape[1]
+
+    # Whitened signals have identity covariance, ICA only has to find a rotation
+    whitening = (eigenvectors[:, :num_components] / np.sqrt(eigenvalues[:num_components])).T
+    white = whitening @ centered
+    w = _symmetric_decorrelation(np.random.default_rng(seed).standard_normal((num_components, num_components)))
+    for _ in range(max_iter):
+        # Fixed point update for every component at once, g = tanh (logcosh contrast)
+        g = np.tanh(w @ white)
+        g_derivative = (1.0 - g * g).mean(axis=1)
+        new_w = _symmetric_decorrelation(g @ white.T / num_samples - g_derivative[:, None] * w)
+        converged = np.max(np.abs(np.abs(np.einsum('ij,ij->i', new_w, w)) - 1.0)) < tol
+        w = new_w
+        if converged:
+            break
+
+    unmixing = w @ whitening
+    # Sources ordered by decreasing kurtosis, spiky artifacts (blinks, movement) come first
+    sources = unmixing @ centered
+    sources /= sources.std(axis=1, keepdims=True)
+    kurtosis = (sources ** 4).mean(axis=1) - 3.0
+    unmixing = unmixing[np.argsort(kurtosis)[::-1]]
+    return mean, unmixing, np.linalg.pinv(unmixing)
+
+
+@dataclass(frozen=True)
+class SpatialModel:
+    method: str
+    mean: np.ndarray
+    unmixing: np.ndarray
+    mixing: np.ndarray
+    exclude: tuple = ()
+
+    def matrix(self):
+        # Single matrix applied to centered chunks: sources, or channels without the excluded sources
+        if not self.exclude:
+            return self.unmixing
+        keep = [i for i in range(self.unmixing.shape[0]) if i not in self.exclude]
+        return self.mixing[:, keep] @ self.unmixing[keep]
+
+    def with_exclude(self, exclude):
+        return SpatialModel(self.method, self.mean, self.unmixing, self.mixing, tuple(sorted(set(exclude))))
+
+
+def match_components(previous, model, components):
+    # Indices of the model components closest to some components of the previous model,
+    # by the absolute cosine of their mixing columns (sign and scale are arbitrary).
+    # The best matches are assigned first, no component is picked twice.
+    old = previous.mixing[:, list(components)]
+    old = old / np.linalg.norm(old, axis=0)
+    new = model.mixing / np.linalg.norm(model.mixing, axis=0)
+    similarity = np.abs(old.T @ new)
+    matched = [None] * len(components)
+    for i in np.argsort(similarity.max(axis=1))[::-1]:
+        candidates = similarity[i].copy()
+        candidates[[j for j in matched if j is not None]] = -1.0
+        matched[i] = int(np.argmax(candidates))
+    return matched
+
+
+def fit(data, method='ica', num_components=None, exclude=()):
+    if method not in METHODS:
+        raise ValueError('unknown spatial filter method %s, expected one of %s' % (method, METHODS))
+    fitter = fit_ica if method == 'ica' else fit_pca
+    mean, unmixing, mixing = fitter(data, num_components)
+    return SpatialModel(method, mean, unmixing, mixing, tuple(exclude))
+
+
+def model_path(subject, setup, method, directory=DEFAULT_DIRECTORY):
+    # e.g. spatial_models/Justi-TA-ica.npz; anything unsafe in a file name becomes '_'
+    key = '-'.join(re.sub(r'[^A-Za-z0-9_.]+', '_', str(part)) for part in (subject, setup, method))
+    return os.path.join(directory, key + '.npz')
+
+
+def save_model(model, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Write then rename, a reader never finds a half written model
+    temporary = path + '.tmp.npz'
+    np.savez(temporary, method=model.method, mean=model.mean, unmixing=model.unmixing,
+             mixing=model.mixing, exclude=np.array(model.exclude, dtype=np.int64))
+    os.replace(temporary, path)
+
+
+def load_model(path):
+    with np.load(path) as saved:
+        return SpatialModel(str(saved['method']), saved['mean'], saved['unmixing'], saved['mixing'],
+                            tuple(int(i) for i in saved['exclude']))
+
+
+class SpatialFilter:
+    def __init__(self, model=None, method='ica', exclude=()):
+        self.method = method
+        self.exclude = tuple(exclude)
+        self.worker = None
+        self.fit_time = None
+        self.error = None
+        self._state = None
+        if model is not None:
+            self.set_model(model)
+
+    @property
+    def model(self):
+        return None if self._state is None else self._state[0]
+
+    @property
+    def ready(self):
+        return self._state is not None
+
+    def set_model(self, model):
+        # Matrix and offset are precomputed so process() is one matmul and one subtraction.
+        # The tuple is replaced in one assignment, so a concurrent process() sees the old
+        # or the new model, never a mix.
+        matrix = np.ascontiguousarray(model.matrix())
+        self._state = (model, matrix, (matrix @ model.mean)[:, None])
+
+    def process(self, chunk):
+        # chunk is (channels x samples); passes through until a model is available
+        state = self._state
+        if state is None:
+            return chunk
+        _, matrix, offset = state
+        out = matrix @ chunk
+        out -= offset
+        return out
+
+    def fit(self, data, num_components=None):
+        start = time.perf_counter()
+        model = fit(data, self.method, num_components)
+        previous = self.model
+        if previous is not None and previous.exclude and previous.method == model.method \
+                and previous.mixing.shape == model.mixing.shape:
+            # Same sources may come out in another order, follow them
+            model = model.with_exclude(match_components(previous, model, previous.exclude))
+        else:
+            model = model.with_exclude(self.exclude)
+        self.fit_time = time.perf_counter() - start
+        self.exclude = model.exclude
+        self.set_model(model)
+        return model
+
+    def fit_async(self, data, num_components=None, path=None):
+        # Refit on a copy of the calibration window in the background, optionally saving
+        # the new model. Returns False if the previous refit is still running.
+        if self.refitting:
+            return False
+        data = np.array(data, dtype=np.float64)
+
+        def work():
+            try:
+                model = self.fit(data, num_components)
+                if path is not None:
+                    save_model(model, path)
+                self.error = None
+            except (np.linalg.LinAlgError, OSError, ValueError) as e:
+                self.error = e
+
+        self.worker = threading.Thread(target=work, daemon=True)
+        self.worker.start()
+        return True
+
+    @property
+    def refitting(self):
+        return self.worker is not None and self.worker.is_alive()
+
+    def wait(self, timeout=None):
+        if self.worker is not None:
+            self.worker.join(timeout)
+
+    def load(self, path):
+        model = load_model(path)
+        self.method = model.method
+        self.exclude = model.exclude
+        self.set_model(model)
+        return model
+
+    def save(self, path):
+        save_model(self.model, path)
+
+
+def main():
+    # Fit on a calibration window of a recording and save the model for its subject / setup
+    from brainflow.board_shim import BoardShim, BoardIds
+    from dataset_catalog import DatasetCatalog
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('name', type=str, help='recording name in the catalog, e.g. Justi-TA-3.1')
+    parser.add_argument('--method', type=str, choices=METHODS, default='ica')
+    parser.add_argument('--setup', type=str, help='electrode setup, defaults to the muscle of the recording', default='')
+    parser.add_argument('--calibration-time', type=float, help='seconds of the recording used for the fit', default=10.0)
+    parser.add_argument('--exclude', type=int, nargs='*', help='components removed when applying', default=[])
+    parser.add_argument('--directory', type=str, help='model directory', default=DEFAULT_DIRECTORY)
+    args = parser.parse_args()
+
+    board_id = BoardIds.GANGLION_BOARD.value
+    channels = BoardShim.get_exg_channels(board_id)
+    sampling_rate = BoardShim.get_sampling_rate(board_id)
+    catalog = DatasetCatalog()
+    entry = catalog.get(args.name)
+    data = catalog.load(entry, copy=False)[channels]
+    calibration = data[:, :int(args.calibration_time * sampling_rate)]
+
+    spatial_filter = SpatialFilter(method=args.method, exclude=args.exclude)
+    model = spatial_filter.fit(calibration)
+    path = model_path(entry.subject, args.setup or entry.muscle, args.method, args.directory)
+    spatial_filter.save(path)
+    print('%s fitted on %d samples in %.2f ms, saved to %s' %
+          (args.method, calibration.shape[1], spatial_filter.fit_time * 1000, os.path.abspath(path)))
+    print('unmixing:\n%s' % np.array2string(model.unmixing, precision=4))
+
+    # Per chunk cost at the live plot rate (50 ms of samples)
+    chunk = np.ascontiguousarray(data[:, :max(1, sampling_rate // 20)])
+    repeats = 10000
+    start = time.perf_counter()
+    for _ in range(repeats):
+        spatial_filter.process(chunk)
+    print('apply: %.2f us per %d sample chunk' % ((time.perf_counter() - start) * 1e6 / repeats, chunk.shape[1]))
+
+
+if __name__ == "__main__":
+    main()
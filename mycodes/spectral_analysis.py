@@ -0,0 +1,107 @@
+import functools
+import numpy as np
+
+from dataclasses import dataclass
+from scipy import signal
+
+# Magnitude spectra and peak frequencies of several channels at once. All channels
+# go through one real FFT, frequency axes and windows are cached per (N, fs) and
+# (window, N), and the top-k peaks come from argpartition instead of sorting every
+# bin. compute_spectrum() is the math only; plot_spectrum() is an optional separate
+# step that imports matplotlib when it is first used, so headless batch runs never
+# pay for rendering.
+
+
+@functools.lru_cache(maxsize=32)
+def fft_frequencies(num_samples, sampling_rate):
+    freqs = np.fft.rfftfreq(num_samples, 1.0 / sampling_rate)
+    freqs.flags.writeable = False
+    return freqs
+
+
+@functools.lru_cache(maxsize=32)
+def fft_window(window, num_samples):
+    # window is anything scipy.signal.get_window takes, None for no window
+    if window is None:
+        values = np.ones(num_samples)
+    else:
+        values = signal.get_window(window, num_samples)
+    values.flags.writeable = False
+    return values
+
+
+def top_peaks(magnitude, num_peaks):
+    # Indices of the num_peaks largest values along the last axis, largest first
+    num_peaks = min(num_peaks, magnitude.shape[-1])
+    if num_peaks <= 0:
+        return np.zeros(magnitude.shape[:-1] + (0,), dtype=np.intp)
+    indices = np.argpartition(magnitude, -num_peaks, axis=-1)[..., -num_peaks:]
+    order = np.argsort(-np.take_along_axis(magnitude, indices, axis=-1), axis=-1)
+    return np.take_along_axis(indices, order, axis=-1)
+
+
+@dataclass(frozen=True)
+class Spectrum:
+    freqs: np.ndarray       # (freqs,)
+    magnitude: np.ndarray   # (channels x freqs), |rfft|
+    peak_freqs: np.ndarray  # (channels x num_peaks), strongest first
+    peak_mags: np.ndarray   # (channels x num_peaks)
+    channels: list
+    sampling_rate: int
+    num_samples: int
+
+
+def compute_spectrum(data, sampling_rate, channels=None, window=None, min_freq=0.0, max_freq=None, num_peaks=3):
+    # data is (rows x samples), or a single channel. Only min_freq < f < max_freq is
+    # kept, by default everything above DC.
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data[np.newaxis]
+        channels = [0] if channels is None else channels
+    elif channels is None:
+        channels = list(range(data.shape[0]))
+    else:
+        data = data[channels]
+    num_samples = data.shape[1]
+
+    freqs = fft_frequencies(num_samples, sampling_rate)
+    start = np.searchsorted(freqs, min_freq, side='right')
+    stop = len(freqs) if max_freq is None else np.searchsorted(freqs, max_freq, side='left')
+
+    magnitude = np.abs(np.fft.rfft(data * fft_window(window, num_samples), axis=1))[:, start:stop]
+    freqs = freqs[start:stop]
+    peaks = top_peaks(magnitude, num_peaks)
+    return Spectrum(freqs=freqs, magnitude=magnitude, peak_freqs=freqs[peaks],
+                    peak_mags=np.take_along_axis(magnitude, peaks, axis=1), channels=list(channels),
+                    sampling_rate=sampling_rate, num_samples=num_samples)
+
+
+def plot_spectrum(spectrum, index, max_freq=None, min_magnitude=None, annotate=True):
+    # One channel of a Spectrum, with its peaks marked; returns the figure
+    import matplotlib.pyplot as plt
+
+    peak_freqs = spectrum.peak_freqs[index]
+    peak_mags = spectrum.peak_mags[index]
+    if min_magnitude is not None:
+        strong = peak_mags > min_magnitude
+        peak_freqs, peak_mags = peak_freqs[strong], peak_mags[strong]
+
+    fig = plt.figure(figsize=(10, 5))
+    plt.plot(spectrum.freqs, spectrum.magnitude[index], linestyle='-', linewidth=1)
+    if len(peak_freqs) > 0:
+        plt.scatter(peak_freqs, peak_mags, marker='o')
+    plt.xlabel('Frequency (Hz)')
+    plt.ylabel('Amplitude (μV)')
+    if max_freq is None:
+        plt.xlim(0, auto=True)
+    else:
+        plt.xlim(0, max_freq)
+    plt.ylim(0, auto=True)
+    plt.title('FFT Channel %d Plot' % spectrum.channels[index])
+    plt.grid(True)
+
+    if annotate:
+        for f, mag in zip(peak_freqs, peak_mags):
+            plt.annotate(f'{f:.2f} Hz\n{mag:.2f} μV', xy=(f, mag), xytext=(f + 5, mag),
+                         arrowprops=dict(facecolor='black', arrowstyle='->'), bbox=dict(facecolor='white', alpha=0.5))
+    return fig
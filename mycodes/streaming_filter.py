@@ -0,0 +1,165 @@
+import functools
+import numpy as np
+from scipy import signal
+
+# Declarative preprocessing: a list of stages designed once per sampling rate and
+# applied to the whole (channels x samples) matrix. The same pipeline runs offline
+# (apply, zero-phase by default) or online (process, causal, keeps its state between
+# calls so a live plot only filters the samples that arrived since the last tick).
+#
+# A stage is a dict, e.g.
+#   {'type': 'bandpass', 'low': 3.0, 'high': 45.0, 'order': 2, 'filter': 'butterworth'}
+#   {'type': 'bandstop', 'low': 48.0, 'high': 52.0, 'order': 2}
+#   {'type': 'highpass', 'cutoff': 10.0, 'order': 4}
+#   {'type': 'rolling_mean', 'period': 2}
+#   {'type': 'environmental_noise', 'noise': 50}    50, 60 or 'both', as DataFilter.remove_environmental_noise
+#   {'type': 'detrend', 'detrend': 'constant'}      'constant' or 'linear'
+#
+# Consecutive IIR stages are cascaded into one SOS matrix. Designs are cached per
+# (stage, sampling rate), so building the same pipeline again costs nothing.
+# Online, a constant detrend removes an exponential mean with a time constant of
+# 'time_constant' seconds (a one pole DC blocker, cascaded with the other stages), so
+# it keeps tracking electrode drift. A linear detrend needs the whole signal and has
+# no online version: process() raises ValueError for it, apply() is fine.
+
+FILTER_DESIGNS = ('butterworth', 'bessel', 'chebyshev')
+NOISE_BANDS = {50: (48.0, 52.0), 60: (58.0, 62.0)}
+DETREND_TIME_CONSTANT = 1.0 # seconds
+
+
+def _stage_key(stage):
+    return tuple(sorted(stage.items()))
+
+
+def design_sos(stage, sampling_rate):
+    # Read only, shared between every pipeline using the same stage
+    return _design_sos(_stage_key(stage), sampling_rate)
+
+
+@functools.lru_cache(maxsize=128)
+def _design_sos(stage_key, sampling_rate):
+    sos = _design(dict(stage_key), sampling_rate)
+    sos.flags.writeable = False
+    return sos
+
+
+def _design(stage, sampling_rate):
+    stage_type = stage['type']
+    if stage_type == 'rolling_mean':
+        period = stage.get('period', 2)
+        return signal.tf2sos(np.ones(period) / period, [1.0])
+
+    if stage_type == 'detrend':
+        # Online constant detrend, x - m with m += (1 - alpha) * (x - m)
+        if stage.get('detrend', 'constant') != 'constant':
+            raise ValueError('%s detrend needs the whole signal, use apply() or a highpass stage online'
+                             % stage['detrend'])
+        alpha = np.exp(-1.0 / (stage.get('time_constant', DETREND_TIME_CONSTANT) * sampling_rate))
+        return np.array([[alpha, -alpha, 0.0, 1.0, -alpha, 0.0]])
+
+    if stage_type == 'environmental_noise':
+        noise = stage.get('noise', 50)
+        frequencies = (50, 60) if noise == 'both' else (int(noise),)
+        return np.concatenate([_design({'type': 'bandstop', 'low': NOISE_BANDS[f][0], 'high': NOISE_BANDS[f][1],
+                                        'order': stage.get('order', 4)}, sampling_rate) for f in frequencies])
+
+    if stage_type in ('bandpass', 'bandstop'):
+        cutoff = [stage['low'], stage['high']]
+    elif stage_type in ('highpass', 'lowpass'):
+        cutoff = stage['cutoff']
+    else:
+        raise ValueError('unknown filter stage: %s' % stage_type)
+
+    order = stage.get('order', 4)
+    design = stage.get('filter', 'butterworth')
+    if design == 'butterworth':
+        return signal.butter(order, cutoff, btype=stage_type, fs=sampling_rate, output='sos')
+    if design == 'bessel':
+        return signal.bessel(order, cutoff, btype=stage_type, fs=sampling_rate, output='sos')
+    if design == 'chebyshev':
+        return signal.cheby1(order, stage.get('ripple', 0.5), cutoff, btype=stage_type,
+                             fs=sampling_rate, output='sos')
+    raise ValueError('unknown filter design: %s, expected one of %s' % (design, FILTER_DESIGNS))
+
+
+def design_chain(stages, sampling_rate):
+    # All stages cascaded into one SOS matrix, applied with a single sosfilt call
+    return np.concatenate([design_sos(stage, sampling_rate) for stage in stages], axis=0)
+
+
+def design_steps(stages, sampling_rate, causal=False):
+    # [('sos', matrix) | ('detrend', kind)], consecutive IIR stages merged. Causal steps
+    # are all 'sos', detrend included.
+    steps = list()
+    for stage in stages:
+        if stage['type'] == 'detrend' and not causal:
+            steps.append(('detrend', stage.get('detrend', 'constant')))
+        elif steps and steps[-1][0] == 'sos':
+            steps[-1] = ('sos', np.concatenate((steps[-1][1], design_sos(stage, sampling_rate))))
+        else:
+            # sosfilt wants a writable matrix, the cached design is shared
+            steps.append(('sos', np.array(design_sos(stage, sampling_rate))))
+    return steps
+
+
+def _filtfilt_padlen(sos, num_samples):
+    # scipy's default padding, shortened for windows that are too short for it
+    padlen = 3 * (2 * len(sos) + 1 - min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum()))
+    return min(padlen, num_samples - 1)
+
+
+class FilterPipeline:
+    def __init__(self, stages, sampling_rate):
+        self.stages = stages
+        self.sampling_rate = sampling_rate
+        self.steps = design_steps(stages, sampling_rate)
+        self.causal_steps = None
+        self.reset()
+
+    def reset(self):
+        self.state = None
+
+    def causal(self):
+        # Online steps, designed on first use so a pipeline with a linear detrend can
+        # still be built for apply()
+        if self.causal_steps is None:
+            self.causal_steps = design_steps(self.stages, self.sampling_rate, causal=True)
+        return self.causal_steps
+
+    def apply(self, data, zero_phase=True):
+        # Offline pass over a whole recording (channels x samples, or one channel);
+        # returns a new array. zero_phase=False gives the online result in one call.
+        data = np.array(data, dtype=np.float64)
+        if data.shape[-1] == 0:
+            return data
+        if not zero_phase:
+            return self._causal(data, [None] * len(self.causal()))
+        for kind, value in self.steps:
+            if kind == 'detrend':
+                data = signal.detrend(data, axis=-1, type=value)
+            else:
+                data = signal.sosfiltfilt(value, data, axis=-1, padlen=_filtfilt_padlen(value, data.shape[-1]))
+        return data
+
+    def process(self, chunk):
+        # chunk is (channels x new samples), returns the filtered chunk
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if chunk.shape[-1] == 0:
+            return chunk.copy()
+        if self.state is None:
+            self.state = [None] * len(self.causal())
+        return self._causal(chunk, self.state)
+
+    def _causal(self, data, state):
+        for i, (_, value) in enumerate(self.causal()):
+            if state[i] is None:
+                # Start in steady state for the first sample, otherwise the DC offset
+                # of the electrodes rings through the filters for seconds
+                zi = signal.sosfilt_zi(value)
+                state[i] = zi.reshape((zi.shape[0],) + (1,) * (data.ndim - 1) + (2,)) * data[..., 0, np.newaxis]
+            data, state[i] = signal.sosfilt(value, data, axis=-1, zi=state[i])
+        return data
+
+
+# Name used by the live plots
+StreamingFilter = FilterPipeline
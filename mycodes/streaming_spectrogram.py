@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from scipy import signal
+
+from ring_buffer import RingBuffer
+from text_loader import load
+
+# Spectrogram computed frame by frame as samples arrive, so a recording of any
+# length is processed in fixed size chunks. The newly complete frames of all
+# channels are one (channels x frames x nperseg) stride tricks view and go through
+# a single rfft call. Output is dB, frames x freqs per channel, with the same
+# defaults and scaling as scipy.signal.spectrogram (tukey window, constant detrend,
+# one sided density).
+#
+# Offline, frames are written to an on disk .npy (channels x frames x freqs) with a
+# JSON sidecar; the live mode keeps the last frames in a RingBuffer so the image is
+# extended by the new columns instead of being recomputed.
+#
+# BrainFlow is only imported by the functions that open files or boards, so the
+# spectrogram classes can be used from spectogram/brainflow.py, whose name shadows
+# the brainflow package when that script is run.
+
+DB_FLOOR = 1e-20
+CHUNK_SAMPLES = 65536
+
+
+class StreamingSpectrogram:
+    def __init__(self, num_channels, sampling_rate, nperseg=256, noverlap=None, window=('tukey', 0.25)):
+        self.num_channels = num_channels
+        self.sampling_rate = sampling_rate
+        self.nperseg = nperseg
+        self.noverlap = nperseg // 8 if noverlap is None else noverlap
+        self.step = self.nperseg - self.noverlap
+        self.window = signal.get_window(window, nperseg)
+        self.freqs = np.fft.rfftfreq(nperseg, 1.0 / sampling_rate)
+
+        # One sided density scaling, same as scipy.signal.spectrogram
+        self.scale = np.full(len(self.freqs), 2.0 / (sampling_rate * np.sum(self.window ** 2)))
+        self.scale[0] /= 2
+        if nperseg % 2 == 0:
+            self.scale[-1] /= 2
+
+        self.pending = np.zeros((num_channels, 0))
+        self.num_frames = 0
+
+    def reset(self):
+        self.pending = np.zeros((self.num_channels, 0))
+        self.num_frames = 0
+
+    def frame_count(self, num_samples):
+        # Frames a recording of num_samples samples produces
+        return max(0, (num_samples - self.nperseg) // self.step + 1)
+
+    def times(self, num_frames=None, first=0):
+        # Frame centres in seconds, as the t returned by scipy.signal.spectrogram
+        num_frames = self.num_frames if num_frames is None else num_frames
+        return (np.arange(first, first + num_frames) * self.step + self.nperseg / 2) / self.sampling_rate
+
+    def update(self, chunk, db=True):
+        # chunk is (channels x new samples); returns (channels x new frames x freqs)
+        pending = np.concatenate((self.pending, chunk), axis=1)
+        if pending.shape[1] < self.nperseg:
+            self.pending = pending
+            return np.zeros((self.num_channels, 0, len(self.freqs)))
+
+        frames = np.lib.stride_tricks.sliding_window_view(pending, self.nperseg, axis=1)[:, ::self.step]
+        frames = frames - frames.mean(axis=2, keepdims=True)
+        spectra = np.abs(np.fft.rfft(frames * self.window, axis=2)) ** 2 * self.scale
+        num_new = spectra.shape[1]
+        self.pending = pending[:, num_new * self.step:]
+        self.num_frames += num_new
+        if db:
+            spectra = 10 * np.log10(np.maximum(spectra, DB_FLOOR))
+        return spectra
+
+
+class RollingSpectrogram:
+    # Live image of the last num_frames frames, one (freqs x frames) block per channel
+
+    def __init__(self, num_channels, sampling_rate, num_frames, **spectrogram_args):
+        self.spectrogram = StreamingSpectrogram(num_channels, sampling_rate, **spectrogram_args)
+        self.num_freqs = len(self.spectrogram.freqs)
+        self.image = RingBuffer(num_channels * self.num_freqs, num_frames, dtype=np.float32)
+
+    @property
+    def freqs(self):
+        return self.spectrogram.freqs
+
+    def __len__(self):
+        return len(self.image)
+
+    def update(self, chunk):
+        frames = self.spectrogram.update(chunk)
+        num_new = frames.shape[1]
+        if num_new > 0:
+            self.image.append(frames.transpose(0, 2, 1).reshape(-1, num_new))
+        return num_new
+
+    def get(self, channel):
+        return self.image.get()[channel * self.num_freqs:(channel + 1) * self.num_freqs]
+
+    def times(self):
+        first = self.spectrogram.num_frames - len(self.image)
+        return self.spectrogram.times(len(self.image), first)
+
+
+def open_source(path, board_id=None, rows=None):
+    # Returns (read(start, stop) -> channels x samples, num_samples, rows, sampling_rate)
+    from brainflow.board_shim import BoardShim, BoardIds
+    from recording import open_recording, EXTENSION
+
+    board_id = BoardIds.GANGLION_BOARD.value if board_id is None else board_id
+    if path.endswith(EXTENSION):
+        recording = open_recording(path)
+        rows = BoardShim.get_exg_channels(recording.board_id) if rows is None else rows
+        read = lambda start, stop: np.stack([recording.channel(row)[start:stop] for row in rows])
+        return read, len(recording), rows, recording.sampling_rate
+    data, header = load(path)
+    rows = BoardShim.get_exg_channels(board_id) if rows is None else rows
+    sampling_rate = header['sampling_rate'] or BoardShim.get_sampling_rate(board_id)
+    read = lambda start, stop: np.asarray(data[rows, start:stop])
+    return read, data.shape[1], rows, sampling_rate
+
+
+def compute_to_file(read, num_samples, num_channels, sampling_rate, out_path, chunk_samples=CHUNK_SAMPLES,
+                    **spectrogram_args):
+    # Streams the source through the spectrogram into a float32 dB .npy memmap
+    spectrogram = StreamingSpectrogram(num_channels, sampling_rate, **spectrogram_args)
+    num_frames = spectrogram.frame_count(num_samples)
+    out = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float32,
+                                    shape=(num_channels, num_frames, len(spectrogram.freqs)))
+    position = 0
+    for start in range(0, num_samples, chunk_samples):
+        frames = spectrogram.update(read(start, min(start + chunk_samples, num_samples)))
+        out[:, position:position + frames.shape[1]] = frames
+        position += frames.shape[1]
+    out.flush()
+
+    with open(os.path.splitext(out_path)[0] + '.json', 'w') as f:
+        json.dump({'sampling_rate': sampling_rate, 'nperseg': spectrogram.nperseg, 'noverlap': spectrogram.noverlap,
+                   'num_samples': num_samples, 'layout': 'channels x frames x freqs', 'unit': 'dB'}, f, indent=1)
+    return out, spectrogram.freqs, spectrogram.times(num_frames)
+
+
+def live(args):
+    import matplotlib.pyplot as plt
+    from brainflow.board_shim import BoardShim, BrainFlowInputParams
+
+    BoardShim.disable_board_logger()
+    board = BoardShim(args.board_id, BrainFlowInputParams())
+    sampling_rate = BoardShim.get_sampling_rate(args.board_id)
+    rows = BoardShim.get_exg_channels(args.board_id)[:args.num_channels]
+    rolling = RollingSpectrogram(len(rows), sampling_rate, args.frames, nperseg=args.nperseg, noverlap=args.noverlap)
+
+    fig, axes = plt.subplots(len(rows), 1, sharex=True, squeeze=False)
+    images = list()
+    for ax, row in zip(axes[:, 0], rows):
+        image = ax.imshow(np.zeros((rolling.num_freqs, 1)), origin='lower', aspect='auto', vmin=-40, vmax=40)
+        ax.set_ylabel('Ch %d (Hz)' % row)
+        images.append(image)
+    axes[-1, 0].set_xlabel('Time (s)')
+    fig.colorbar(images[0], ax=axes[:, 0], label='Power (dB)')
+
+    board.prepare_session()
+    try:
+        board.start_stream(45000)
+        while plt.fignum_exists(fig.number):
+            plt.pause(0.1)
+            data = board.get_board_data()
+            if rolling.update(data[rows]) == 0 or len(rolling) == 0:
+                continue
+            times = rolling.times()
+            half_step = rolling.spectrogram.step / (2.0 * sampling_rate)
+            extent = (times[0] - half_step, times[-1] + half_step, rolling.freqs[0], rolling.freqs[-1])
+            for channel, image in enumerate(images):
+                image.set_data(rolling.get(channel))
+                image.set_extent(extent)
+            axes[-1, 0].set_xlim(extent[0], extent[1])
+    finally:
+        board.release_session()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='streaming STFT spectrogram of a recording or a live board')
+    parser.add_argument('file', nargs='?', help='.bfrec, DataFilter CSV or OpenBCI GUI .txt recording')
+    parser.add_argument('--out', type=str, help='output .npy, next to the recording if empty', default='')
+    parser.add_argument('--board-id', type=int, help='board the recording comes from or the live board, Ganglion by default',
+                        default=None)
+    parser.add_argument('--nperseg', type=int, help='samples per frame', default=256)
+    parser.add_argument('--noverlap', type=int, help='overlapping samples, nperseg // 8 if not set', default=None)
+    parser.add_argument('--chunk-samples', type=int, help='samples read per chunk', default=CHUNK_SAMPLES)
+    parser.add_argument('--live', action='store_true', help='rolling spectrogram of the live board')
+    parser.add_argument('--frames', type=int, help='frames shown in live mode', default=200)
+    parser.add_argument('--num-channels', type=int, help='channels shown in live mode', default=4)
+    args = parser.parse_args()
+
+    if args.live:
+        if args.board_id is None:
+            parser.error('--board-id is required with --live')
+        live(args)
+        return
+    if not args.file:
+        parser.error('a recording is required unless --live is given')
+
+    read, num_samples, rows, sampling_rate = open_source(args.file, args.board_id)
+    out_path = args.out or os.path.splitext(args.file)[0] + '.spectrogram.npy'
+    start = time.perf_counter()
+    out, freqs, times = compute_to_file(read, num_samples, len(rows), sampling_rate, out_path, args.chunk_samples,
+                                        nperseg=args.nperseg, noverlap=args.noverlap)
+    print('%s: %d channels x %d frames x %d freqs (%.1f s of signal) in %.3f s -> %s' %
+          (args.file, out.shape[0], out.shape[1], out.shape[2], num_samples / sampling_rate,
+           time.perf_counter() - start, out_path))
+
+
+if __name__ == "__main__":
+    main()
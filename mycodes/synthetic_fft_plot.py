@@ -6,6 +6,8 @@ import pandas as pd
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, LogLevels, BoardIds
 from brainflow.data_filter import DataFilter, WindowOperations, AggOperations, NoiseTypes, DetrendOperations
 
+from spectral_analysis import compute_spectrum, plot_spectrum
+
 def plot_timeseries(data, emg_channels, sampling_rate, file_name):
     # Convert it to pandas DF
     df = pd.DataFrame(np.transpose(data))
@@ -28,50 +30,17 @@ def plot_timeseries(data, emg_channels, sampling_rate, file_name):
     plt.grid(True)
     plt.savefig(file_name)
     
-def plot_fft(data, channel, sampling_rate):
-    fft_data = np.fft.fft(data)
-    
-    # Compute the magnitudes of the FFT result
-    magnitude = np.abs(fft_data)
-    
-    # Generate the frequency axis
-    N = len(fft_data)
-    T = 1/sampling_rate
-    freq = np.fft.fftfreq(N, T)
-    
-    # Filter frequencies and amplitudes above 0
-    positive_freq = freq[(freq > 0) & (magnitude > 0)]
-    positive_mag = magnitude[(freq > 0) & (magnitude > 0)]
-    
-    # Filter frequencies and amplitudes above M uV
+def plot_fft(spectrum, index):
+    # Mark the most powerful frequencies above M uV
     M = 10000
-    marked_freq = freq[magnitude > M]
-    marked_mag = magnitude[magnitude > M]
-
-    # Plot the FFT result
-    plt.figure(figsize=(10, 5))
-    plt.plot(positive_freq, positive_mag, linestyle='-', linewidth=1)
-    plt.scatter(marked_freq, marked_mag, marker='o')  # Plot markers for positive amplitudes
-    plt.xlabel('Frequency (Hz)')
-    plt.ylabel('Amplitude (μV)')
+    plot_spectrum(spectrum, index, max_freq=100, min_magnitude=M)
     
     # This is to enable logaritmic scale
     #plt.yscale('log')
     #plt.yticks([0.1, 1, 10, 100, 1000], ['0.1', '1', '10', '100', '1000'])
     
-    # Set the x-axis limit to 0-100 Hz and the y-axis limit to auto
-    plt.xlim(0, 100)
-    plt.ylim(0, auto=True)
-    plt.title('FFT Channel %d Plot' % channel)
-    plt.grid(True)
-
-    # Annotate the most powerful frequencies with their amplitudes
-    for f, mag in zip(marked_freq, marked_mag):
-        plt.annotate(f'{f:.2f} Hz\n{mag:.2f} μV', xy=(f, mag), xytext=(f + 5, mag),
-                    arrowprops=dict(facecolor='black', arrowstyle='->'), bbox=dict(facecolor='white', alpha=0.5))
-    
     # Save the plot
-    #plt.savefig('fft_channel_%d.png' % channel) 
+    #plt.savefig('fft_channel_%d.png' % spectrum.channels[index]) 
     
 
 def main():
@@ -108,8 +77,6 @@ def main():
         # Denoise data
         DataFilter.remove_environmental_noise(data[channel], sampling_rate, NoiseTypes.FIFTY_AND_SIXTY)
         
-        plot_fft(data[channel], channel, sampling_rate)
-        
         #psd = DataFilter.get_psd_welch(data[channel], num_points, num_points // 2, sampling_rate,
         #                           WindowOperations.BLACKMAN_HARRIS.value)
 
@@ -119,6 +86,11 @@ def main():
         #band_power_beta = DataFilter.get_band_power(psd, 13.0, 30.0)
         #print('Delta: %.6f Theta: %.6f Alfa: %.6f     Beta: %.6f' % (band_power_delta, band_power_theta, band_power_alpha, band_power_beta))
         
+    # FFT of all channels at once, then one plot per channel
+    spectrum = compute_spectrum(data, sampling_rate, emg_channels, num_peaks=5)
+    for index in range(len(emg_channels)):
+        plot_fft(spectrum, index)
+
     plot_timeseries(data, emg_channels, sampling_rate, 'processed_signals.png')
 
 
@@ -0,0 +1,184 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+# One loader for the text recordings: OpenBCI GUI exports (.txt, '%' header lines,
+# a column name line, ', ' separated, trailing formatted timestamp) and BrainFlow
+# DataFilter.write_file CSVs (tab separated, no header).
+#
+# The numeric block is parsed by the pandas C parser in chunks of CHUNK_ROWS lines
+# and written straight into a .npy file in a cache directory next to the source, so
+# memory stays bounded by one chunk. The cache entry records the source size and
+# mtime; while they match, loading is just a read-only np.memmap of the .npy.
+# Data comes back in the BrainFlow layout (rows x samples), the same as
+# DataFilter.read_file; an OpenBCI Ganglion export maps 1:1 onto the board rows.
+
+CACHE_DIRECTORY = '.parse_cache'
+CACHE_VERSION = 1
+CHUNK_ROWS = 4096
+READ_BLOCK = 1 << 20
+
+
+def _is_data_line(line, delimiter):
+    try:
+        float(line.split(delimiter)[0])
+        return True
+    except ValueError:
+        return False
+
+
+def read_header(path):
+    # Header lines, column names and the layout of the numeric block
+    header = {'format': 'brainflow_csv', 'sampling_rate': None, 'num_channels': None,
+              'board': None, 'columns': None, 'header_lines': 0}
+    with open(path, 'r') as f:
+        line = f.readline()
+        while line.startswith('%'):
+            header['format'] = 'openbci_txt'
+            key, _, value = line[1:].partition('=')
+            key, value = key.strip(), value.strip()
+            if key == 'Sample Rate':
+                header['sampling_rate'] = int(float(value.split()[0]))
+            elif key == 'Number of channels':
+                header['num_channels'] = int(value)
+            elif key == 'Board':
+                header['board'] = value
+            header['header_lines'] += 1
+            line = f.readline()
+
+        delimiter = '\t' if '\t' in line else ','
+        if line and not _is_data_line(line, delimiter):
+            # Column name line of the OpenBCI GUI export
+            header['columns'] = [name.strip() for name in line.rstrip('\r\n').split(delimiter)]
+            header['header_lines'] += 1
+            line = f.readline()
+
+    fields = [field.strip() for field in line.rstrip('\r\n').split(delimiter)] if line else []
+    # Numeric columns run up to the first non numeric field (formatted timestamp)
+    num_columns = 0
+    for field in fields:
+        try:
+            float(field)
+        except ValueError:
+            break
+        num_columns += 1
+    if header['columns'] is None:
+        header['columns'] = ['Column %d' % i for i in range(num_columns)]
+    header['columns'] = header['columns'][:num_columns]
+    header['delimiter'] = delimiter
+    header['num_columns'] = num_columns
+    return header
+
+
+def _count_lines(path, skip_lines):
+    # Newline count of the whole file, done on raw bytes
+    num_lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK)
+            if not block:
+                break
+            num_lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        num_lines += 1
+    return max(num_lines - skip_lines, 0)
+
+
+def _chunks(path, header, skip_rows, chunk_rows):
+    return pd.read_csv(path, sep=header['delimiter'], header=None, skiprows=header['header_lines'] + skip_rows,
+                       usecols=range(header['num_columns']), skipinitialspace=True, dtype=np.float64,
+                       float_precision='round_trip', chunksize=chunk_rows, engine='c')
+
+
+def parse(path, header=None, skip_rows=0, chunk_rows=CHUNK_ROWS, out_path=None):
+    # Parses the numeric block into (columns x samples); into a .npy file if out_path is given
+    if header is None:
+        header = read_header(path)
+    num_samples = _count_lines(path, header['header_lines'] + skip_rows)
+    shape = (header['num_columns'], num_samples)
+    if out_path is None:
+        data = np.empty(shape)
+    else:
+        data = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float64, shape=shape)
+
+    position = 0
+    if num_samples > 0 and header['num_columns'] > 0:
+        for chunk in _chunks(path, header, skip_rows, chunk_rows):
+            values = chunk.to_numpy()
+            data[:, position:position + len(values)] = values.T
+            position += len(values)
+
+    if position != num_samples:
+        # Blank lines were counted as samples, keep only what was parsed
+        trimmed = np.array(data[:, :position])
+        if out_path is None:
+            return trimmed
+        del data
+        np.save(out_path, trimmed)
+        return np.load(out_path, mmap_mode='r')
+    if out_path is not None:
+        data.flush()
+    return data
+
+
+def cache_paths(path):
+    directory = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRECTORY)
+    base = os.path.join(directory, os.path.basename(path))
+    return directory, base + '.npy', base + '.json'
+
+
+def _cache_key(path, skip_rows):
+    stat = os.stat(path)
+    return {'version': CACHE_VERSION, 'size': stat.st_size, 'mtime': stat.st_mtime, 'skip_rows': skip_rows}
+
+
+def load(path, skip_rows=0, use_cache=True, chunk_rows=CHUNK_ROWS):
+    # Returns (data, header). data is (columns x samples); from the cache it is a
+    # read only memmap, copy it before filtering in place with DataFilter.
+    if not use_cache:
+        header = read_header(path)
+        return parse(path, header, skip_rows, chunk_rows), header
+
+    directory, data_path, meta_path = cache_paths(path)
+    key = _cache_key(path, skip_rows)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta['key'] == key:
+            return np.load(data_path, mmap_mode='r'), meta['header']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    header = read_header(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Written under temporary names, a crash never leaves a half written cache entry
+        parse(path, header, skip_rows, chunk_rows, data_path + '.tmp.npy')
+        os.replace(data_path + '.tmp.npy', data_path)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump({'key': key, 'header': header}, f, indent=1)
+        os.replace(meta_path + '.tmp', meta_path)
+    except OSError:
+        # Read only location, parse without caching
+        return parse(path, header, skip_rows, chunk_rows), header
+    return np.load(data_path, mmap_mode='r'), header
+
+
+def main():
+    parser = argparse.ArgumentParser(description='parse OpenBCI GUI .txt exports and BrainFlow CSVs into the parse cache')
+    parser.add_argument('files', nargs='+', help='text recordings')
+    parser.add_argument('--skip-rows', type=int, help='data lines to skip after the header', default=0)
+    args = parser.parse_args()
+
+    for path in args.files:
+        data, header = load(path, args.skip_rows)
+        print('%s: %s, %d columns x %d samples, sampling rate %s, board %s' %
+              (path, header['format'], data.shape[0], data.shape[1], header['sampling_rate'] or '-', header['board'] or '-'))
+
+
+if __name__ == "__main__":
+    main()
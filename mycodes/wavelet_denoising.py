@@ -0,0 +1,365 @@
+import os
+import time
+import argparse
+import functools
+import numpy as np
+
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from brainflow.board_shim import BoardShim
+from brainflow.data_filter import DataFilter, WaveletTypes, WaveletDenoisingTypes, ThresholdTypes, \
+    WaveletExtensionTypes, NoiseEstimationLevelTypes
+
+from ring_buffer import RingBuffer
+from dataset_catalog import DatasetCatalog, DEFAULT_DIRECTORY
+
+# Wavelet denoising of all channels of a (channels x samples) block at once, with the
+# same result as DataFilter.perform_wavelet_denoising run on every channel.
+#
+# The filter bank of a wavelet is read once from BrainFlow itself (one interior row
+# of its single level transform and one column of the inverse) and cached, so there is
+# no second set of wavelet coefficients to drift away from the one the rest of the
+# repo uses. The transform is BrainFlow's (wavelib's) with symmetric extension:
+#   analysis   half sample symmetric extension by filter_length - 1 samples on both
+#              sides, correlate with both decomposition filters, keep every second
+#              output: (n + filter_length - 1) // 2 coefficients per level
+#   synthesis  upsample, convolve with both reconstruction filters, keep the
+#              n samples starting at filter_length - 2
+# Every level works on all rows of any (..., samples) array together. The analysis
+# adds the taps one at a time in wavelib's order, so the coefficients are bit for bit
+# BrainFlow's; the synthesis is a matrix product over coefficient windows and agrees
+# to rounding. Coefficients come out as BrainFlow lays them out, [A(J) D(J) ... D(1)].
+#
+# Thresholds follow BrainFlow (wavelib):
+#   noise sigma   median(|D|) / 0.6745, of D(1) for FIRST_LEVEL, of each level for ALL_LEVELS
+#   VISUSHRINK    sigma * sqrt(2 log(total number of coefficients)), every detail level
+#   SURESHRINK    per level, the SURE risk minimiser on the coefficients over sigma, or the
+#                 universal sqrt(2 log n) when the level is sparse (the hybrid rule), times sigma
+# The approximation is never thresholded. The SURE threshold is the magnitude of one
+# of the coefficients, so whether that coefficient is kept hangs on its last bit: the
+# threshold is computed with wavelib's operations in wavelib's order and compared with
+# its `<`, which is why the analysis has to be exact. benchmarks/wavelet_benchmark.py
+# checks the result against BrainFlow for every method.
+#
+# Thresholds depend on the block, so a live stream is denoised in overlap-save windows:
+# every `hop` samples the last block_length samples are denoised and the hop samples
+# that end `delay` samples before the newest one are kept, away from the right edge.
+# denoise_recording does the same offline, with context on both sides of each kept
+# segment, and splits the windows between threads (numpy releases the GIL);
+# main() spreads whole recordings of the archive over processes.
+
+NOISE_MAD_SCALE = 0.6745
+PROBE_LENGTH = 256
+
+
+@dataclass(frozen=True)
+class FilterBank:
+    wavelet: int
+    decomposition: np.ndarray # 2 x filter_length, low and high pass, in correlation order
+    reconstruction: np.ndarray # 2 x filter_length, low and high pass
+    synthesis: np.ndarray # 2 x filter_length / 2 x 2, see synthesis_kernel
+
+    @property
+    def length(self):
+        return self.decomposition.shape[1]
+
+
+@functools.lru_cache(maxsize=32)
+def filter_bank(wavelet):
+    # Read only, shared by every denoiser using the wavelet
+    wavelet = int(wavelet)
+    extension = WaveletExtensionTypes.SYMMETRIC.value
+    probe = np.zeros(PROBE_LENGTH)
+    coeffs, lengths = DataFilter.perform_wavelet_transform(probe, wavelet, 1, extension)
+    num_coeffs = int(lengths[0])
+    length = 2 * num_coeffs - PROBE_LENGTH + 2
+    # Coefficient `row` sees samples 2 * row + 2 - length ... 2 * row + 1, all inside the probe
+    row = length
+    first = 2 * row + 2 - length
+    decomposition = np.empty((2, length))
+    for k in range(length):
+        unit = probe.copy()
+        unit[first + k] = 1.0
+        coeffs = DataFilter.perform_wavelet_transform(unit, wavelet, 1, extension)[0]
+        decomposition[:, k] = coeffs[row], coeffs[num_coeffs + row]
+    reconstruction = np.empty((2, length))
+    for band in range(2):
+        unit = np.zeros(len(coeffs))
+        unit[band * num_coeffs + row] = 1.0
+        restored = DataFilter.perform_inverse_wavelet_transform((unit, lengths), PROBE_LENGTH, wavelet, 1, extension)
+        reconstruction[band] = restored[first:first + length]
+    synthesis = synthesis_kernel(reconstruction)
+    for array in (decomposition, reconstruction, synthesis):
+        array.flags.writeable = False
+    return FilterBank(wavelet, decomposition, reconstruction, synthesis)
+
+
+def synthesis_kernel(reconstruction):
+    # (band x window position x phase): the reconstruction tap that multiplies each
+    # coefficient of a window, for the even (phase 0) and odd (phase 1) output samples
+    half = reconstruction.shape[1] // 2
+    taps = 2 * (half - 1 - np.arange(half))
+    return np.ascontiguousarray(np.stack([reconstruction[:, taps], reconstruction[:, taps + 1]], axis=2))
+
+
+@functools.lru_cache(maxsize=128)
+def _extension_index(num_samples, filter_length):
+    # Indices of the half sample symmetric extension seen by the analysis of one level
+    num_coeffs = (num_samples + filter_length - 1) // 2
+    index = np.mod(np.arange(2 - filter_length, 2 * num_coeffs), 2 * num_samples)
+    index = np.where(index < num_samples, index, 2 * num_samples - 1 - index)
+    index.flags.writeable = False
+    return index
+
+
+def analysis_step(signals, bank):
+    # (..., n) -> approximation, detail, both (..., (n + filter_length - 1) // 2).
+    # Taps are accumulated one at a time, newest sample first, the order of wavelib's
+    # dwt_sym loop, so the coefficients are bit for bit BrainFlow's. The extension is
+    # gathered as its even and odd samples, so every tap reads a contiguous slice.
+    index = _extension_index(signals.shape[-1], bank.length)
+    phases = signals[..., index[0::2]], signals[..., index[1::2]]
+    num_coeffs = (signals.shape[-1] + bank.length - 1) // 2
+    approximation = np.zeros(signals.shape[:-1] + (num_coeffs,))
+    detail = np.zeros_like(approximation)
+    product = np.empty_like(approximation)
+    for k in range(bank.length - 1, -1, -1):
+        samples = phases[k % 2][..., k // 2:k // 2 + num_coeffs]
+        for coeffs, tap in zip((approximation, detail), bank.decomposition[:, k]):
+            # A zero tap (most of the high pass of the biorthogonal wavelets) adds
+            # exactly nothing to a finite sum, so it is skipped
+            if tap:
+                coeffs += np.multiply(samples, tap, out=product)
+    return approximation, detail
+
+
+def synthesis_step(approximation, detail, num_samples, bank):
+    # Inverse of analysis_step, back to (..., num_samples). Output 2p + phase is the sum
+    # over q of a[p - q] * r[2q + phase], so each even / odd pair of output samples is a
+    # window of coefficients times the (window x phase) kernel. Only the pairs kept from
+    # filter_length - 2 on are computed, and their windows never leave the coefficients.
+    half = bank.length // 2
+    num_frames = (num_samples + 1) // 2
+    restored = np.zeros(approximation.shape[:-1] + (num_frames, 2))
+    for coeffs, kernel in zip((approximation, detail), bank.synthesis):
+        frames = np.lib.stride_tricks.sliding_window_view(coeffs, half, axis=-1)[..., :num_frames, :]
+        restored += np.matmul(frames, kernel)
+    return restored.reshape(restored.shape[:-2] + (2 * num_frames,))[..., :num_samples]
+
+
+def wavedec(signals, bank, level):
+    # [A(J), D(J), ..., D(1)] of every row, and the approximation lengths n, A(1), ... A(J-1)
+    coeffs = list()
+    lengths = list()
+    approximation = signals
+    for _ in range(level):
+        lengths.append(approximation.shape[-1])
+        approximation, detail = analysis_step(approximation, bank)
+        coeffs.insert(0, detail)
+    coeffs.insert(0, approximation)
+    return coeffs, lengths
+
+
+def waverec(coeffs, lengths, bank):
+    approximation = coeffs[0]
+    for detail, num_samples in zip(coeffs[1:], reversed(lengths)):
+        approximation = synthesis_step(approximation, detail, num_samples, bank)
+    return approximation
+
+
+def noise_sigma(magnitudes):
+    # magnitudes is |D| sorted along the last axis; the median of an even count is
+    # (a + b) * 0.5, as in wavelib
+    n = magnitudes.shape[-1]
+    median = magnitudes[..., n // 2] if n % 2 else (magnitudes[..., n // 2 - 1] + magnitudes[..., n // 2]) * 0.5
+    return median / NOISE_MAD_SCALE
+
+
+def sure_threshold(details, magnitudes, sigma):
+    # Hybrid SURE threshold over sigma of every row of (..., n) detail coefficients, in
+    # wavelib's arithmetic: the sparsity test sums x * x / (sigma * sigma) in coefficient
+    # order, the risk runs over the sorted squares of |x / sigma| (dividing the sorted
+    # |x| gives the same values, division by sigma keeps the order)
+    n = details.shape[-1]
+    sigma = sigma[..., None]
+    energy = np.cumsum(details * details / (sigma * sigma), axis=-1)[..., -1]
+    squares = (magnitudes / sigma) ** 2
+    ranks = np.arange(1, n + 1)
+    risks = (n - 2 * ranks + np.cumsum(squares, axis=-1) + (n - ranks) * squares) / n
+    best = np.take_along_axis(squares, np.argmin(risks, axis=-1)[..., None], axis=-1)[..., 0]
+    universal = np.sqrt(2.0 * np.log(n))
+    sparse = (energy - n) / n < (np.log(n) / np.log(2.0)) ** 1.5 / np.sqrt(n)
+    return np.where(sparse, universal, np.minimum(np.sqrt(best), universal))
+
+
+class WaveletDenoiser:
+    # Defaults are the ones of brainflow_code_samples/denoising.py
+    def __init__(self, wavelet=WaveletTypes.BIOR3_9, level=3, denoising=WaveletDenoisingTypes.SURESHRINK,
+                 threshold=ThresholdTypes.HARD, extension=WaveletExtensionTypes.SYMMETRIC,
+                 noise_level=NoiseEstimationLevelTypes.FIRST_LEVEL):
+        if int(extension) != WaveletExtensionTypes.SYMMETRIC:
+            raise ValueError('only the symmetric extension is supported')
+        self.bank = filter_bank(wavelet)
+        self.level = level
+        self.denoising = int(denoising)
+        self.threshold = int(threshold)
+        self.noise_level = int(noise_level)
+
+    def denoise(self, block):
+        # block is (..., samples), e.g. channels x samples or windows x channels x samples;
+        # returns a new array of the same shape
+        block = np.asarray(block, dtype=np.float64)
+        coeffs, lengths = wavedec(block, self.bank, self.level)
+        self.threshold_details(coeffs)
+        return waverec(coeffs, lengths, self.bank)
+
+    def threshold_details(self, coeffs):
+        # In place on the detail levels of wavedec's output
+        num_coeffs = sum(c.shape[-1] for c in coeffs)
+        first_sigma = None
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for details in reversed(coeffs[1:]):
+                # Sorted once, for the noise median and the SURE risk; D(1) comes first
+                magnitudes = np.sort(np.abs(details), axis=-1)
+                sigma = noise_sigma(magnitudes)
+                if first_sigma is None:
+                    first_sigma = sigma
+                if self.noise_level != NoiseEstimationLevelTypes.ALL_LEVELS:
+                    sigma = first_sigma
+                if self.denoising == WaveletDenoisingTypes.SURESHRINK:
+                    cut = sure_threshold(details, magnitudes, sigma) * sigma
+                else:
+                    cut = sigma * np.sqrt(2 * np.log(num_coeffs))
+                # A flat level (sigma 0) is left as it is
+                cut = np.where(sigma > 0, cut, 0.0)[..., None]
+                if self.threshold == ThresholdTypes.HARD:
+                    np.copyto(details, 0.0, where=np.abs(details) < cut)
+                else:
+                    details[...] = np.sign(details) * np.maximum(np.abs(details) - cut, 0.0)
+
+
+class StreamingWaveletDenoiser:
+    def __init__(self, num_channels, block_length=500, hop=50, delay=None, **denoiser_args):
+        self.block_length = block_length
+        self.hop = hop
+        # Latency in samples; a quarter block keeps the kept samples off the right edge
+        self.delay = block_length // 4 if delay is None else delay
+        if self.hop + self.delay > block_length:
+            raise ValueError('hop + delay (%d) longer than the block (%d)' % (self.hop + self.delay, block_length))
+        self.denoiser = WaveletDenoiser(**denoiser_args)
+        self.buffer = RingBuffer(num_channels, block_length)
+        self.reset()
+
+    def reset(self):
+        self.buffer.clear()
+        self.since_hop = 0
+
+    def process(self, chunk):
+        # chunk is (channels x samples) of any size; returns the denoised samples completed
+        # by it, hop at a time, `delay` samples behind the input. Nothing comes out until
+        # the first block is full. All windows finished in one call are denoised together.
+        windows = list()
+        position = 0
+        num_samples = chunk.shape[1]
+        while position < num_samples:
+            take = min(num_samples - position, self.hop - self.since_hop)
+            self.buffer.append(chunk[:, position:position + take])
+            position += take
+            self.since_hop += take
+            if self.since_hop == self.hop:
+                self.since_hop = 0
+                if len(self.buffer) == self.block_length:
+                    windows.append(self.buffer.get().copy())
+        if not windows:
+            return np.empty((chunk.shape[0], 0))
+        end = self.block_length - self.delay
+        denoised = self.denoiser.denoise(np.stack(windows))[:, :, end - self.hop:end]
+        return np.concatenate(list(denoised), axis=1)
+
+
+def overlap_save_windows(num_samples, block_length, margin=None):
+    # The output is cut in segments of hop = block_length - 2 * margin samples, each
+    # taken from the middle of a block_length window (windows at the ends are shifted
+    # inside the recording); returns the segment starts, the window starts and hop
+    margin = block_length // 4 if margin is None else margin
+    hop = block_length - 2 * margin
+    if hop <= 0:
+        raise ValueError('margin %d leaves nothing of a %d sample block' % (margin, block_length))
+    segments = np.arange(0, num_samples, hop)
+    starts = np.clip(segments - margin, 0, num_samples - block_length)
+    return segments, starts, hop
+
+
+def denoise_recording(signals, block_length=500, margin=None, workers=None, windows_per_task=64, **denoiser_args):
+    # Offline overlap-save over a (channels x samples) array, see overlap_save_windows
+    signals = np.asarray(signals, dtype=np.float64)
+    denoiser = WaveletDenoiser(**denoiser_args)
+    num_samples = signals.shape[-1]
+    if num_samples <= block_length:
+        return denoiser.denoise(signals)
+    segments, starts, hop = overlap_save_windows(num_samples, block_length, margin)
+    views = np.lib.stride_tricks.sliding_window_view(signals, block_length, axis=-1)
+
+    def run(task):
+        # (windows x channels x samples) for segments[task]
+        return denoiser.denoise(np.moveaxis(views[..., starts[task], :], -2, 0))
+
+    tasks = [slice(i, i + windows_per_task) for i in range(0, len(segments), windows_per_task)]
+    if workers == 1 or len(tasks) == 1:
+        results = [run(task) for task in tasks]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, tasks))
+
+    out = np.empty_like(signals)
+    for task, denoised in zip(tasks, results):
+        for segment, start, window in zip(segments[task], starts[task], denoised):
+            end = min(segment + hop, num_samples)
+            out[..., segment:end] = window[..., segment - start:end - start]
+    return out
+
+
+catalog = None
+
+
+def init_worker(directory):
+    global catalog
+    catalog = DatasetCatalog(directory)
+    DataFilter.disable_data_logger()
+
+
+def denoise_entry(entry, block_length, output_directory):
+    # One recording in a worker process; its windows stay on that process' thread
+    data = catalog.load(entry)
+    channels = BoardShim.get_emg_channels(catalog.board_id)
+    start = time.perf_counter()
+    data[channels] = denoise_recording(data[channels], block_length, workers=1)
+    elapsed = time.perf_counter() - start
+    if output_directory:
+        DataFilter.write_file(data, os.path.join(output_directory, entry.name + '-denoised.csv'), 'w')
+    return entry.name, data.shape[1], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--directory', type=str, help='recordings archive', required=False, default=DEFAULT_DIRECTORY)
+    parser.add_argument('--block-length', type=int, help='samples per denoised window', required=False, default=500)
+    parser.add_argument('--workers', type=int, help='worker processes, all cores if not set', required=False, default=None)
+    parser.add_argument('--output-directory', type=str, help='write the denoised recordings here', required=False,
+                        default='')
+    args = parser.parse_args()
+
+    if args.output_directory:
+        os.makedirs(args.output_directory, exist_ok=True)
+    entries = DatasetCatalog(args.directory).entries
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.directory,)) as pool:
+        results = list(pool.map(denoise_entry, entries, [args.block_length] * len(entries),
+                                [args.output_directory] * len(entries)))
+    for name, num_samples, elapsed in results:
+        print('%-22s %8d samples %8.1f ms' % (name, num_samples, elapsed * 1000))
+    print('\n%d recordings in %.2f s' % (len(results), time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
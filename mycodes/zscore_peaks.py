@@ -0,0 +1,252 @@
+import time
+import argparse
+import numpy as np
+
+from dataclasses import dataclass
+from brainflow.board_shim import BoardShim
+from brainflow.data_filter import DataFilter
+
+from dataset_catalog import DatasetCatalog
+
+# Online version of DataFilter.detect_peaks_z_score (the smoothed z-score algorithm,
+# https://stackoverflow.com/a/22640362) for all channels of a stream.
+#
+# A sample is a detection when it is more than `threshold` standard deviations away
+# from the mean of the last `lag` filtered samples; detections enter the filtered
+# signal scaled by `influence`, everything else as it is. As in BrainFlow, the window
+# a sample is tested against ends one sample before it (the first test uses the first
+# lag samples) and the standard deviation is the population one, so chunk after chunk
+# the signals are the ones detect_peaks_z_score gives on the whole recording (up to
+# rounding of the window statistics, for samples right at the threshold).
+#
+# State is the last lag filtered samples per channel plus their running mean and sum
+# of squared deviations, updated in O(1) per sample (and recomputed exactly once per
+# lag samples against drift). Between detections the filtered signal is the input, so
+# each chunk is first tested speculatively in one vectorized pass (rolling sums over
+# the window history followed by the chunk); everything before the first detection of
+# any channel is committed at once and only detections step one sample at a time.
+# Detections come out as signals (1 above, -1 below, 0) like detect_peaks_z_score and
+# as events: an 'onset' when a run of detections starts, a 'peak' when it ends, with
+# the run's extreme sample.
+
+
+@dataclass(frozen=True)
+class PeakEvent:
+    kind: str # 'onset' or 'peak'
+    channel: int # row of the processed chunks
+    direction: int # 1 above the running mean, -1 below
+    onset_index: int # samples seen by the detector before the first detection of the run
+    onset_time: float
+    peak_index: int # extreme sample of the run, the onset sample for 'onset' events
+    peak_time: float
+    peak_value: float
+    end_index: int # first sample after the run, -1 for 'onset' events
+
+
+class ZScorePeakDetector:
+    def __init__(self, num_channels, lag=20, influence=0.1, threshold=3.5, lookahead=256):
+        self.num_channels = num_channels
+        self.lag = lag
+        self.influence = influence
+        self.threshold = threshold
+        self.lookahead = lookahead # samples per speculative pass
+        self.reset()
+
+    def reset(self):
+        self.window = np.zeros((self.num_channels, self.lag)) # filtered samples, circular
+        self.pos = 0
+        self.mean = np.zeros(self.num_channels)
+        self.m2 = np.zeros(self.num_channels)
+        self.pending = None # last filtered sample, enters the window with the next one
+        self.pushes = 0
+        self.total = 0
+        self.in_run = False # any detection in the last sample
+        self.runs = [None] * self.num_channels # open run per channel
+
+    def ordered_window(self):
+        return np.concatenate((self.window[:, self.pos:], self.window[:, :self.pos]), axis=1)
+
+    def recompute(self):
+        self.mean = self.window.mean(axis=1)
+        self.m2 = np.sum((self.window - self.mean[:, None]) ** 2, axis=1)
+
+    def push(self, values):
+        # Slides the window by one sample
+        old = self.window[:, self.pos].copy()
+        self.window[:, self.pos] = values
+        self.pos = (self.pos + 1) % self.lag
+        self.pushes += 1
+        if self.pushes % self.lag == 0:
+            self.recompute()
+            return
+        delta = values - old
+        mean = self.mean + delta / self.lag
+        self.m2 = np.maximum(self.m2 + delta * (values - mean + old - self.mean), 0.0)
+        self.mean = mean
+
+    def step(self, values):
+        # One sample of every channel against the current window
+        std = np.sqrt(self.m2 / self.lag)
+        deviation = values - self.mean
+        hit = np.abs(deviation) > self.threshold * std
+        signals = np.where(hit, np.where(deviation > 0, 1, -1), 0).astype(np.int8)
+        filtered = values
+        self.in_run = hit.any()
+        if self.in_run:
+            filtered = np.where(hit, self.influence * values + (1 - self.influence) * self.pending, values)
+        if self.total > self.lag:
+            self.push(self.pending)
+        self.pending = filtered
+        self.total += 1
+        return signals
+
+    def speculate(self, values):
+        # Signals of the chunk assuming no detection in it: the filtered samples are the
+        # input, so every window is a slice of the history followed by the chunk.
+        # Returns how many samples at the start of the chunk have no detection.
+        num_samples = values.shape[1]
+        history = np.concatenate((self.ordered_window(), self.pending[:, None], values[:, :-1]), axis=1)
+        # Deviations from the current mean keep the running sums small
+        shifted = history - self.mean[:, None]
+        zero = np.zeros((self.num_channels, 1))
+        sums = np.concatenate((zero, np.cumsum(shifted, axis=1)), axis=1)
+        squares = np.concatenate((zero, np.cumsum(shifted ** 2, axis=1)), axis=1)
+        window_sum = sums[:, self.lag:self.lag + num_samples] - sums[:, :num_samples]
+        window_squares = squares[:, self.lag:self.lag + num_samples] - squares[:, :num_samples]
+        mean = window_sum / self.lag
+        std = np.sqrt(np.maximum(window_squares / self.lag - mean ** 2, 0.0))
+        hits = np.abs(values - self.mean[:, None] - mean) > self.threshold * std
+        first = np.flatnonzero(hits.any(axis=0))
+        return first[0] if len(first) else num_samples
+
+    def commit(self, values):
+        # Adds a stretch of samples known to have no detection
+        num_samples = values.shape[1]
+        if num_samples == 0:
+            return
+        joined = np.concatenate((self.ordered_window(), self.pending[:, None], values[:, :-1]), axis=1)
+        self.window = np.ascontiguousarray(joined[:, -self.lag:])
+        self.pos = 0
+        self.pushes += num_samples
+        self.recompute()
+        self.pending = values[:, -1].copy()
+        self.total += num_samples
+
+    def process(self, values, timestamps=None):
+        # values is (channels x samples) of any size, timestamps the board timestamps of
+        # the samples; returns the (channels x samples) signals and the events of the chunk
+        values = np.asarray(values, dtype=np.float64)
+        num_samples = values.shape[1]
+        start_total = self.total
+        signals = np.zeros((self.num_channels, num_samples), dtype=np.int8)
+
+        # The first lag samples only fill the window
+        position = min(num_samples, max(0, self.lag - self.total))
+        if position > 0:
+            self.window[:, self.total:self.total + position] = values[:, :position]
+            self.total += position
+            if self.total == self.lag:
+                self.recompute()
+                self.pending = values[:, position - 1].copy()
+
+        while position < num_samples:
+            # The first test (sample lag) uses the window without a pending sample, and a
+            # run of detections goes one sample at a time until it is over
+            if self.in_run or self.total == self.lag:
+                signals[:, position] = self.step(values[:, position])
+                position += 1
+                continue
+            end = min(num_samples, position + self.lookahead)
+            quiet = self.speculate(values[:, position:end])
+            self.commit(values[:, position:position + quiet])
+            position += quiet
+            if position < end:
+                signals[:, position] = self.step(values[:, position])
+                position += 1
+
+        events = self.events(values, signals, timestamps, start_total)
+        return signals, events
+
+    def events(self, values, signals, timestamps, start_total):
+        # Walks the runs of equal signal of every channel; a run still going at the end
+        # of the chunk stays open for the next one
+        events = list()
+        if not signals.any() and not any(self.runs):
+            return events
+        if timestamps is None:
+            timestamps = np.full(values.shape[1], np.nan)
+        for channel, row in enumerate(signals):
+            changes = np.flatnonzero(row[1:] != row[:-1]) + 1
+            for begin, end in zip(np.concatenate(([0], changes)), np.concatenate((changes, [len(row)]))):
+                direction = int(row[begin])
+                run = self.runs[channel]
+                if run is not None and run['direction'] != direction:
+                    events.append(self.close_run(channel, start_total + begin))
+                    run = None
+                if direction == 0:
+                    continue
+                if run is None:
+                    onset_index = start_total + begin
+                    onset_time = float(timestamps[begin])
+                    run = self.runs[channel] = {'direction': direction, 'onset_index': onset_index,
+                                                'onset_time': onset_time, 'peak_index': onset_index,
+                                                'peak_time': onset_time, 'peak_value': float(values[channel, begin])}
+                    events.append(PeakEvent('onset', channel, direction, onset_index, onset_time, onset_index,
+                                            onset_time, run['peak_value'], -1))
+                # Extreme sample of the run in its direction
+                segment = values[channel, begin:end] * direction
+                peak = int(np.argmax(segment))
+                if segment[peak] > run['peak_value'] * direction:
+                    run.update(peak_index=start_total + begin + peak, peak_time=float(timestamps[begin + peak]),
+                               peak_value=float(segment[peak] * direction))
+        return events
+
+    def close_run(self, channel, end_index):
+        run = self.runs[channel]
+        self.runs[channel] = None
+        return PeakEvent('peak', channel, run['direction'], run['onset_index'], run['onset_time'], run['peak_index'],
+                         run['peak_time'], run['peak_value'], end_index)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunk-samples', type=int, help='samples per call, 2 is one Ganglion packet', required=False,
+                        default=2)
+    parser.add_argument('--lag', type=int, required=False, default=20)
+    parser.add_argument('--influence', type=float, required=False, default=0.1)
+    parser.add_argument('--threshold', type=float, required=False, default=3.5)
+    args = parser.parse_args()
+
+    # Replays every recording of the archive chunk by chunk and compares the signals
+    # with detect_peaks_z_score on the whole recording, channel by channel
+    DataFilter.disable_data_logger()
+    catalog = DatasetCatalog()
+    channels = BoardShim.get_emg_channels(catalog.board_id)
+    timestamp_channel = BoardShim.get_timestamp_channel(catalog.board_id)
+    print('%-22s %8s %7s %10s %12s %12s' % ('name', 'samples', 'peaks', 'mismatch', 'stream', 'brainflow'))
+    for entry in catalog:
+        data = catalog.load(entry, copy=False)
+        detector = ZScorePeakDetector(len(channels), args.lag, args.influence, args.threshold)
+        start = time.perf_counter()
+        signals = list()
+        num_peaks = 0
+        for begin in range(0, data.shape[1], args.chunk_samples):
+            chunk = data[:, begin:begin + args.chunk_samples]
+            chunk_signals, events = detector.process(chunk[channels], chunk[timestamp_channel])
+            signals.append(chunk_signals)
+            num_peaks += sum(event.kind == 'peak' for event in events)
+        stream_time = time.perf_counter() - start
+        signals = np.concatenate(signals, axis=1)
+
+        start = time.perf_counter()
+        reference = np.array([DataFilter.detect_peaks_z_score(np.ascontiguousarray(data[channel]), lag=args.lag,
+                                                              influence=args.influence, threshold=args.threshold)
+                              for channel in channels])
+        brainflow_time = time.perf_counter() - start
+        print('%-22s %8d %7d %10d %9.1f ms %9.1f ms' % (entry.name, data.shape[1], num_peaks,
+                                                        np.count_nonzero(signals != reference), stream_time * 1000,
+                                                        brainflow_time * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy import signal
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from text_loader import load
+from streaming_spectrogram import StreamingSpectrogram
 
 # Specify your input and output file paths
 input_file_path = './files/brainflow5.csv'
@@ -10,10 +15,8 @@ output_file_path = './files/output5.csv'
 # Specify the header for the columns
 column_header = ['Sample Index', 'EXG Channel 0', 'EXG Channel 1', 'EXG Channel 2', 'EXG Channel 3', 'Accel Channel 0', 'Accel Channel 1', 'Accel Channel 2', 'Other', 'Other', 'Other', 'Other', 'Other', 'Timestamp', 'Other']
 # Read the CSV file into a DataFrame, skipping the first 14 rows
-df = pd.read_csv(input_file_path, delimiter='\t', skiprows=13)
-
-# Add the specified header
-df.columns = column_header
+data, _ = load(input_file_path, skip_rows=14)
+df = pd.DataFrame(data.T, columns=column_header)
 
 # Write the DataFrame to a new CSV file
 df.to_csv(output_file_path, index=False, sep='\t')
@@ -28,14 +31,17 @@ fs = 200  # Sampling rate in Hz
 nperseg = 256  # Window size
 noverlap = nperseg // 2  # Overlap between windows
 
-# Calculate and show the spectrogram for each channel
-for channel in channels:
-    f, t, Sxx = signal.spectrogram(df[channel], fs, nperseg=nperseg, noverlap=noverlap)
+# Calculate the spectrogram of all channels at once, then show them together
+spectrogram = StreamingSpectrogram(len(channels), fs, nperseg=nperseg, noverlap=noverlap)
+Sxx_db = spectrogram.update(df[channels].to_numpy().T)  # channels x frames x freqs, in dB
+f, t = spectrogram.freqs, spectrogram.times()
+
+for channel, Sxx in zip(channels, Sxx_db):
     plt.figure(figsize=(10, 6))
-    plt.pcolormesh(t, f, 10 * np.log10(Sxx), shading='auto')
+    plt.pcolormesh(t, f, Sxx.T, shading='auto')
     plt.colorbar(label='Power (dB)')
     plt.title(f'Spectrogram - {channel}')
     plt.xlabel('Time (s)')
     plt.ylabel('Frequency (Hz)')
     plt.tight_layout()
-    plt.show()
\ No newline at end of file
+plt.show()
\ No newline at end of file
@@ -1,15 +1,20 @@
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.io import wavfile
 
-# Read the BrainFlow CSV file
-data = np.genfromtxt('files/brainflow5_changes.csv', delimiter='\t', skip_header=14)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mycodes'))
+from text_loader import load
 
-# Extract the audio signal from the file
-audio_signal = data[:, 1]
+# Read the BrainFlow CSV file (rows x samples, cached after the first parse)
+data, _ = load('files/brainflow5_changes.csv', skip_rows=14)
+
+# Extract the audio signal from the file (copy, the cached data is read only)
+audio_signal = np.array(data[1])
 
 # Sampling rate (assuming it's constant throughout the signal)
-sampling_rate = 1 / (data[1, 0] - data[0, 0])
+sampling_rate = 1 / (data[0, 1] - data[0, 0])
 
 # Time points
 time_points = np.arange(len(audio_signal)) / sampling_rate